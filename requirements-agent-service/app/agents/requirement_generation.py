@@ -1,17 +1,22 @@
+import asyncio
 import logging
-import requests
+import re
+import threading
+import time
 import uuid
-from typing import TypedDict, List, Dict, Any
+from contextvars import ContextVar
+from typing import TypedDict, List, Dict, Any, Optional, Tuple
 import json
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.pydantic_v1 import BaseModel, Field
+from langchain_core.pydantic_v1 import BaseModel, Field, ValidationError
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_openai import ChatOpenAI
-from langchain_community.chat_models import ChatOllama
 
-from langgraph.graph import StateGraph, END, ConditionalEdge
-
-from ..vector_store import vector_store_manager
+from ..vector_store import get_vector_store_manager
+from ..context_assembly import group_context, pack_context
+from ..llm_providers import get_llm_registry, get_model_name
+from ..generation_cache import get_generation_cache
+from ..integration_client import get_integration_client
 from ..config import settings
 
 logger = logging.getLogger(__name__)
@@ -24,8 +29,12 @@ class GraphState(TypedDict):
     jira_project_key: str
     initial_prompt: str
     retrieved_docs: List[str]
+    # Stories generated from each context group in 'map_reduce' mode
+    story_groups: List[List[Dict[str, Any]]]
     generated_stories: List[Dict[str, Any]]
     jira_results: List[Dict[str, Any]]
+    bypass_generation_cache: bool
+    generation_cache_hit: bool
     error: str | None
 
 #--------------------------------------------------------------------------
@@ -45,16 +54,22 @@ class UserStoryList(BaseModel):
 # 3. Define the Nodes of the Graph
 #--------------------------------------------------------------------------
 
-def retrieve_documents_node(state: GraphState) -> GraphState:
+async def retrieve_documents_node(state: GraphState) -> GraphState:
     """
     Retrieves relevant document chunks from the vector store based on the initial prompt.
     """
     logger.info("Node: retrieve_documents")
     try:
-        documents = vector_store_manager.search(
+        # Over-fetch candidates and diversify them; the generation step packs
+        # as many of them as fit into the context token budget, in this order.
+        # Map-reduce generation spreads more chunks over several LLM calls.
+        k = settings.MAP_REDUCE_MAX_CHUNKS if settings.GENERATION_MODE == "map_reduce" else settings.CONTEXT_MAX_CHUNKS
+        documents = await get_vector_store_manager().amax_marginal_relevance_search(
             project_id=state['project_id'],
             query=state['initial_prompt'],
-            limit=5  # Retrieve top 5 most relevant chunks
+            k=k,
+            fetch_k=max(settings.CONTEXT_CANDIDATE_COUNT, k),
+            lambda_mult=settings.CONTEXT_MMR_LAMBDA
         )
         retrieved_docs_content = [doc.page_content for doc in documents]
         return {"retrieved_docs": retrieved_docs_content, "error": None}
@@ -62,7 +77,96 @@ def retrieve_documents_node(state: GraphState) -> GraphState:
         logger.error(f"Error in retrieve_documents_node: {e}")
         return {"error": f"Failed to retrieve documents: {e}"}
 
-def generate_user_stories_node(state: GraphState) -> GraphState:
+# Bump whenever the prompts or output schema below change, so that cached
+# generations made with the old template are no longer served.
+USER_STORY_PROMPT_VERSION = "1"
+
+def build_user_story_chain(registry, provider: str):
+    """
+    Builds the user story generation chain for a provider on top of its shared
+    chat model. Called once per provider by the LLM provider registry.
+    """
+    if provider == "ollama":
+        # Setup for Ollama with JSON output
+        parser = JsonOutputParser(pydantic_object=UserStoryList)
+        prompt = ChatPromptTemplate.from_template(
+            "You are an expert agile business analyst. Based on the provided context, generate a list of user stories.\n"
+            "CONTEXT:\n{context}\n\nPROMPT: {prompt}\n\n"
+            "Format your response as a JSON object that strictly adheres to the following JSON schema:\n"
+            "```json\n{format_instructions}\n```"
+        ).partial(format_instructions=parser.get_format_instructions())
+        llm = registry.get_chat_model(provider, json_mode=True)  # Enable JSON mode in Ollama
+        return prompt | llm | parser
+
+    # Default to OpenAI, with structured output (function calling)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are an expert agile business analyst. Your task is to analyze the provided technical documentation and generate a list of clear, concise, and actionable user stories. Use the provided function `UserStoryList` to structure your output."),
+        ("user", "Based on the following context, please generate the user stories:\n\nCONTEXT:\n---\n{context}\n\n---\nPROMPT: {prompt}")
+    ])
+    structured_llm = registry.get_chat_model(provider).with_structured_output(UserStoryList)
+    return prompt | structured_llm
+
+def build_user_story_stream_chain(registry, provider: str):
+    """
+    Builds a variant of the user story chain whose `astream` yields the output
+    parsed so far, as progressively more complete {"stories": [...]} dicts.
+    """
+    if provider == "ollama":
+        # The JSON parser already streams partial objects
+        return build_user_story_chain(registry, provider)
+
+    # Stream the arguments of the forced UserStoryList function call as partial JSON
+    from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are an expert agile business analyst. Your task is to analyze the provided technical documentation and generate a list of clear, concise, and actionable user stories. Use the provided function `UserStoryList` to structure your output."),
+        ("user", "Based on the following context, please generate the user stories:\n\nCONTEXT:\n---\n{context}\n\n---\nPROMPT: {prompt}")
+    ])
+    llm = registry.get_chat_model(provider).bind_tools([UserStoryList], tool_choice="UserStoryList")
+    return prompt | llm | JsonOutputKeyToolsParser(key_name="UserStoryList", first_tool_only=True)
+
+def user_story_cache_key(cache, prompt: str, context: str) -> str:
+    """Builds the generation cache key for a prompt and packed context."""
+    return cache.make_key(prompt, context, settings.LLM_PROVIDER, get_model_name(), USER_STORY_PROMPT_VERSION)
+
+def stories_from_result(result: Any) -> List[Dict[str, Any]]:
+    """Normalizes the output of either provider's chain to a list of story dicts."""
+    if isinstance(result, UserStoryList):
+        return [story.dict() for story in result.stories]
+    return result.get('stories', [])
+
+async def generate_stories(context_str: str, prompt: str, bypass_cache: bool = False) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Generates user stories for one context with the configured LLM, serving
+    them from the generation cache if possible.
+
+    :return: The stories, and whether they came from the cache.
+    """
+    cache = None if bypass_cache else get_generation_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = user_story_cache_key(cache, prompt, context_str)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Serving {len(cached.stories)} user stories from the generation cache.")
+            return [story.dict() for story in cached.stories], True
+
+    registry = get_llm_registry()
+    chain = registry.get_chain("user_stories", build_user_story_chain)
+    result = await registry.ainvoke(chain, {
+        "context": context_str,
+        "prompt": prompt
+    })
+    generated_stories = stories_from_result(result)
+
+    if cache_key is not None and generated_stories:
+        try:
+            # Only well-formed output is cached
+            cache.put(cache_key, UserStoryList.parse_obj({"stories": generated_stories}))
+        except ValidationError as e:
+            logger.warning(f"Not caching generated user stories that don't match the schema: {e}")
+    return generated_stories, False
+
+async def generate_user_stories_node(state: GraphState) -> GraphState:
     """
     Uses a configured LLM (OpenAI or Ollama) to generate user stories
     based on the retrieved documents.
@@ -70,59 +174,162 @@ def generate_user_stories_node(state: GraphState) -> GraphState:
     logger.info("Node: generate_user_stories")
     if state.get("error"): return {}
 
-    context_str = "\n\n".join(state['retrieved_docs'])
+    context_str = pack_context(state['retrieved_docs'], settings.CONTEXT_TOKEN_BUDGET)
 
     try:
-        if settings.LLM_PROVIDER == "ollama":
-            logger.info("Using Ollama to generate user stories.")
-            # Setup for Ollama with JSON output
-            parser = JsonOutputParser(pydantic_object=UserStoryList)
-            prompt = ChatPromptTemplate.from_template(
-                "You are an expert agile business analyst. Based on the provided context, generate a list of user stories.\n"
-                "CONTEXT:\n{context}\n\nPROMPT: {prompt}\n\n"
-                "Format your response as a JSON object that strictly adheres to the following JSON schema:\n"
-                "```json\n{format_instructions}\n```"
-            )
-            llm = ChatOllama(
-                base_url=settings.OLLAMA_BASE_URL,
-                model=settings.OLLAMA_MODEL_NAME,
-                temperature=0,
-                format="json"  # Enable JSON mode in Ollama
-            )
-            chain = prompt | llm | parser
-            result_dict = chain.invoke({
-                "context": context_str,
-                "prompt": state['initial_prompt'],
-                "format_instructions": parser.get_format_instructions()
-            })
-            generated_stories = result_dict.get('stories', [])
-
-        else: # Default to OpenAI
-            logger.info("Using OpenAI to generate user stories.")
-            # Setup for OpenAI with structured output (function calling)
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are an expert agile business analyst. Your task is to analyze the provided technical documentation and generate a list of clear, concise, and actionable user stories. Use the provided function `UserStoryList` to structure your output."),
-                ("user", "Based on the following context, please generate the user stories:\n\nCONTEXT:\n---\n{context}\n\n---\nPROMPT: {prompt}")
-            ])
-            llm = ChatOpenAI(model=settings.OPENAI_MODEL_NAME, temperature=0, api_key=settings.OPENAI_API_KEY)
-            structured_llm = llm.with_structured_output(UserStoryList)
-            chain = prompt | structured_llm
-            result = chain.invoke({
-                "context": context_str,
-                "prompt": state['initial_prompt']
-            })
-            generated_stories = [story.dict() for story in result.stories]
-
+        logger.info(f"Using {settings.LLM_PROVIDER} to generate user stories.")
+        generated_stories, cache_hit = await generate_stories(
+            context_str, state['initial_prompt'], state.get("bypass_generation_cache", False)
+        )
         logger.info(f"Generated {len(generated_stories)} user stories using {settings.LLM_PROVIDER}.")
-        return {"generated_stories": generated_stories, "error": None}
+        return {"generated_stories": generated_stories, "generation_cache_hit": cache_hit, "error": None}
 
     except Exception as e:
         logger.error(f"Error in generate_user_stories_node: {e}")
         return {"error": f"Failed to generate user stories with {settings.LLM_PROVIDER}: {e}"}
 
-def push_to_jira_node(state: GraphState) -> GraphState:
+async def map_user_stories_node(state: GraphState) -> GraphState:
+    """
+    Splits the retrieved documents into context groups and generates user
+    stories for all groups in parallel LLM calls (bounded by the provider's
+    concurrency limit). Groups that fail are skipped unless all of them fail.
+    """
+    logger.info("Node: map_user_stories")
+    if state.get("error"): return {}
+
+    groups = group_context(state['retrieved_docs'], settings.MAP_REDUCE_GROUP_TOKENS, settings.MAP_REDUCE_MAX_GROUPS)
+    logger.info(f"Generating user stories for {len(groups)} context groups using {settings.LLM_PROVIDER}.")
+    results = await asyncio.gather(
+        *(generate_stories(group, state['initial_prompt'], state.get("bypass_generation_cache", False)) for group in groups),
+        return_exceptions=True
+    )
+
+    story_groups = []
+    errors = []
+    cache_hits = 0
+    for index, result in enumerate(results):
+        # A cancelled call returns asyncio.CancelledError, which is not an Exception
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to generate user stories for context group {index}: {result!r}")
+            errors.append(str(result) or type(result).__name__)
+            continue
+        stories, cache_hit = result
+        story_groups.append(stories)
+        cache_hits += cache_hit
+
+    if groups and not story_groups:
+        return {"error": f"Failed to generate user stories with {settings.LLM_PROVIDER}: {errors[0]}"}
+    return {"story_groups": story_groups, "generation_cache_hit": bool(groups) and cache_hits == len(groups), "error": None}
+
+def _normalize_title(title: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", title).split()).casefold()
+
+def _normalize_criteria(criteria: str) -> str:
+    return " ".join(criteria.split()).casefold()
+
+async def merge_user_stories(story_groups: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Merges the stories generated from several context groups, in order. A
+    story whose normalized title matches an earlier one, or whose title and
+    description embed at least MAP_REDUCE_DEDUP_SIMILARITY similar to an
+    earlier one, is folded into it: its new acceptance criteria are appended.
+    Stories without a title are matched by similarity only. Falls back to
+    title matching alone if the stories can't be embedded.
+    """
+    stories = [story for group in story_groups for story in group]
+    if not stories:
+        return []
+
+    vectors = None
+    try:
+        # Bypass the embedding cache, which is meant for document chunks
+        embedded = await get_vector_store_manager().base_embeddings.aembed_documents(
+            [f"{story.get('title', '')}\n{story.get('description', '')}" for story in stories]
+        )
+        vectors = np.asarray(embedded, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    except Exception as e:
+        logger.warning(f"Could not embed user stories for de-duplication; matching titles only: {e}")
+
+    merged: List[Dict[str, Any]] = []
+    merged_rows: List[int] = []  # Row in `vectors` of each merged story
+    by_title: Dict[str, int] = {}
+    for row, story in enumerate(stories):
+        title = _normalize_title(story.get('title') or '')
+        match = by_title.get(title) if title else None
+        if match is None and vectors is not None and merged_rows:
+            similarities = vectors[merged_rows] @ vectors[row]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= settings.MAP_REDUCE_DEDUP_SIMILARITY:
+                match = best
+
+        if match is None:
+            if title:
+                by_title[title] = len(merged)
+            merged_rows.append(row)
+            merged.append({**story, 'acceptance_criteria': list(story.get('acceptance_criteria') or [])})
+            continue
+
+        target = merged[match]
+        if title:
+            by_title.setdefault(title, match)
+        known = {_normalize_criteria(criteria) for criteria in target['acceptance_criteria']}
+        for criteria in story.get('acceptance_criteria') or []:
+            if _normalize_criteria(criteria) not in known:
+                known.add(_normalize_criteria(criteria))
+                target['acceptance_criteria'].append(criteria)
+
+    logger.info(f"Merged {len(stories)} user stories from {len(story_groups)} context groups into {len(merged)}.")
+    return merged
+
+async def reduce_user_stories_node(state: GraphState) -> GraphState:
+    """
+    Merges and de-duplicates the stories generated for each context group.
+    """
+    logger.info("Node: reduce_user_stories")
+    if state.get("error"): return {}
+
+    return {"generated_stories": await merge_user_stories(state.get("story_groups", [])), "error": None}
+
+async def push_story_to_jira(story: Dict[str, Any], project_key: str) -> Dict[str, Any]:
     """
-    Pushes the generated user stories to Jira via the integration service.
+    Creates a Jira issue for one user story via the integration service.
+
+    :return: The integration service's response, or an {"error", "story"} dict if the push failed.
+    """
+    # Create a unique internal ID for traceability. It is created once per story,
+    # so that retries are recognized as duplicates by the integration service.
+    internal_id = f"req-{uuid.uuid4()}"
+
+    # Format the description for Jira
+    jira_description = f"{story['description']}\n\n*Acceptance Criteria:*\n"
+    for i, criteria in enumerate(story['acceptance_criteria'], 1):
+        jira_description += f"- {criteria}\n"
+
+    payload = {
+        "internal_id": internal_id,
+        "source_service": "requirements-agent-service",
+        "project_key": project_key,
+        "title": story['title'],
+        "description": jira_description,
+        "issue_type": "Story"
+    }
+
+    try:
+        result_data = await get_integration_client().create_jira_issue(payload)
+        logger.info(f"Successfully pushed story '{story['title']}' to Jira as {result_data['jira_key']}.")
+        return result_data
+    except Exception as e:
+        # Includes HTTP errors and unexpected response bodies
+        error_message = f"Failed to push story '{story['title']}' to Jira. Error: {e}"
+        logger.error(error_message)
+        # Record the error; the other stories are pushed regardless
+        return {"error": error_message, "story": story}
+
+async def push_to_jira_node(state: GraphState) -> GraphState:
+    """
+    Pushes the generated user stories to Jira via the integration service,
+    up to JIRA_PUSH_CONCURRENCY at a time. Results are in story order.
     """
     logger.info("Node: push_to_jira")
     if state.get("error"): return {}
@@ -132,47 +339,19 @@ def push_to_jira_node(state: GraphState) -> GraphState:
         logger.warning("No stories to push to Jira.")
         return {"jira_results": []}
 
-    jira_results = []
-    integration_url = f"{settings.INTEGRATION_SERVICE_URL}/integrations/jira/issues"
-
-    for story in stories_to_push:
-        # Create a unique internal ID for traceability
-        internal_id = f"req-{uuid.uuid4()}"
-
-        # Format the description for Jira
-        jira_description = f"{story['description']}\n\n*Acceptance Criteria:*\n"
-        for i, criteria in enumerate(story['acceptance_criteria'], 1):
-            jira_description += f"- {criteria}\n"
-
-        payload = {
-            "internal_id": internal_id,
-            "source_service": "requirements-agent-service",
-            "project_key": state['jira_project_key'],
-            "title": story['title'],
-            "description": jira_description,
-            "issue_type": "Story"
-        }
-
-        try:
-            response = requests.post(integration_url, json=payload, timeout=15)
-            response.raise_for_status()
-            result_data = response.json()
-            jira_results.append(result_data)
-            logger.info(f"Successfully pushed story '{story['title']}' to Jira as {result_data['jira_key']}.")
-        except requests.RequestException as e:
-            error_message = f"Failed to push story '{story['title']}' to Jira. Error: {e}"
-            logger.error(error_message)
-            # Continue to the next story, but record the error
-            jira_results.append({"error": error_message, "story": story})
-
-    return {"jira_results": jira_results, "error": None}
+    jira_results = await asyncio.gather(
+        *(push_story_to_jira(story, state['jira_project_key']) for story in stories_to_push)
+    )
+    return {"jira_results": list(jira_results), "error": None}
 
 #--------------------------------------------------------------------------
 # 4. Define the Graph and conditional edges
 #--------------------------------------------------------------------------
 
-def should_continue(state: GraphState) -> ConditionalEdge:
+def should_continue(state: GraphState) -> str:
     """Conditional edge to check for errors and decide the next step."""
+    from langgraph.graph import END
+
     if state.get("error"):
         logger.error(f"Error detected in graph state: {state['error']}")
         return END
@@ -184,25 +363,97 @@ def should_continue(state: GraphState) -> ConditionalEdge:
         logger.warning("No stories were generated, ending graph execution.")
         return END
 
-# Initialize the graph
-workflow = StateGraph(GraphState)
+class GraphObserver:
+    """
+    Receives progress notifications from the nodes of a graph run, e.g. to
+    record them in a run store. Override the methods of interest.
+    """
+    async def node_started(self, node: str):
+        pass
+
+    async def node_finished(self, node: str, update: Dict[str, Any], seconds: float):
+        pass
+
+# The observer of the graph run in the current context, if any
+_graph_observer: ContextVar[Optional[GraphObserver]] = ContextVar("graph_observer", default=None)
+
+def _observed(name: str, node):
+    """Wraps a node so that it reports its start, state update and duration to the run's observer."""
+    async def observed_node(state: GraphState) -> GraphState:
+        observer = _graph_observer.get()
+        if observer is None:
+            return await node(state)
+        await observer.node_started(name)
+        start = time.perf_counter()
+        update = await node(state)
+        await observer.node_finished(name, update, time.perf_counter() - start)
+        return update
+    return observed_node
+
+def route_generation(state: GraphState) -> str:
+    """Conditional edge choosing between single-call and map-reduce generation."""
+    if settings.GENERATION_MODE == "map_reduce":
+        return "map_user_stories"
+    return "generate_user_stories"
 
-# Add nodes
-workflow.add_node("retrieve_documents", retrieve_documents_node)
-workflow.add_node("generate_user_stories", generate_user_stories_node)
-workflow.add_node("push_to_jira", push_to_jira_node)
+def build_agent_graph():
+    """Builds and compiles the requirement generation graph."""
+    from langgraph.graph import StateGraph, END
 
-# Set the entry point
-workflow.set_entry_point("retrieve_documents")
+    # Initialize the graph
+    workflow = StateGraph(GraphState)
 
-# Add edges
-workflow.add_edge("retrieve_documents", "generate_user_stories")
-workflow.add_conditional_edges(
-    "generate_user_stories",
-    should_continue,
-)
-workflow.add_edge("push_to_jira", END)
+    # Add nodes
+    workflow.add_node("retrieve_documents", _observed("retrieve_documents", retrieve_documents_node))
+    workflow.add_node("generate_user_stories", _observed("generate_user_stories", generate_user_stories_node))
+    workflow.add_node("map_user_stories", _observed("map_user_stories", map_user_stories_node))
+    workflow.add_node("reduce_user_stories", _observed("reduce_user_stories", reduce_user_stories_node))
+    workflow.add_node("push_to_jira", _observed("push_to_jira", push_to_jira_node))
 
-# Compile the graph into a runnable
-agent_graph = workflow.compile()
-logger.info("Requirement generation agent graph compiled successfully.")
+    # Set the entry point
+    workflow.set_entry_point("retrieve_documents")
+
+    # Add edges
+    workflow.add_conditional_edges("retrieve_documents", route_generation)
+    workflow.add_conditional_edges(
+        "generate_user_stories",
+        should_continue,
+    )
+    workflow.add_edge("map_user_stories", "reduce_user_stories")
+    workflow.add_conditional_edges(
+        "reduce_user_stories",
+        should_continue,
+    )
+    workflow.add_edge("push_to_jira", END)
+
+    # Compile the graph into a runnable. The nodes are coroutines, so the graph
+    # must be run with `ainvoke`.
+    graph = workflow.compile()
+    logger.info("Requirement generation agent graph compiled successfully.")
+    return graph
+
+# Compiled on first use rather than at import time
+_agent_graph = None
+_agent_graph_lock = threading.Lock()
+
+def get_agent_graph():
+    """Returns the compiled agent graph, building it on first call."""
+    global _agent_graph
+    if _agent_graph is None:
+        with _agent_graph_lock:
+            if _agent_graph is None:
+                _agent_graph = build_agent_graph()
+    return _agent_graph
+
+async def run_agent_graph(initial_state: GraphState, observer: Optional[GraphObserver] = None) -> GraphState:
+    """
+    Runs the agent graph to completion.
+
+    :param observer: Notified as each node starts and finishes.
+    :return: The final state.
+    """
+    token = _graph_observer.set(observer)
+    try:
+        return await get_agent_graph().ainvoke(initial_state)
+    finally:
+        _graph_observer.reset(token)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from langchain_core.pydantic_v1 import ValidationError
+
+from ..config import settings
+from ..context_assembly import pack_context
+from ..generation_cache import get_generation_cache
+from ..llm_providers import get_llm_registry
+from .requirement_generation import (
+    UserStory,
+    UserStoryList,
+    build_user_story_stream_chain,
+    push_story_to_jira,
+    retrieve_documents_node,
+    user_story_cache_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# An (event name, data) pair, or None while waiting so that the caller can keep the connection alive
+StreamEvent = Optional[Tuple[str, Dict[str, Any]]]
+
+def completed_stories(partial: Any, emitted: int) -> List[Any]:
+    """
+    Returns the stories of a partially parsed {"stories": [...]} output that
+    are complete and not emitted yet. A story is complete once the next one
+    has started; the last one only when the output ends.
+    """
+    stories = partial.get("stories") if isinstance(partial, dict) else None
+    if not isinstance(stories, list):
+        return []
+    return stories[emitted:len(stories) - 1]
+
+async def stream_requirement_generation(
+    project_id: int,
+    jira_project_key: str,
+    initial_prompt: str,
+    bypass_generation_cache: bool = False
+) -> AsyncIterator[StreamEvent]:
+    """
+    Runs requirement generation, yielding events as it progresses:
+
+    - 'retrieved' once the context has been retrieved,
+    - 'story' for each user story as soon as it has been parsed from the LLM's
+      streaming output (or served from the generation cache),
+    - 'invalid_story' for output that doesn't match the UserStory schema,
+    - 'jira_result' whenever a story's Jira push finishes, in completion order,
+    - and finally 'done' with the ordered Jira results, or 'error'.
+
+    Each story is pushed to Jira as soon as it is complete, while the LLM is
+    still generating the following ones. Pushes that have started are finished
+    even if the client disconnects.
+    """
+    retrieval = await retrieve_documents_node({"project_id": project_id, "initial_prompt": initial_prompt})
+    if retrieval.get("error"):
+        yield "error", {"detail": retrieval["error"]}
+        return
+    yield "retrieved", {"chunks": len(retrieval["retrieved_docs"])}
+    context_str = pack_context(retrieval["retrieved_docs"], settings.CONTEXT_TOKEN_BUDGET)
+
+    events: "asyncio.Queue[StreamEvent]" = asyncio.Queue()
+    stories: List[Dict[str, Any]] = []
+    jira_results: Dict[int, Dict[str, Any]] = {}
+    pushes: List["asyncio.Future"] = []
+    outcome = {"cache_hit": False, "error": None, "invalid": 0}
+
+    async def push(index: int, story: Dict[str, Any]):
+        result = await push_story_to_jira(story, jira_project_key)
+        jira_results[index] = result
+        events.put_nowait(("jira_result", {"index": index, "result": result}))
+
+    def story_ready(raw_story: Any):
+        try:
+            story = UserStory.parse_obj(raw_story).dict()
+        except ValidationError as e:
+            outcome["invalid"] += 1
+            logger.warning(f"Skipping generated story that doesn't match the schema: {e}")
+            events.put_nowait(("invalid_story", {"story": raw_story, "detail": str(e)}))
+            return
+        index = len(stories)
+        stories.append(story)
+        events.put_nowait(("story", {"index": index, "story": story}))
+        pushes.append(asyncio.ensure_future(push(index, story)))
+
+    async def generate():
+        try:
+            cache = None if bypass_generation_cache else get_generation_cache()
+            cache_key = None
+            if cache is not None:
+                cache_key = user_story_cache_key(cache, initial_prompt, context_str)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Streaming {len(cached.stories)} user stories from the generation cache.")
+                    outcome["cache_hit"] = True
+                    for story in cached.stories:
+                        story_ready(story.dict())
+                    return
+
+            logger.info(f"Streaming user stories from {settings.LLM_PROVIDER}.")
+            registry = get_llm_registry()
+            chain = registry.get_chain("user_stories_stream", build_user_story_stream_chain)
+            parsed = 0
+            partial = None
+            async for partial in registry.astream(chain, {"context": context_str, "prompt": initial_prompt}):
+                for story in completed_stories(partial, parsed):
+                    parsed += 1
+                    story_ready(story)
+            final_stories = partial.get("stories") if isinstance(partial, dict) else None
+            for story in (final_stories if isinstance(final_stories, list) else [])[parsed:]:
+                story_ready(story)
+
+            logger.info(f"Streamed {len(stories)} user stories from {settings.LLM_PROVIDER}.")
+            if cache_key is not None and stories and not outcome["invalid"]:
+                cache.put(cache_key, UserStoryList.parse_obj({"stories": stories}))
+        except Exception as e:
+            logger.error(f"Error while streaming user stories: {e}")
+            outcome["error"] = f"Failed to generate user stories with {settings.LLM_PROVIDER}: {e}"
+            events.put_nowait(("error", {"detail": outcome["error"]}))
+        finally:
+            await asyncio.gather(*pushes, return_exceptions=True)
+            events.put_nowait(None)
+
+    producer = asyncio.ensure_future(generate())
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=settings.SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is None:
+                break
+            yield event
+    finally:
+        if not producer.done():
+            # The client went away: stop generating, but let started pushes finish
+            producer.cancel()
+            await asyncio.gather(*pushes, return_exceptions=True)
+
+    if outcome["error"] is None:
+        yield "done", {
+            "stories": len(stories),
+            "invalid_stories": outcome["invalid"],
+            "pushed": sum(1 for result in jira_results.values() if "error" not in result),
+            "failed": sum(1 for result in jira_results.values() if "error" in result),
+            "generation_cache_hit": outcome["cache_hit"],
+            "jira_results": [jira_results.get(index) for index in range(len(stories))],
+        }
@@ -0,0 +1,80 @@
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+@dataclass
+class VectorHit:
+    """A stored point returned by a backend search or scan."""
+    id: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    score: Optional[float] = None
+    vector: Optional[List[float]] = None
+
+class BaseVectorBackend(ABC):
+    """
+    Abstract Base Class for vector storage backends used by VectorStoreManager.
+    Every operation is scoped to a single project; how projects are laid out
+    (collections, payload partitions, files) is up to the backend.
+    """
+    name: str = "base"
+
+    @abstractmethod
+    def has_project(self, project_id: int) -> bool:
+        """Returns True if the backend holds any storage for the project."""
+        pass
+
+    @abstractmethod
+    def ensure_project(self, project_id: int, get_vector_size: Callable[[], int]) -> bool:
+        """
+        Creates storage for the project if needed.
+
+        :param get_vector_size: Called only if storage has to be created.
+        :return: True if the project's storage already existed.
+        """
+        pass
+
+    @abstractmethod
+    def get_point_ids_for_source(self, project_id: int, bucket_name: str, source: str) -> Set[str]:
+        """
+        Returns the IDs of all points stored for a given source object,
+        including points of that source stored without a bucket.
+        """
+        pass
+
+    @abstractmethod
+    def upsert(self, project_id: int, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]):
+        """Inserts or replaces points by ID."""
+        pass
+
+    @abstractmethod
+    def delete(self, project_id: int, ids: List[str]):
+        """Deletes points by ID."""
+        pass
+
+    @abstractmethod
+    def search(self, project_id: int, vector: List[float], limit: int, with_vectors: bool = False) -> List[VectorHit]:
+        """Returns the `limit` points most similar to `vector` by cosine similarity."""
+        pass
+
+    async def asearch(self, project_id: int, vector: List[float], limit: int, with_vectors: bool = False) -> List[VectorHit]:
+        """
+        Async variant of `search`. Backends without a native async client run
+        the blocking implementation in a worker thread.
+        """
+        return await asyncio.to_thread(self.search, project_id, vector, limit, with_vectors)
+
+    @abstractmethod
+    def count(self, project_id: int) -> int:
+        """Returns the number of points stored for the project."""
+        pass
+
+    @abstractmethod
+    def iter_points(self, project_id: int, batch_size: int = 256) -> Iterator[List[VectorHit]]:
+        """Yields every point of the project, with vectors, in batches."""
+        pass
+
+    @abstractmethod
+    def drop_project(self, project_id: int):
+        """Removes all of the project's points."""
+        pass
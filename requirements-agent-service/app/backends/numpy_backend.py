@@ -0,0 +1,337 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .base import BaseVectorBackend, VectorHit
+
+logger = logging.getLogger(__name__)
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scales rows to unit length so that cosine similarity becomes a dot product."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+class _ProjectData:
+    """
+    Immutable view of one project as read from disk: point IDs and payloads,
+    plus a read-only memory map of its vectors. `manifest` is the committed
+    manifest the view was read from, `stamp` identifies that manifest file.
+    """
+    def __init__(self, manifest: Dict[str, Any], ids: List[str], payloads: List[Dict[str, Any]], matrix: np.ndarray, stamp: Tuple[int, int, int]):
+        self.manifest = manifest
+        self.dim = manifest["dim"]
+        self.generation = manifest["generation"]
+        self.ids = ids
+        self.payloads = payloads
+        self.matrix = matrix
+        self.stamp = stamp
+        self.rows = {point_id: row for row, point_id in enumerate(ids)}
+
+def _stamp(stat: os.stat_result) -> Tuple[int, int, int]:
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def _point_lines(ids: List[str], payloads: List[Dict[str, Any]]) -> bytes:
+    return b"".join(
+        json.dumps({"id": point_id, "payload": payload}).encode("utf-8") + b"\n"
+        for point_id, payload in zip(ids, payloads)
+    )
+
+class NumpyBackend(BaseVectorBackend):
+    """
+    An embedded, serverless vector backend for small projects. Each project is
+    a directory holding a float32 matrix of unit-normalized vectors
+    (`vectors-<generation>.f32`, memory-mapped for reads) and a JSON-lines
+    file with the point ID and payload of each row (`points-<generation>.jsonl`).
+    Top-k cosine queries are answered with a single vectorized
+    matrix-vector product.
+
+    `manifest.json` commits a state of the project: it names the generation
+    of both files and how many rows and bytes of them are valid. Appending
+    points extends both files and then replaces the small manifest; updates
+    and deletes write a new generation of both files and switch to it with the
+    manifest. Either way, a crash leaves the last committed state readable.
+
+    The store may be shared by several processes (the API and the ingestion
+    and generation workers). Writers hold an exclusive `flock` on the
+    project's lock file, readers a shared one while loading, and every
+    process reloads a project once its manifest has changed on disk.
+    """
+    name = "numpy"
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        os.makedirs(base_path, exist_ok=True)
+        self._projects: Dict[int, _ProjectData] = {}
+        self._lock = threading.RLock()
+
+    def _project_dir(self, project_id: int) -> str:
+        return os.path.join(self.base_path, f"project_{project_id}")
+
+    def _manifest_path(self, project_id: int) -> str:
+        return os.path.join(self._project_dir(project_id), "manifest.json")
+
+    def _vectors_path(self, project_id: int, generation: int) -> str:
+        return os.path.join(self._project_dir(project_id), f"vectors-{generation}.f32")
+
+    def _points_path(self, project_id: int, generation: int) -> str:
+        return os.path.join(self._project_dir(project_id), f"points-{generation}.jsonl")
+
+    @contextmanager
+    def _file_lock(self, project_id: int, exclusive: bool):
+        """
+        Holds the project's inter-process lock. The lock file lives next to the
+        project directory so that it outlives drop_project.
+        """
+        with open(os.path.join(self.base_path, f"project_{project_id}.lock"), "a+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open_matrix(self, project_id: int, manifest: Dict[str, Any]) -> np.ndarray:
+        if manifest["count"] == 0:
+            return np.empty((0, manifest["dim"]), dtype=np.float32)
+        return np.memmap(
+            self._vectors_path(project_id, manifest["generation"]),
+            dtype=np.float32, mode="r", shape=(manifest["count"], manifest["dim"])
+        )
+
+    def _manifest_stamp(self, project_id: int) -> Optional[Tuple[int, int, int]]:
+        try:
+            return _stamp(os.stat(self._manifest_path(project_id)))
+        except FileNotFoundError:
+            return None
+
+    def _read(self, project_id: int) -> Optional[_ProjectData]:
+        """Reads the committed state of the project from disk and caches it. The caller holds the project's file lock."""
+        try:
+            f = open(self._manifest_path(project_id), encoding="utf-8")
+        except FileNotFoundError:
+            with self._lock:
+                self._projects.pop(project_id, None)
+            return None
+        with f:
+            stamp = _stamp(os.fstat(f.fileno()))
+            manifest = json.load(f)
+
+        ids: List[str] = []
+        payloads: List[Dict[str, Any]] = []
+        with open(self._points_path(project_id, manifest["generation"]), "rb") as f:
+            # Bytes past points_bytes were left by an interrupted write and are not committed
+            for line in f.read(manifest["points_bytes"]).splitlines():
+                point = json.loads(line)
+                ids.append(point["id"])
+                payloads.append(point["payload"])
+
+        data = _ProjectData(manifest, ids, payloads, self._open_matrix(project_id, manifest), stamp)
+        with self._lock:
+            self._projects[project_id] = data
+        return data
+
+    def _current(self, project_id: int) -> Optional[_ProjectData]:
+        """
+        Returns the cached view of the project if it is still current, and
+        re-reads it otherwise. The caller holds the project's file lock.
+        """
+        data = self._projects.get(project_id)
+        if data is not None and data.stamp == self._manifest_stamp(project_id):
+            return data
+        return self._read(project_id)
+
+    def _load(self, project_id: int) -> Optional[_ProjectData]:
+        data = self._projects.get(project_id)
+        stamp = self._manifest_stamp(project_id)
+        if stamp is None:
+            with self._lock:
+                self._projects.pop(project_id, None)
+            return None
+        if data is not None and data.stamp == stamp:
+            return data
+        # Another process (or thread) changed the project since it was loaded
+        with self._file_lock(project_id, exclusive=False):
+            return self._read(project_id)
+
+    def _commit(self, project_id: int, manifest: Dict[str, Any], ids: List[str], payloads: List[Dict[str, Any]]) -> _ProjectData:
+        """
+        Atomically replaces the manifest, which makes the state it describes
+        current, and caches the new view. The caller holds the project's exclusive file lock.
+        """
+        manifest_path = self._manifest_path(project_id)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        data = _ProjectData(manifest, ids, payloads, self._open_matrix(project_id, manifest), _stamp(os.stat(manifest_path)))
+        with self._lock:
+            self._projects[project_id] = data
+        return data
+
+    def _write_generation(self, project_id: int, dim: int, generation: int, ids: List[str], payloads: List[Dict[str, Any]], matrix: np.ndarray) -> Dict[str, Any]:
+        """
+        Writes both files of a new generation and returns the manifest that
+        commits them. Files of an earlier, uncommitted attempt are overwritten.
+        """
+        np.ascontiguousarray(matrix, dtype=np.float32).tofile(self._vectors_path(project_id, generation))
+        lines = _point_lines(ids, payloads)
+        with open(self._points_path(project_id, generation), "wb") as f:
+            f.write(lines)
+        return {"dim": dim, "generation": generation, "count": len(ids), "points_bytes": len(lines)}
+
+    def _append(self, project_id: int, data: _ProjectData, ids: List[str], payloads: List[Dict[str, Any]], vectors: np.ndarray) -> Dict[str, Any]:
+        """
+        Appends points to the current generation's files and returns the
+        manifest that commits them. Existing memory maps only cover committed
+        rows, so readers are not affected.
+        """
+        manifest = data.manifest
+        row_bytes = data.dim * np.dtype(np.float32).itemsize
+        with open(self._vectors_path(project_id, data.generation), "r+b") as f:
+            # Drop anything left behind by an interrupted write before appending
+            f.truncate(manifest["count"] * row_bytes)
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        lines = _point_lines(ids, payloads)
+        with open(self._points_path(project_id, data.generation), "r+b") as f:
+            f.truncate(manifest["points_bytes"])
+            f.seek(0, os.SEEK_END)
+            f.write(lines)
+        return dict(manifest, count=manifest["count"] + len(ids), points_bytes=manifest["points_bytes"] + len(lines))
+
+    def _remove_generation(self, project_id: int, generation: int):
+        """Removes a superseded generation. Open memory maps of it stay valid."""
+        for path in (self._vectors_path(project_id, generation), self._points_path(project_id, generation)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def has_project(self, project_id: int) -> bool:
+        return self._load(project_id) is not None
+
+    def ensure_project(self, project_id: int, get_vector_size: Callable[[], int]) -> bool:
+        if self._load(project_id) is not None:
+            return True
+        with self._lock, self._file_lock(project_id, exclusive=True):
+            if self._current(project_id) is not None:
+                return True
+            dim = get_vector_size()
+            os.makedirs(self._project_dir(project_id), exist_ok=True)
+            manifest = self._write_generation(project_id, dim, 0, [], [], np.empty((0, dim), dtype=np.float32))
+            self._commit(project_id, manifest, [], [])
+            logger.info(f"Created local vector store for project {project_id} (dim={dim}).")
+            return False
+
+    def get_point_ids_for_source(self, project_id: int, bucket_name: str, source: str) -> Set[str]:
+        data = self._load(project_id)
+        if data is None:
+            return set()
+        return {
+            point_id for point_id, payload in zip(data.ids, data.payloads)
+            if payload.get("source") == source and payload.get("bucket", bucket_name) == bucket_name
+        }
+
+    def upsert(self, project_id: int, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]):
+        new_vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        with self._lock, self._file_lock(project_id, exclusive=True):
+            data = self._current(project_id)
+            if data is None:
+                raise KeyError(f"Project {project_id} has no local vector store.")
+
+            # Build new lists rather than mutating the current view, which searches may be reading.
+            # If an ID occurs more than once in the batch, the last occurrence wins.
+            new_ids = list(data.ids)
+            new_payloads = list(data.payloads)
+            latest = {point_id: i for i, point_id in enumerate(ids)}
+            updates = []
+            appends = []
+            for point_id, i in latest.items():
+                row = data.rows.get(point_id)
+                if row is None:
+                    new_ids.append(point_id)
+                    new_payloads.append(payloads[i])
+                    appends.append(i)
+                else:
+                    new_payloads[row] = payloads[i]
+                    updates.append((row, i))
+
+            existing_count = len(data.ids)
+            if updates:
+                # Rows change in place, so write a new generation that no reader has mapped
+                matrix = np.empty((len(new_ids), data.dim), dtype=np.float32)
+                matrix[:existing_count] = data.matrix
+                for row, i in updates:
+                    matrix[row] = new_vectors[i]
+                matrix[existing_count:] = new_vectors[appends]
+                manifest = self._write_generation(project_id, data.dim, data.generation + 1, new_ids, new_payloads, matrix)
+                self._commit(project_id, manifest, new_ids, new_payloads)
+                self._remove_generation(project_id, data.generation)
+            elif appends:
+                # Only the new points are written, so a batch costs the same however large the project is
+                manifest = self._append(project_id, data, new_ids[existing_count:], new_payloads[existing_count:], new_vectors[appends])
+                self._commit(project_id, manifest, new_ids, new_payloads)
+
+    def delete(self, project_id: int, ids: List[str]):
+        with self._lock, self._file_lock(project_id, exclusive=True):
+            data = self._current(project_id)
+            if data is None:
+                return
+            to_delete = set(ids)
+            keep = [row for row, point_id in enumerate(data.ids) if point_id not in to_delete]
+            if len(keep) == len(data.ids):
+                return
+
+            new_ids = [data.ids[row] for row in keep]
+            new_payloads = [data.payloads[row] for row in keep]
+            manifest = self._write_generation(project_id, data.dim, data.generation + 1, new_ids, new_payloads, data.matrix[keep])
+            self._commit(project_id, manifest, new_ids, new_payloads)
+            self._remove_generation(project_id, data.generation)
+
+    def search(self, project_id: int, vector: List[float], limit: int, with_vectors: bool = False) -> List[VectorHit]:
+        data = self._load(project_id)
+        if data is None or not data.ids or limit <= 0:
+            return []
+        # Writers build a new view rather than mutating this one, so it stays consistent
+        ids, payloads, matrix = data.ids, data.payloads, data.matrix
+
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        scores = matrix @ query
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            VectorHit(
+                id=ids[row],
+                payload=dict(payloads[row]),
+                score=float(scores[row]),
+                vector=matrix[row].tolist() if with_vectors else None
+            )
+            for row in top
+        ]
+
+    def count(self, project_id: int) -> int:
+        data = self._load(project_id)
+        return len(data.ids) if data is not None else 0
+
+    def iter_points(self, project_id: int, batch_size: int = 256) -> Iterator[List[VectorHit]]:
+        data = self._load(project_id)
+        if data is None:
+            return
+        ids, payloads, matrix = data.ids, data.payloads, data.matrix
+        for start in range(0, len(ids), batch_size):
+            yield [
+                VectorHit(id=ids[row], payload=dict(payloads[row]), vector=matrix[row].tolist())
+                for row in range(start, min(start + batch_size, len(ids)))
+            ]
+
+    def drop_project(self, project_id: int):
+        with self._lock, self._file_lock(project_id, exclusive=True):
+            self._projects.pop(project_id, None)
+            shutil.rmtree(self._project_dir(project_id), ignore_errors=True)
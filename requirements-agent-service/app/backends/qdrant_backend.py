@@ -0,0 +1,311 @@
+import logging
+import time
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from .base import BaseVectorBackend, VectorHit
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class CollectionProfile(NamedTuple):
+    """How a collection's vectors are stored: whether originals live on disk and which quantization is kept in RAM."""
+    vectors_on_disk: bool
+    quantization: Optional[str]  # None, 'scalar' or 'binary'
+
+# Selected with QDRANT_COLLECTION_PROFILE. Quantized profiles keep the compact
+# vectors in RAM and the float32 originals on disk for rescoring.
+COLLECTION_PROFILES: Dict[str, CollectionProfile] = {
+    "default": CollectionProfile(vectors_on_disk=False, quantization=None),
+    "on_disk": CollectionProfile(vectors_on_disk=True, quantization=None),
+    "scalar_int8": CollectionProfile(vectors_on_disk=True, quantization="scalar"),
+    "binary": CollectionProfile(vectors_on_disk=True, quantization="binary"),
+}
+
+# How long the search parameters derived from a collection's config are reused
+SEARCH_PARAMS_TTL_SECONDS = 60.0
+
+def get_collection_profile(name: Optional[str] = None) -> CollectionProfile:
+    """Looks up a collection profile, defaulting to QDRANT_COLLECTION_PROFILE."""
+    name = name or settings.QDRANT_COLLECTION_PROFILE
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile '{name}'. Choose one of: {', '.join(COLLECTION_PROFILES)}.")
+    return COLLECTION_PROFILES[name]
+
+def build_quantization_config(profile: CollectionProfile) -> Optional[models.QuantizationConfig]:
+    """Builds the Qdrant quantization config for a profile, or None if it stores full-precision vectors only."""
+    if profile.quantization == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        )
+    if profile.quantization == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    return None
+
+def get_quantization(quantization_config: Any) -> Optional[str]:
+    """Names the quantization in a collection's config: None, 'scalar', 'binary' or 'product'."""
+    if isinstance(quantization_config, models.ScalarQuantization):
+        return "scalar"
+    if isinstance(quantization_config, models.BinaryQuantization):
+        return "binary"
+    if isinstance(quantization_config, models.ProductQuantization):
+        return "product"
+    return None
+
+def build_search_params(quantization: Optional[str]) -> Optional[models.SearchParams]:
+    """
+    Search parameters for a collection with the given quantization: over-fetch
+    candidates using the quantized vectors, then rescore them with the on-disk
+    originals. Unquantized collections need no parameters.
+    """
+    if quantization is None:
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=settings.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING
+        )
+    )
+
+class QdrantBackend(BaseVectorBackend):
+    """
+    Stores project vectors in Qdrant, either in one collection per project or,
+    when VECTOR_STORE_MODE is 'shared', in a single collection partitioned by
+    an indexed `project_id` payload.
+    """
+    name = "qdrant"
+
+    def __init__(self):
+        self.client = QdrantClient(url=settings.QDRANT_URL)
+        # Used on the request path so that searches don't block a worker thread
+        self.async_client = AsyncQdrantClient(url=settings.QDRANT_URL)
+        self._known_collections = set()
+        # Collection name -> (search params for its quantization, monotonic time they were read)
+        self._search_params: Dict[str, Tuple[Optional[models.SearchParams], float]] = {}
+
+    def get_collection_name(self, project_id: int) -> str:
+        """
+        Generates a consistent collection name for a given project. In 'shared'
+        storage mode every project lives in the same collection.
+        """
+        if settings.VECTOR_STORE_MODE == "shared":
+            return settings.SHARED_COLLECTION_NAME
+        return f"project_{project_id}_requirements"
+
+    def project_filter(self, project_id: int, *conditions: models.Condition) -> Optional[models.Filter]:
+        """
+        Builds the search/scroll filter for a project. In 'shared' storage mode
+        this restricts results to the project's partition via its payload index.
+        """
+        must = list(conditions)
+        if settings.VECTOR_STORE_MODE == "shared":
+            must.append(models.FieldCondition(key="project_id", match=models.MatchValue(value=str(project_id))))
+        return models.Filter(must=must) if must else None
+
+    def collection_exists(self, collection_name: str) -> bool:
+        if collection_name in self._known_collections:
+            return True
+        try:
+            self.client.get_collection(collection_name=collection_name)
+        except Exception:
+            return False
+        self._known_collections.add(collection_name)
+        return True
+
+    def ensure_collection(self, collection_name: str, get_vector_size: Callable[[], int]) -> bool:
+        """
+        Creates the collection and its payload indexes if it does not exist yet.
+
+        :return: True if the collection already existed, False if it was created.
+        """
+        if self.collection_exists(collection_name):
+            logger.info(f"Collection '{collection_name}' already exists.")
+            return True
+
+        profile = get_collection_profile()
+        logger.info(
+            f"Collection '{collection_name}' not found. Creating new collection "
+            f"with the '{settings.QDRANT_COLLECTION_PROFILE}' profile."
+        )
+        shared = collection_name == settings.SHARED_COLLECTION_NAME
+        self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(
+                size=get_vector_size(),
+                distance=models.Distance.COSINE,
+                on_disk=profile.vectors_on_disk
+            ),
+            quantization_config=build_quantization_config(profile),
+            on_disk_payload=settings.QDRANT_ON_DISK_PAYLOAD,
+            # For a multi-tenant collection, skip the global HNSW graph and build
+            # one per project partition instead, since searches are always filtered.
+            hnsw_config=models.HnswConfigDiff(payload_m=16, m=0) if shared else None
+        )
+        # Index the source (and project) so that filtered lookups and deletes stay fast
+        index_fields = ["project_id", "bucket", "source"] if shared else ["bucket", "source"]
+        for field_name in index_fields:
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=models.PayloadSchemaType.KEYWORD
+            )
+        self._known_collections.add(collection_name)
+        self._search_params[collection_name] = (build_search_params(profile.quantization), time.monotonic())
+        return False
+
+    # Collections can be converted to another profile while the service runs
+    # (see app.tools.collection_profiles), so the quantization each collection
+    # actually has is re-read from Qdrant every SEARCH_PARAMS_TTL_SECONDS.
+
+    def _cached_search_params(self, collection_name: str) -> Tuple[bool, Optional[models.SearchParams]]:
+        cached = self._search_params.get(collection_name)
+        if cached is not None and time.monotonic() - cached[1] < SEARCH_PARAMS_TTL_SECONDS:
+            return True, cached[0]
+        return False, None
+
+    def _remember_search_params(self, collection_name: str, info: models.CollectionInfo) -> Optional[models.SearchParams]:
+        params = build_search_params(get_quantization(info.config.quantization_config))
+        self._search_params[collection_name] = (params, time.monotonic())
+        return params
+
+    def get_search_params(self, collection_name: str) -> Optional[models.SearchParams]:
+        """Returns the search parameters matching the quantization of a collection."""
+        found, params = self._cached_search_params(collection_name)
+        if found:
+            return params
+        return self._remember_search_params(collection_name, self.client.get_collection(collection_name=collection_name))
+
+    async def aget_search_params(self, collection_name: str) -> Optional[models.SearchParams]:
+        found, params = self._cached_search_params(collection_name)
+        if found:
+            return params
+        return self._remember_search_params(collection_name, await self.async_client.get_collection(collection_name=collection_name))
+
+    def has_project(self, project_id: int) -> bool:
+        collection_name = self.get_collection_name(project_id)
+        if not self.collection_exists(collection_name):
+            return False
+        if settings.VECTOR_STORE_MODE == "shared":
+            return self.count(project_id) > 0
+        return True
+
+    def ensure_project(self, project_id: int, get_vector_size: Callable[[], int]) -> bool:
+        return self.ensure_collection(self.get_collection_name(project_id), get_vector_size)
+
+    def get_point_ids_for_source(self, project_id: int, bucket_name: str, source: str) -> Set[str]:
+        source_filter = self.project_filter(
+            project_id,
+            models.FieldCondition(key="source", match=models.MatchValue(value=source)),
+            # Points stored before the bucket was recorded have no bucket field
+            models.Filter(should=[
+                models.FieldCondition(key="bucket", match=models.MatchValue(value=bucket_name)),
+                models.IsEmptyCondition(is_empty=models.PayloadField(key="bucket"))
+            ])
+        )
+        point_ids = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.get_collection_name(project_id),
+                scroll_filter=source_filter,
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            point_ids.update(str(point.id) for point in points)
+            if offset is None:
+                return point_ids
+
+    def upsert(self, project_id: int, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]):
+        self.client.upsert(
+            collection_name=self.get_collection_name(project_id),
+            points=models.Batch(
+                ids=ids,
+                vectors=vectors,
+                payloads=payloads
+            ),
+            wait=True
+        )
+
+    def delete(self, project_id: int, ids: List[str]):
+        self.client.delete(
+            collection_name=self.get_collection_name(project_id),
+            points_selector=models.PointIdsList(points=ids),
+            wait=True
+        )
+
+    def search(self, project_id: int, vector: List[float], limit: int, with_vectors: bool = False) -> List[VectorHit]:
+        collection_name = self.get_collection_name(project_id)
+        hits = self.client.search(
+            collection_name=collection_name,
+            query_vector=vector,
+            query_filter=self.project_filter(project_id),
+            limit=limit,
+            search_params=self.get_search_params(collection_name),
+            with_payload=True,
+            with_vectors=with_vectors
+        )
+        return [
+            VectorHit(id=str(hit.id), payload=hit.payload or {}, score=hit.score, vector=hit.vector)
+            for hit in hits
+        ]
+
+    async def asearch(self, project_id: int, vector: List[float], limit: int, with_vectors: bool = False) -> List[VectorHit]:
+        collection_name = self.get_collection_name(project_id)
+        hits = await self.async_client.search(
+            collection_name=collection_name,
+            query_vector=vector,
+            query_filter=self.project_filter(project_id),
+            limit=limit,
+            search_params=await self.aget_search_params(collection_name),
+            with_payload=True,
+            with_vectors=with_vectors
+        )
+        return [
+            VectorHit(id=str(hit.id), payload=hit.payload or {}, score=hit.score, vector=hit.vector)
+            for hit in hits
+        ]
+
+    def count(self, project_id: int) -> int:
+        return self.client.count(
+            collection_name=self.get_collection_name(project_id),
+            count_filter=self.project_filter(project_id),
+            exact=True
+        ).count
+
+    def iter_points(self, project_id: int, batch_size: int = 256) -> Iterator[List[VectorHit]]:
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.get_collection_name(project_id),
+                scroll_filter=self.project_filter(project_id),
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                yield [VectorHit(id=str(point.id), payload=point.payload or {}, vector=point.vector) for point in points]
+            if offset is None:
+                return
+
+    def drop_project(self, project_id: int):
+        collection_name = self.get_collection_name(project_id)
+        if settings.VECTOR_STORE_MODE == "shared":
+            self.client.delete(
+                collection_name=collection_name,
+                points_selector=models.FilterSelector(filter=self.project_filter(project_id)),
+                wait=True
+            )
+        else:
+            self.client.delete_collection(collection_name=collection_name)
+            self._known_collections.discard(collection_name)
+            self._search_params.pop(collection_name, None)
@@ -0,0 +1,166 @@
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from .config import settings
+from .context_assembly import count_tokens
+from .parse_cache import Element
+
+logger = logging.getLogger(__name__)
+
+SECTION_SEPARATOR = " > "
+
+_oversized_splitter = None
+
+def _split_oversized(text: str) -> List[str]:
+    """Splits a single element that is larger than CHUNK_MAX_TOKENS at natural boundaries."""
+    global _oversized_splitter
+    if _oversized_splitter is None:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        _oversized_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=settings.CONTEXT_TOKEN_ENCODING,
+            chunk_size=settings.CHUNK_MAX_TOKENS,
+            chunk_overlap=settings.CHUNK_OVERLAP_TOKENS
+        )
+    return _oversized_splitter.split_text(text)
+
+def _split_table(text: str, max_tokens: int) -> Iterator[str]:
+    """Splits a table that is too large for one chunk at row (line) boundaries."""
+    rows: List[str] = []
+    size = 0
+    for row in text.splitlines():
+        row_tokens = count_tokens(row) + 1
+        if rows and size + row_tokens > max_tokens:
+            yield "\n".join(rows)
+            rows, size = [], 0
+        rows.append(row)
+        size += row_tokens
+    if rows:
+        yield "\n".join(rows)
+
+class _ChunkBuilder:
+    """
+    Accumulates the elements of one chunk. Headings are held back until an
+    element follows them, so that a chunk never ends with the heading of the
+    next section.
+    """
+    def __init__(self, headings: Optional[List[Tuple[str, int, Optional[int]]]] = None):
+        self.texts: List[str] = []
+        self.tokens = 0
+        self.section: List[str] = []
+        self.page_number: Optional[int] = None
+        self.headings = list(headings or [])  # (text, tokens, page_number) of the trailing headings
+
+    @property
+    def has_content(self) -> bool:
+        return bool(self.texts)
+
+    @property
+    def heading_tokens(self) -> int:
+        return sum(tokens for _, tokens, _ in self.headings)
+
+    def add_heading(self, text: str, tokens: int, metadata: Dict[str, Any]):
+        self.headings.append((text, tokens, metadata.get("page_number")))
+
+    def take_headings(self) -> List[str]:
+        """Removes and returns the trailing headings, to introduce a chunk of their own."""
+        texts = [text for text, _, _ in self.headings]
+        self.headings = []
+        return texts
+
+    def add(self, text: str, tokens: int, section: List[str], metadata: Dict[str, Any]):
+        if not self.texts:
+            # A chunk is attributed to the section of its first non-heading element
+            self.section = list(section)
+        for heading, heading_tokens, page_number in self.headings:
+            if self.page_number is None:
+                self.page_number = page_number
+            self.texts.append(heading)
+            self.tokens += heading_tokens
+        self.headings = []
+        if self.page_number is None:
+            self.page_number = metadata.get("page_number")
+        self.texts.append(text)
+        self.tokens += tokens
+
+def _make_chunk(texts: List[str], object_name: str, section: List[str], chunk_type: str, page_number: Optional[int]) -> Document:
+    metadata: Dict[str, Any] = {
+        'source': object_name,
+        'section': SECTION_SEPARATOR.join(section),
+        'chunk_type': chunk_type,
+    }
+    if page_number is not None:
+        metadata['page_number'] = page_number
+    return Document(page_content="\n\n".join(texts), metadata=metadata)
+
+def chunk_elements(elements: Iterable[Element], object_name: str) -> Iterator[Document]:
+    """
+    Lazily groups parsed elements into chunks of up to CHUNK_MAX_TOKENS tokens
+    along the document's structure:
+
+    - A heading starts a new section; its heading path (e.g. 'Scope > Users')
+      is recorded as the chunk's `section`. Sections smaller than
+      CHUNK_MIN_TOKENS are merged with the next one instead of becoming tiny chunks.
+    - Within a section, consecutive elements are packed together without overlap.
+    - Tables become chunks of their own and are only split, at row boundaries,
+      if they exceed CHUNK_MAX_TOKENS.
+    - An element that alone exceeds CHUNK_MAX_TOKENS is split on its own, with
+      CHUNK_OVERLAP_TOKENS tokens of overlap.
+    """
+    max_tokens = settings.CHUNK_MAX_TOKENS
+    min_tokens = settings.CHUNK_MIN_TOKENS
+    headings: List[Tuple[int, str]] = []  # (depth, text) of the enclosing headings
+    builder = _ChunkBuilder()
+
+    def flush() -> Iterator[Document]:
+        # Headings not followed by any content yet carry over to the next chunk
+        nonlocal builder
+        if builder.has_content:
+            yield _make_chunk(builder.texts, object_name, builder.section, "text", builder.page_number)
+        builder = _ChunkBuilder(builder.headings)
+
+    def section_path() -> List[str]:
+        return [text for _, text in headings]
+
+    for element in elements:
+        text = element["text"].strip()
+        if not text:
+            continue
+        category = element.get("category")
+        metadata = element.get("metadata") or {}
+
+        if category == "Title":
+            depth = metadata.get("category_depth") or 0
+            while headings and headings[-1][0] >= depth:
+                headings.pop()
+            headings.append((depth, text))
+            if builder.tokens >= min_tokens:
+                yield from flush()
+            builder.add_heading(text, count_tokens(text), metadata)
+            continue
+
+        if category == "Table":
+            # Keep tables intact and separate from the surrounding prose
+            yield from flush()
+            headings_before = builder.take_headings()
+            for part in _split_table(text, max_tokens):
+                yield _make_chunk(headings_before + [part], object_name, section_path(), "table", metadata.get("page_number"))
+                headings_before = []
+            continue
+
+        tokens = count_tokens(text)
+        if tokens > max_tokens:
+            yield from flush()
+            headings_before = builder.take_headings()
+            for part in _split_oversized(text):
+                yield _make_chunk(headings_before + [part], object_name, section_path(), "text", metadata.get("page_number"))
+                headings_before = []
+            continue
+
+        # Headings always stay together with the element that follows them
+        if builder.has_content and builder.tokens + builder.heading_tokens + tokens > max_tokens:
+            yield from flush()
+        builder.add(text, tokens, section_path(), metadata)
+
+    yield from flush()
@@ -0,0 +1,99 @@
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+def mmr_select(query_vector: List[float], vectors: List[List[float]], k: int, lambda_mult: float) -> List[int]:
+    """
+    Picks up to `k` candidates by maximal marginal relevance: each step takes the
+    candidate that best trades off similarity to the query (weight `lambda_mult`)
+    against its highest similarity to anything already selected.
+
+    :return: Indexes into `vectors`, in selection order.
+    """
+    if not vectors or k <= 0:
+        return []
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = matrix @ query
+    # Highest similarity of each candidate to the selected set so far
+    redundancy = np.full(len(matrix), -np.inf, dtype=np.float32)
+    available = np.ones(len(matrix), dtype=bool)
+    selected: List[int] = []
+    while len(selected) < min(k, len(matrix)):
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+    return selected
+
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+        _encoding = tiktoken.get_encoding(settings.CONTEXT_TOKEN_ENCODING)
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    return len(_get_encoding().encode(text))
+
+def pack_context(chunks: List[str], token_budget: Optional[int] = None, separator: str = "\n\n") -> str:
+    """
+    Joins chunks, in priority order, into a context string of at most
+    `token_budget` tokens. Chunks that don't fit are skipped so that smaller
+    lower-priority chunks can still use the remaining budget. If not even the
+    first chunk fits, it is truncated to the budget.
+    """
+    budget = token_budget if token_budget is not None else settings.CONTEXT_TOKEN_BUDGET
+    separator_tokens = count_tokens(separator)
+    packed: List[str] = []
+    used = 0
+    for chunk in chunks:
+        cost = count_tokens(chunk) + (separator_tokens if packed else 0)
+        if used + cost <= budget:
+            packed.append(chunk)
+            used += cost
+
+    if not packed and chunks:
+        encoding = _get_encoding()
+        packed.append(encoding.decode(encoding.encode(chunks[0])[:budget]))
+        used = budget
+
+    logger.info(f"Packed {len(packed)} of {len(chunks)} chunks into {used}/{budget} context tokens.")
+    return separator.join(packed)
+
+def group_context(chunks: List[str], group_token_budget: int, max_groups: int, separator: str = "\n\n") -> List[str]:
+    """
+    Splits chunks, in priority order, into at most `max_groups` contexts of up
+    to `group_token_budget` tokens each, so that stories can be generated from
+    them in parallel. Consecutive chunks share a group, so that neighbouring
+    chunks (usually related) stay together. Once `max_groups` groups exist,
+    chunks that don't fit into the last one are dropped.
+    """
+    separator_tokens = count_tokens(separator)
+    groups: List[List[str]] = []
+    used = 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk)
+        if groups and used + separator_tokens + tokens <= group_token_budget:
+            groups[-1].append(chunk)
+            used += separator_tokens + tokens
+        elif len(groups) < max_groups:
+            groups.append([chunk])
+            used = tokens
+    # Packing also truncates a single chunk that is larger than a whole group
+    return [pack_context(group, group_token_budget, separator) for group in groups]
@@ -0,0 +1,186 @@
+import uuid
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models
+
+def create_ingest_job(
+    db: Session,
+    project_id: int,
+    bucket_name: str,
+    object_name: str,
+    etag: Optional[str] = None,
+    batch_id: Optional[str] = None
+) -> models.IngestJob:
+    """
+    Saves a new, queued ingestion job to the database.
+    """
+    db_job = models.IngestJob(
+        id=str(uuid.uuid4()),
+        project_id=project_id,
+        bucket_name=bucket_name,
+        object_name=object_name,
+        etag=etag,
+        batch_id=batch_id,
+        status="queued",
+        stage="queued",
+        timings={}
+    )
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+def get_ingest_job(db: Session, job_id: str):
+    """
+    Retrieves an ingestion job by its ID.
+    """
+    return db.query(models.IngestJob).filter(models.IngestJob.id == job_id).first()
+
+def update_ingest_job(db: Session, job_id: str, **fields):
+    """
+    Updates the given fields of an ingestion job. Timings are merged into the
+    existing ones rather than replacing them.
+    """
+    db_job = get_ingest_job(db, job_id)
+    if db_job is None:
+        return None
+    for key, value in fields.items():
+        if key == "timings":
+            value = {**(db_job.timings or {}), **value}
+        setattr(db_job, key, value)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+def is_revision_ingested(db: Session, project_id: int, bucket_name: str, object_name: str, etag: str) -> bool:
+    """
+    Checks whether this revision (ETag) of an object was already ingested into the project.
+    """
+    return db.query(models.IngestJob.id).filter(
+        models.IngestJob.project_id == project_id,
+        models.IngestJob.bucket_name == bucket_name,
+        models.IngestJob.object_name == object_name,
+        models.IngestJob.etag == etag,
+        models.IngestJob.status == "completed"
+    ).first() is not None
+
+def abandon_unfinished_batch_jobs(db: Session, batch_id: str) -> int:
+    """
+    Marks a bulk ingest's jobs that never finished as failed.
+    """
+    count = db.query(models.IngestJob).filter(
+        models.IngestJob.batch_id == batch_id,
+        models.IngestJob.status.in_(["queued", "running", "retrying"])
+    ).update({"status": "failed", "error": "Abandoned when the bulk ingest was restarted."}, synchronize_session=False)
+    db.commit()
+    return count
+
+def create_ingest_batch(db: Session, project_id: int, bucket_name: str, prefix: str, parallelism: int) -> models.IngestBatch:
+    """
+    Saves a new, queued bulk ingest to the database.
+    """
+    db_batch = models.IngestBatch(
+        id=str(uuid.uuid4()),
+        project_id=project_id,
+        bucket_name=bucket_name,
+        prefix=prefix,
+        parallelism=parallelism,
+        status="queued"
+    )
+    db.add(db_batch)
+    db.commit()
+    db.refresh(db_batch)
+    return db_batch
+
+def get_ingest_batch(db: Session, batch_id: str):
+    """
+    Retrieves a bulk ingest by its ID.
+    """
+    return db.query(models.IngestBatch).filter(models.IngestBatch.id == batch_id).first()
+
+def update_ingest_batch(db: Session, batch_id: str, **fields):
+    """
+    Updates the given fields of a bulk ingest.
+    """
+    db_batch = get_ingest_batch(db, batch_id)
+    if db_batch is None:
+        return None
+    for key, value in fields.items():
+        setattr(db_batch, key, value)
+    db.commit()
+    db.refresh(db_batch)
+    return db_batch
+
+def create_generation_run(
+    db: Session,
+    project_id: int,
+    jira_project_key: str,
+    initial_prompt: str,
+    bypass_generation_cache: bool = False
+) -> models.GenerationRun:
+    """
+    Saves a new, queued generation run to the database.
+    """
+    db_run = models.GenerationRun(
+        id=str(uuid.uuid4()),
+        project_id=project_id,
+        jira_project_key=jira_project_key,
+        initial_prompt=initial_prompt,
+        bypass_generation_cache=bypass_generation_cache,
+        status="queued",
+        node_outputs={},
+        timings={}
+    )
+    db.add(db_run)
+    db.commit()
+    db.refresh(db_run)
+    return db_run
+
+def get_generation_run(db: Session, run_id: str):
+    """
+    Retrieves a generation run by its ID.
+    """
+    return db.query(models.GenerationRun).filter(models.GenerationRun.id == run_id).first()
+
+def update_generation_run(db: Session, run_id: str, **fields):
+    """
+    Updates the given fields of a generation run. Node outputs and timings are
+    merged into the existing ones rather than replacing them.
+    """
+    db_run = get_generation_run(db, run_id)
+    if db_run is None:
+        return None
+    for key, value in fields.items():
+        if key in ("node_outputs", "timings"):
+            value = {**(getattr(db_run, key) or {}), **value}
+        setattr(db_run, key, value)
+    db.commit()
+    db.refresh(db_run)
+    return db_run
+
+def get_project_index_generation(db: Session, project_id: int) -> int:
+    """
+    Returns the project's index generation (0 if its chunks never changed).
+    """
+    generation = db.query(models.ProjectIndexVersion.generation).filter(
+        models.ProjectIndexVersion.project_id == project_id
+    ).scalar()
+    return generation or 0
+
+def bump_project_index_generation(db: Session, project_id: int) -> int:
+    """
+    Atomically increments the project's index generation, creating it if needed.
+    """
+    updated = db.query(models.ProjectIndexVersion).filter(
+        models.ProjectIndexVersion.project_id == project_id
+    ).update({models.ProjectIndexVersion.generation: models.ProjectIndexVersion.generation + 1}, synchronize_session=False)
+    if not updated:
+        db.add(models.ProjectIndexVersion(project_id=project_id, generation=1))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another process created the row first; increment that one instead
+        db.rollback()
+        return bump_project_index_generation(db, project_id)
+    return get_project_index_generation(db, project_id)
@@ -0,0 +1,27 @@
+from sqlalchemy import create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from .config import settings
+
+# Size the pool for the most sessions a process can have open at once: each
+# of the INGEST_PREFETCH jobs a worker runs may be a bulk ingest with up to
+# BULK_INGEST_MAX_PARALLELISM documents in flight, and the API process also
+# runs GENERATION_PREFETCH generation jobs with the in-memory broker.
+# Connections are only opened when needed.
+engine = create_engine(
+    settings.DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=max(5, settings.INGEST_PREFETCH * settings.BULK_INGEST_MAX_PARALLELISM + settings.GENERATION_PREFETCH),
+    max_overflow=10
+)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+Base = declarative_base()
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,57 +1,281 @@
+import itertools
 import logging
-from unstructured.loader import UnstructuredFileLoader
-from typing import List
+import time
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
 
-from .minio_client import download_document
-from .vector_store import vector_store_manager
+from langchain_core.documents import Document
+from minio.error import S3Error
+
+from .chunking import chunk_elements
+from .config import settings
+from .minio_client import open_document, get_document_etag
+from .parse_cache import Element, get_parse_cache
+from .parsers import FAST_PARSERS, ParsedDocument, detect_parser, parser_metrics
+from .parsing_pool import get_parsing_pool, ParseTimeoutError
+from .vector_store import get_vector_store_manager
 
 logger = logging.getLogger(__name__)
 
-def process_document_for_project(project_id: int, bucket_name: str, object_name: str) -> bool:
+def partition_document(file: BinaryIO, object_name: str) -> List[Element]:
+    """
+    Parses a document file object with unstructured, which automatically
+    handles various file types (PDF, DOCX, etc.), into a list of elements
+    with their text, category and metadata.
+    """
+    # Imported lazily: unstructured is by far the most expensive import in the service
+    from unstructured.partition.auto import partition
+
+    return [
+        {"text": str(element), "category": element.category, "metadata": element.metadata.to_dict()}
+        for element in partition(file=file, metadata_filename=object_name)
+    ]
+
+def iter_sections(elements: Iterable[Element], object_name: str) -> Iterator[Document]:
+    """
+    Lazily groups consecutive elements into Documents of about
+    INGEST_SECTION_CHARS characters, joined like UnstructuredFileLoader joins
+    a whole file. Each section can be split and embedded as soon as it is
+    yielded, instead of after the whole document has been assembled.
+    """
+    buffer: List[str] = []
+    size = 0
+    for element in elements:
+        text = element["text"]
+        if not text.strip():
+            continue
+        buffer.append(text)
+        size += len(text) + 2
+        if size >= settings.INGEST_SECTION_CHARS:
+            yield Document(page_content="\n\n".join(buffer), metadata={'source': object_name})
+            buffer = []
+            size = 0
+    if buffer:
+        yield Document(page_content="\n\n".join(buffer), metadata={'source': object_name})
+
+def chunk_stream(elements: Iterable[Element], object_name: str) -> Tuple[Iterator[Document], bool]:
+    """
+    Returns the documents to store for a parsed document, and whether they are
+    final chunks, according to CHUNKING_STRATEGY: 'structured' chunks along
+    headings and tables, 'recursive' leaves splitting to the vector store.
+    """
+    if settings.CHUNKING_STRATEGY == "structured":
+        return chunk_elements(elements, object_name), True
+    return iter_sections(elements, object_name), False
+
+def lookup_parsed_document(bucket_name: str, object_name: str) -> Tuple[Optional[str], Optional[str], Optional[List[Element]]]:
+    """
+    Looks up the current revision of a document in the parse cache.
+
+    :return: The object's ETag and cache key (both None if the cache is
+             disabled) and the cached elements (None on a miss).
+    """
+    cache = get_parse_cache()
+    if cache is None:
+        return None, None, None
+    etag = get_document_etag(bucket_name, object_name)
+    key = cache.make_key(bucket_name, object_name, etag)
+    elements = cache.get(key)
+    if elements is not None:
+        logger.info(f"Using cached parse of '{object_name}' (ETag {etag}).")
+    return etag, key, elements
+
+def parse_file(file: BinaryIO, object_name: str) -> Tuple[str, List[Element]]:
+    """
+    Routes a document to a parser by its type: simple formats (text, Markdown,
+    HTML, CSV, JSON) go to fast native parsers, everything else to unstructured.
+
+    :return: The name of the parser used and the parsed elements.
+    """
+    parser = detect_parser(object_name, file)
+    if parser in FAST_PARSERS:
+        return parser, list(FAST_PARSERS[parser](file, object_name))
+    return "unstructured", partition_document(file, object_name)
+
+def parse_document_revision(bucket_name: str, object_name: str, etag: Optional[str] = None, cache_key: Optional[str] = None) -> ParsedDocument:
+    """
+    Streams a document from MinIO straight into its parser. The buffer (or its
+    spilled temp file) is released as soon as parsing finishes.
+
+    :param etag: If given, only read this revision of the object.
+    :param cache_key: Parse cache key of that revision, from
+                      `lookup_parsed_document`; an unstructured parse is stored under it.
+    """
+    started = time.perf_counter()
+    # Read exactly the revision the cache key was computed for
+    with open_document(bucket_name, object_name, etag=etag) as file:
+        parser, elements = parse_file(file, object_name)
+    if cache_key is not None and parser == "unstructured":
+        get_parse_cache().put(cache_key, elements)
+    return ParsedDocument(parser, time.perf_counter() - started, elements)
+
+def fetch_and_parse_document(bucket_name: str, object_name: str) -> ParsedDocument:
+    """
+    Fetches and parses a document in this process.
+
+    Documents parsed with unstructured are cached per object revision, so an
+    unchanged document is neither downloaded nor parsed again. Fast-path
+    formats parse quicker than a cache round trip and are not cached.
+    """
+    started = time.perf_counter()
+    etag = key = None
+    if detect_parser(object_name) == "unstructured":
+        etag, key, elements = lookup_parsed_document(bucket_name, object_name)
+        if elements is not None:
+            return ParsedDocument("cache", time.perf_counter() - started, elements)
+    parsed = parse_document_revision(bucket_name, object_name, etag, key)
+    return parsed._replace(seconds=time.perf_counter() - started)
+
+def parse_document(bucket_name: str, object_name: str) -> List[Element]:
+    """
+    Parses a document and records per-parser timings. Fast-path formats are
+    parsed in-process; unstructured runs in the parsing worker pool, or
+    in-process if PARSER_WORKERS is 0. Cached parses skip the pool; on a miss,
+    the worker reads and caches the revision that was looked up.
+    """
+    pool = get_parsing_pool()
+    try:
+        if pool is None or detect_parser(object_name) != "unstructured":
+            parsed = fetch_and_parse_document(bucket_name, object_name)
+        else:
+            started = time.perf_counter()
+            etag, key, elements = lookup_parsed_document(bucket_name, object_name)
+            if elements is not None:
+                parsed = ParsedDocument("cache", time.perf_counter() - started, elements)
+            else:
+                parsed = pool.parse(bucket_name, object_name, etag=etag, cache_key=key)
+    except Exception:
+        parser_metrics.record_error(detect_parser(object_name))
+        raise
+
+    parser_metrics.record(parsed)
+    logger.info(f"Parsed '{object_name}' into {len(parsed.elements)} elements with the {parsed.parser} parser in {parsed.seconds:.2f}s.")
+    return parsed.elements
+
+class ElementStreamError(Exception):
+    """Raised when fetching or parsing a document fails after its first elements were handed out."""
+
+def stream_fast_parsed_document(bucket_name: str, object_name: str, parser: str) -> Iterator[Element]:
+    """
+    Streams a document from MinIO through a fast-path parser, yielding each
+    element as soon as it is parsed, so that chunking and embedding run while
+    the rest of the document is still being parsed. Only the time spent
+    fetching and parsing counts towards the parser's timings.
+    """
+    started = time.perf_counter()
+    seconds = 0.0
+    count = 0
+    try:
+        with open_document(bucket_name, object_name) as file:
+            elements = FAST_PARSERS[parser](file, object_name)
+            for element in elements:
+                seconds += time.perf_counter() - started
+                count += 1
+                yield element
+                started = time.perf_counter()
+            seconds += time.perf_counter() - started
+    except Exception:
+        parser_metrics.record_error(parser)
+        raise
+    parser_metrics.record_parse(parser, seconds, count)
+    logger.info(f"Parsed '{object_name}' into {count} elements with the {parser} parser in {seconds:.2f}s.")
+
+def iter_document_elements(bucket_name: str, object_name: str) -> Iterator[Element]:
+    """
+    Returns a document's elements. Fast-path formats are streamed element by
+    element. Documents parsed with unstructured, in the pool or from the parse
+    cache, arrive as a complete list: unstructured partitions a whole file
+    at once, and workers and the cache hand over whole documents.
+    """
+    parser = detect_parser(object_name)
+    if parser in FAST_PARSERS:
+        return stream_fast_parsed_document(bucket_name, object_name, parser)
+    return iter(parse_document(bucket_name, object_name))
+
+def _guard_elements(elements: Iterator[Element]) -> Iterator[Element]:
+    # Tells failures of the element stream apart from failures of the vector store consuming it
+    try:
+        yield from elements
+    except Exception as e:
+        raise ElementStreamError(f"{type(e).__name__}: {e}") from e
+
+def process_document_for_project(
+    project_id: int,
+    bucket_name: str,
+    object_name: str,
+    progress: Optional[Callable[..., None]] = None
+) -> bool:
     """
-    Orchestrates the process of downloading a document, processing it,
+    Orchestrates the process of fetching a document, processing it,
     and storing it in the vector database for a specific project.
 
     :param project_id: The ID of the project.
     :param bucket_name: The MinIO bucket where the document resides.
     :param object_name: The name of the document object in the bucket.
+    :param progress: Optional callback, called as progress(stage, **fields) when
+                     the document enters a new stage ('parsing', 'embedding',
+                     'completed' or 'failed') and as chunks are stored. Fields
+                     include chunk counts, per-stage timings and the error.
     :return: True if processing was successful, False otherwise.
     """
-    logger.info(f"Starting document processing for project {project_id}, bucket '{bucket_name}', object '{object_name}'.")
+    def report(stage: str, **fields):
+        if progress is not None:
+            progress(stage, **fields)
 
-    # 1. Download the document from MinIO to a local temp file
-    local_file_path = download_document(bucket_name, object_name)
-    if not local_file_path:
-        logger.error("Failed to download document. Aborting processing.")
-        return False
+    logger.info(f"Starting document processing for project {project_id}, bucket '{bucket_name}', object '{object_name}'.")
 
-    # 2. Load the document using UnstructuredFileLoader
-    # This automatically handles various file types (PDF, DOCX, etc.)
+    # 1. Fetch the document and parse it up to its first non-empty element.
+    #    Fast-path formats are parsed further as their chunks are stored;
+    #    unstructured parses whole documents, in a worker process unless disabled.
+    report("parsing")
+    started = time.perf_counter()
     try:
-        logger.info(f"Loading document from local path: {local_file_path}")
-        loader = UnstructuredFileLoader(local_file_path)
-        documents = loader.load()
-
-        # Add the source document name to the metadata of each loaded document part
-        for doc in documents:
-            doc.metadata['source'] = object_name
-
+        elements = iter_document_elements(bucket_name, object_name)
+        first = next((element for element in elements if element["text"].strip()), None)
+    except (S3Error, ConnectionError) as e:
+        logger.error(f"Failed to fetch document from MinIO: {e}")
+        report("failed", error=f"Failed to fetch document from MinIO: {e}")
+        return False
+    except ParseTimeoutError as e:
+        logger.error(f"Gave up parsing document: {e}")
+        report("failed", error=str(e))
+        return False
     except Exception as e:
-        logger.error(f"Failed to load document with Unstructured: {e}")
+        logger.error(f"Failed to parse document: {e}")
+        report("failed", error=f"Failed to load document: {e}")
         return False
+    # For streamed documents, this is the time until the first element; the rest overlaps with storing
+    timings = {"parse_seconds": round(time.perf_counter() - started, 3)}
 
-    if not documents:
+    if first is None:
         logger.warning("Document loaded but resulted in no content.")
+        report("completed", timings=timings)
         return True # Not a failure, but nothing to process
 
-    # 3. Use the VectorStoreManager to process and store the document chunks
+    # 2. Stream the document's chunks through the VectorStoreManager, which
+    #    embeds and stores each batch as soon as it is produced
+    report("embedding", timings=timings)
+    started = time.perf_counter()
     try:
-        vector_store_manager.process_and_store_documents(project_id, documents)
+        documents, chunked = chunk_stream(_guard_elements(itertools.chain([first], elements)), object_name)
+        counts = get_vector_store_manager().process_and_store_documents(
+            project_id,
+            bucket_name,
+            object_name,
+            documents,
+            progress=lambda **counts: report("embedding", **counts),
+            chunked=chunked
+        )
+        timings["store_seconds"] = round(time.perf_counter() - started, 3)
         logger.info("Successfully processed and stored document in vector store.")
+        report("completed", timings=timings, **counts)
         return True
+    except ElementStreamError as e:
+        logger.error(f"Failed to parse document: {e}")
+        timings["store_seconds"] = round(time.perf_counter() - started, 3)
+        report("failed", timings=timings, error=f"Failed to load document: {e}")
+        return False
     except Exception as e:
         logger.error(f"Failed to process and store document in vector store: {e}")
+        timings["store_seconds"] = round(time.perf_counter() - started, 3)
+        report("failed", timings=timings, error=f"Failed to store document in vector store: {e}")
         return False
-
-    # Note: In a production system, you might want to clean up the temp file.
-    # For this project, we can leave it, as the container is ephemeral.
@@ -0,0 +1,65 @@
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from .config import settings
+from .retrieval_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapses whitespace and case so trivially different prompts share a cache entry."""
+    return " ".join(prompt.split()).casefold()
+
+
+class GenerationCache:
+    """
+    Caches the structured output of the user story generation step. Entries are
+    keyed by the normalized prompt, a hash of the packed context (and therefore
+    of the retrieved chunks, in order), the provider, the model and the prompt
+    template version, so re-ingesting a document or changing the model or
+    prompt never serves a stale result.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None):
+        self._entries = LRUCache(max_entries, ttl_seconds)
+
+    @staticmethod
+    def make_key(prompt: str, context: str, provider: str, model: str, template_version: str) -> str:
+        digest = hashlib.sha256()
+        for part in (normalize_prompt(prompt), context, provider, model, template_version):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Any:
+        return self._entries.get(key)
+
+    def put(self, key: str, value: Any):
+        self._entries.put(key, value)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._entries.stats()
+
+
+_generation_cache: Optional[GenerationCache] = None
+_generation_cache_lock = threading.Lock()
+
+def get_generation_cache() -> Optional[GenerationCache]:
+    """Returns the shared generation cache, or None if it is disabled."""
+    global _generation_cache
+    if not settings.GENERATION_CACHE_ENABLED:
+        return None
+    if _generation_cache is None:
+        with _generation_cache_lock:
+            if _generation_cache is None:
+                _generation_cache = GenerationCache(
+                    max_entries=settings.GENERATION_CACHE_SIZE,
+                    ttl_seconds=settings.GENERATION_CACHE_TTL_SECONDS
+                )
+                logger.info(f"Generation cache enabled (max {settings.GENERATION_CACHE_SIZE} entries).")
+    return _generation_cache
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set, Tuple
+
+from . import crud
+from .agents.requirement_generation import GraphObserver, GraphState, run_agent_graph
+from .database import SessionLocal
+from .ingest_queue import JobHandler, get_generation_broker
+from .ingest_worker import create_tables
+
+logger = logging.getLogger(__name__)
+
+class GenerationJobError(Exception):
+    """Raised when a generation attempt fails, so that the broker retries or dead-letters the job."""
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _update_run(run_id: str, **fields):
+    with SessionLocal() as db:
+        return crud.update_generation_run(db, run_id, **fields)
+
+class RunRecorder(GraphObserver):
+    """Records the progress of a generation run in the run store as its nodes run."""
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started_nodes: Set[str] = set()
+
+    async def node_started(self, node: str):
+        self.started_nodes.add(node)
+        await asyncio.to_thread(_update_run, self.run_id, current_node=node)
+
+    async def node_finished(self, node: str, update: Dict[str, Any], seconds: float):
+        await asyncio.to_thread(
+            _update_run, self.run_id,
+            node_outputs={node: update},
+            timings={node: round(seconds, 3)}
+        )
+
+async def execute_generation_run(run_id: str, attempt: int, last_attempt: bool) -> Tuple[Optional[str], bool]:
+    """
+    Runs one attempt of a generation run and records its progress and result in the run store.
+
+    :param last_attempt: Mark the run as failed rather than retrying if this attempt fails.
+    :return: The error message (None on success), and whether the failure should be
+             handed back to the broker, which retries or dead-letters it.
+    """
+    def start() -> Optional[GraphState]:
+        with SessionLocal() as db:
+            run = crud.get_generation_run(db, run_id)
+            if run is None:
+                logger.error(f"Generation run {run_id} not found; dropping it.")
+                return None
+            if run.status == "completed":
+                # Redelivered after the worker finished it but before it acknowledged it
+                logger.info(f"Generation run {run_id} is already completed; skipping it.")
+                return None
+            if run.current_node == "push_to_jira":
+                # Redelivered after a worker died while pushing; pushing again would duplicate issues
+                crud.update_generation_run(
+                    db, run_id, status="failed", finished_at=_now(),
+                    error="Interrupted while pushing stories to Jira; not retried to avoid duplicate issues."
+                )
+                return None
+            crud.update_generation_run(db, run_id, status="running", attempts=attempt + 1, error=None, started_at=_now())
+            return {
+                "project_id": run.project_id,
+                "jira_project_key": run.jira_project_key,
+                "initial_prompt": run.initial_prompt,
+                "retrieved_docs": [],
+                "story_groups": [],
+                "generated_stories": [],
+                "jira_results": [],
+                "bypass_generation_cache": run.bypass_generation_cache,
+                "generation_cache_hit": False,
+                "error": None,
+            }
+
+    initial_state = await asyncio.to_thread(start)
+    if initial_state is None:
+        return None, False
+
+    recorder = RunRecorder(run_id)
+    try:
+        final_state = await run_agent_graph(initial_state, recorder)
+        error = final_state.get("error")
+    except Exception as e:
+        logger.error(f"Generation run {run_id} raised: {e}")
+        final_state, error = {}, f"Requirement generation failed: {e}"
+
+    if error is None:
+        await asyncio.to_thread(
+            _update_run, run_id,
+            status="completed",
+            finished_at=_now(),
+            result={
+                "generated_stories": final_state.get("generated_stories", []),
+                "jira_results": final_state.get("jira_results", []),
+                "generation_cache_hit": final_state.get("generation_cache_hit", False),
+            }
+        )
+        logger.info(f"Generation run {run_id} completed.")
+        return None, False
+
+    # Retrying after stories were (partially) pushed would create duplicate issues
+    retry = "push_to_jira" not in recorder.started_nodes
+    if retry and not last_attempt:
+        await asyncio.to_thread(_update_run, run_id, status="retrying", error=error)
+    else:
+        await asyncio.to_thread(_update_run, run_id, status="failed", error=error, finished_at=_now())
+    return error, retry
+
+async def run_generation_job(message: Dict[str, Any]):
+    """
+    Processes one message from the generation queue.
+
+    :param message: A generation job (job_id), plus its attempt.
+    :raises GenerationJobError: If the run failed before pushing to Jira, so that the broker retries it.
+    """
+    error, retry = await execute_generation_run(
+        message["job_id"],
+        attempt=message.get("attempt", 0),
+        last_attempt=get_generation_broker().is_last_attempt(message)
+    )
+    if retry:
+        raise GenerationJobError(error)
+
+def make_generation_handler(loop: asyncio.AbstractEventLoop) -> JobHandler:
+    """
+    Returns a job handler that runs generation jobs on `loop`. All runs of a
+    process share one event loop, as do the pooled LLM and HTTP clients they use.
+    """
+    def handle(message: Dict[str, Any]):
+        asyncio.run_coroutine_threadsafe(run_generation_job(message), loop).result()
+    return handle
+
+def start_in_process_generation_consumer(loop: asyncio.AbstractEventLoop) -> threading.Thread:
+    """
+    Consumes generation jobs on a background thread of the current process and
+    runs them on `loop`. Used with the in-memory broker, which cannot be shared
+    with separate workers.
+    """
+    thread = threading.Thread(
+        target=get_generation_broker().consume,
+        args=(make_generation_handler(loop),),
+        name="generation-consumer",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    create_tables()
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="generation-loop", daemon=True).start()
+    broker = get_generation_broker()
+    try:
+        broker.consume(make_generation_handler(loop))
+    except KeyboardInterrupt:
+        logger.info("Generation worker interrupted; shutting down.")
+    finally:
+        broker.stop()
+        loop.call_soon_threadsafe(loop.stop)
+
+if __name__ == "__main__":
+    main()
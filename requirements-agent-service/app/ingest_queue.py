@@ -0,0 +1,278 @@
+import json
+import logging
+import queue
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# A job handler processes one message. Raising an exception marks the attempt
+# as failed: the job is retried, or dead-lettered once out of retries.
+JobHandler = Callable[[Dict[str, Any]], None]
+
+def _next_attempt(message: Dict[str, Any]) -> Dict[str, Any]:
+    return {**message, "attempt": message.get("attempt", 0) + 1}
+
+class BaseBroker(ABC):
+    """
+    A durable queue of ingestion or generation jobs. Messages are JSON-serializable dicts
+    with an 'attempt' counter that starts at 0.
+    """
+    def __init__(self, queue_name: str, prefetch: int, max_retries: int, retry_delay: float):
+        self.queue_name = queue_name
+        self.prefetch = prefetch
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def is_last_attempt(self, message: Dict[str, Any]) -> bool:
+        """Whether a failure of this delivery sends the job to the dead-letter queue."""
+        return message.get("attempt", 0) >= self.max_retries
+
+    @abstractmethod
+    def publish(self, message: Dict[str, Any]):
+        """Persists a new job message in the queue."""
+
+    @abstractmethod
+    def consume(self, handler: JobHandler):
+        """
+        Runs `handler` for each message, with up to `prefetch` messages in
+        progress at once. Blocks until the consumer is stopped.
+        """
+
+    @abstractmethod
+    def stop(self):
+        """Stops consuming and releases the broker connection."""
+
+class RabbitMQBroker(BaseBroker):
+    """
+    Job queue on RabbitMQ. Declares three durable queues on the default
+    exchange:
+
+    - `<name>`: jobs to process. Rejected messages are dead-lettered to `<name>.dead`.
+    - `<name>.retry`: failed jobs wait here for the retry delay, then expire back into `<name>`.
+    - `<name>.dead`: jobs that failed on every attempt, kept for inspection.
+
+    Messages are persistent and published with confirms, so an accepted job
+    survives a broker restart. Workers acknowledge a message only once its job
+    has finished, so a job held by a crashed worker is redelivered to another.
+    """
+    def __init__(self, url: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.url = url
+        self.retry_queue = f"{self.queue_name}.retry"
+        self.dead_letter_queue = f"{self.queue_name}.dead"
+        self._publish_connection = None
+        self._publish_channel = None
+        self._publish_lock = threading.Lock()
+        self._consume_connection = None
+
+    def _connect(self):
+        import pika
+        return pika.BlockingConnection(pika.URLParameters(self.url))
+
+    def _declare(self, channel):
+        channel.queue_declare(queue=self.dead_letter_queue, durable=True)
+        channel.queue_declare(queue=self.queue_name, durable=True, arguments={
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": self.dead_letter_queue,
+        })
+        channel.queue_declare(queue=self.retry_queue, durable=True, arguments={
+            "x-message-ttl": int(self.retry_delay * 1000),
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": self.queue_name,
+        })
+
+    @staticmethod
+    def _properties():
+        import pika
+        return pika.BasicProperties(content_type="application/json", delivery_mode=2)
+
+    def _open_publish_channel(self):
+        self._publish_connection = self._connect()
+        self._publish_channel = self._publish_connection.channel()
+        self._declare(self._publish_channel)
+        self._publish_channel.confirm_delivery()
+
+    def _close_publish_connection(self):
+        try:
+            if self._publish_connection is not None and self._publish_connection.is_open:
+                self._publish_connection.close()
+        except Exception:
+            pass
+        self._publish_connection = None
+        self._publish_channel = None
+
+    def publish(self, message: Dict[str, Any]):
+        import pika.exceptions
+        body = json.dumps(message)
+        with self._publish_lock:
+            # The publishing connection is idle between requests, so the broker may
+            # have closed it in the meantime: reconnect once before giving up.
+            for retry in (False, True):
+                try:
+                    if self._publish_channel is None or self._publish_channel.is_closed:
+                        self._open_publish_channel()
+                    self._publish_channel.basic_publish(
+                        exchange="",
+                        routing_key=self.queue_name,
+                        body=body,
+                        properties=self._properties(),
+                        mandatory=True
+                    )
+                    return
+                except pika.exceptions.AMQPError:
+                    self._close_publish_connection()
+                    if retry:
+                        raise
+
+    def consume(self, handler: JobHandler):
+        connection = self._connect()
+        self._consume_connection = connection
+        channel = connection.channel()
+        self._declare(channel)
+        channel.basic_qos(prefetch_count=self.prefetch)
+
+        # Jobs run on worker threads so that the connection keeps answering
+        # heartbeats during long parses. Acks and republishes must happen on the
+        # connection's own thread, so they are handed back via add_callback_threadsafe.
+        executor = ThreadPoolExecutor(max_workers=self.prefetch, thread_name_prefix=f"{self.queue_name}-job")
+
+        def settle(delivery_tag: int, message: Dict[str, Any], error: Optional[BaseException]):
+            if error is None:
+                channel.basic_ack(delivery_tag)
+            elif self.is_last_attempt(message):
+                logger.error(f"Job {message.get('job_id') or message.get('batch_id')} from '{self.queue_name}' failed on its last attempt; dead-lettering it: {error}")
+                channel.basic_nack(delivery_tag, requeue=False)
+            else:
+                logger.warning(f"Job {message.get('job_id') or message.get('batch_id')} from '{self.queue_name}' failed; retrying in {self.retry_delay}s: {error}")
+                channel.basic_publish(
+                    exchange="",
+                    routing_key=self.retry_queue,
+                    body=json.dumps(_next_attempt(message)),
+                    properties=self._properties()
+                )
+                channel.basic_ack(delivery_tag)
+
+        def run(delivery_tag: int, message: Dict[str, Any]):
+            error = None
+            try:
+                handler(message)
+            except Exception as e:
+                error = e
+            connection.add_callback_threadsafe(partial(settle, delivery_tag, message, error))
+
+        def on_message(ch, method, properties, body):
+            try:
+                message = json.loads(body)
+            except ValueError:
+                logger.error(f"Dead-lettering malformed message from '{self.queue_name}': {body[:200]!r}")
+                ch.basic_nack(method.delivery_tag, requeue=False)
+                return
+            executor.submit(run, method.delivery_tag, message)
+
+        channel.basic_consume(queue=self.queue_name, on_message_callback=on_message)
+        logger.info(f"Consuming jobs from '{self.queue_name}' with prefetch {self.prefetch}.")
+        try:
+            channel.start_consuming()
+        finally:
+            executor.shutdown(wait=False)
+
+    def stop(self):
+        connection = self._consume_connection
+        if connection is not None and connection.is_open:
+            connection.add_callback_threadsafe(connection.close)
+        with self._publish_lock:
+            self._close_publish_connection()
+
+class InMemoryBroker(BaseBroker):
+    """
+    In-process stand-in for RabbitMQ with the same retry and dead-letter
+    semantics, for local development and tests. Jobs are lost on restart.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._queue: "queue.Queue" = queue.Queue()
+        self.dead_letters: List[Dict[str, Any]] = []
+        self._stopped = threading.Event()
+
+    def publish(self, message: Dict[str, Any]):
+        self._queue.put(json.loads(json.dumps(message)))
+
+    def _settle(self, message: Dict[str, Any], error: BaseException):
+        if self.is_last_attempt(message):
+            logger.error(f"Job {message.get('job_id') or message.get('batch_id')} from '{self.queue_name}' failed on its last attempt; dead-lettering it: {error}")
+            self.dead_letters.append(message)
+        else:
+            logger.warning(f"Job {message.get('job_id') or message.get('batch_id')} from '{self.queue_name}' failed; retrying in {self.retry_delay}s: {error}")
+            timer = threading.Timer(self.retry_delay, self._queue.put, args=(_next_attempt(message),))
+            timer.daemon = True
+            timer.start()
+
+    def _consume_loop(self, handler: JobHandler):
+        while not self._stopped.is_set():
+            try:
+                message = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                handler(message)
+            except Exception as e:
+                self._settle(message, e)
+
+    def consume(self, handler: JobHandler):
+        threads = [
+            threading.Thread(target=self._consume_loop, args=(handler,), name=f"{self.queue_name}-job-{i}", daemon=True)
+            for i in range(self.prefetch)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self):
+        self._stopped.set()
+
+def _create_broker(queue_name: str, prefetch: int, max_retries: int, retry_delay: float) -> BaseBroker:
+    options = dict(queue_name=queue_name, prefetch=prefetch, max_retries=max_retries, retry_delay=retry_delay)
+    if settings.INGEST_BROKER == "rabbitmq":
+        return RabbitMQBroker(settings.RABBITMQ_URL, **options)
+    if settings.INGEST_BROKER == "memory":
+        return InMemoryBroker(**options)
+    raise ValueError(f"Unknown INGEST_BROKER '{settings.INGEST_BROKER}'.")
+
+_broker: Optional[BaseBroker] = None
+_generation_broker: Optional[BaseBroker] = None
+_broker_lock = threading.Lock()
+
+def get_broker() -> BaseBroker:
+    """Returns the shared ingestion queue broker for INGEST_BROKER, creating it on first call."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = _create_broker(
+                    queue_name=settings.INGEST_QUEUE_NAME,
+                    prefetch=settings.INGEST_PREFETCH,
+                    max_retries=settings.INGEST_MAX_RETRIES,
+                    retry_delay=settings.INGEST_RETRY_DELAY_SECONDS
+                )
+    return _broker
+
+def get_generation_broker() -> BaseBroker:
+    """Returns the shared generation job queue broker for INGEST_BROKER, creating it on first call."""
+    global _generation_broker
+    if _generation_broker is None:
+        with _broker_lock:
+            if _generation_broker is None:
+                _generation_broker = _create_broker(
+                    queue_name=settings.GENERATION_QUEUE_NAME,
+                    prefetch=settings.GENERATION_PREFETCH,
+                    max_retries=settings.GENERATION_MAX_RETRIES,
+                    retry_delay=settings.GENERATION_RETRY_DELAY_SECONDS
+                )
+    return _generation_broker
@@ -0,0 +1,222 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from . import crud, models
+from .database import SessionLocal, engine
+from .document_processor import process_document_for_project
+from .ingest_queue import get_broker
+from .minio_client import get_document_etag, list_documents
+from .parsing_pool import shutdown_parsing_pool
+
+logger = logging.getLogger(__name__)
+
+class IngestJobError(Exception):
+    """Raised when an ingestion attempt fails, so that the broker retries or dead-letters the job."""
+
+def create_tables():
+    """Creates the ingestion job tables if they don't exist yet."""
+    models.Base.metadata.create_all(bind=engine)
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+# Progress is written in short-lived sessions, so that no database connection
+# is held while a document is being parsed and embedded
+
+def _update_job(job_id: str, **fields) -> Optional[models.IngestJob]:
+    with SessionLocal() as db:
+        return crud.update_ingest_job(db, job_id, **fields)
+
+def _update_batch(batch_id: str, **fields) -> Optional[models.IngestBatch]:
+    with SessionLocal() as db:
+        return crud.update_ingest_batch(db, batch_id, **fields)
+
+def ingest_document_job(job_id: str, project_id: int, bucket_name: str, object_name: str, attempt: int, last_attempt: bool) -> Optional[str]:
+    """
+    Runs one attempt of a document ingestion job and records its progress in the job store.
+
+    :param last_attempt: Mark the job as failed rather than retrying if this attempt fails.
+    :return: None on success, otherwise the error message.
+    """
+    with SessionLocal() as db:
+        job = crud.get_ingest_job(db, job_id)
+        if job is not None and job.status == "completed":
+            # Redelivered after the worker finished it but before it acknowledged it
+            logger.info(f"Ingestion job {job_id} is already completed; skipping it.")
+            return None
+
+        crud.update_ingest_job(db, job_id, status="running", attempts=attempt + 1, error=None, started_at=_now())
+
+    def progress(stage: str, **fields):
+        if stage == "completed":
+            fields.update(status="completed", finished_at=_now())
+        _update_job(job_id, stage=stage, **fields)
+
+    if process_document_for_project(project_id, bucket_name, object_name, progress=progress):
+        return None
+
+    if last_attempt:
+        job = _update_job(job_id, status="failed", finished_at=_now())
+    else:
+        job = _update_job(job_id, status="retrying")
+    return (job.error if job is not None else None) or f"Ingestion of '{object_name}' failed."
+
+def run_document_job(message: Dict[str, Any]):
+    """
+    Processes a single-document ingestion message.
+
+    :raises IngestJobError: If the document could not be ingested.
+    """
+    job_id = message["job_id"]
+    if not message.get("etag"):
+        # Remember which revision is being ingested, so that bulk ingests can skip it later
+        try:
+            with SessionLocal() as db:
+                crud.update_ingest_job(db, job_id, etag=get_document_etag(message["bucket_name"], message["object_name"]))
+        except Exception as e:
+            logger.warning(f"Could not look up the ETag of '{message['object_name']}': {e}")
+
+    error = ingest_document_job(
+        job_id,
+        message["project_id"],
+        message["bucket_name"],
+        message["object_name"],
+        attempt=message.get("attempt", 0),
+        last_attempt=get_broker().is_last_attempt(message)
+    )
+    if error is not None:
+        raise IngestJobError(error)
+
+def run_bulk_job(message: Dict[str, Any]):
+    """
+    Processes a bulk ingestion message: lists the objects under the prefix,
+    skips revisions that were already ingested into the project, and ingests
+    the rest with up to `parallelism` documents in flight. Each document gets
+    its own IngestJob; the IngestBatch aggregates their progress.
+
+    A failed document is recorded on its job and in the batch's failure count
+    rather than retried; running the same bulk ingest again picks it up.
+
+    :raises IngestJobError: If the objects could not be listed.
+    """
+    batch_id = message["batch_id"]
+    project_id = message["project_id"]
+    bucket_name = message["bucket_name"]
+
+    with SessionLocal() as db:
+        batch = crud.get_ingest_batch(db, batch_id)
+        if batch is None:
+            logger.error(f"Bulk ingest {batch_id} not found; dropping it.")
+            return
+        if batch.status == "completed":
+            logger.info(f"Bulk ingest {batch_id} is already completed; skipping it.")
+            return
+        parallelism = batch.parallelism
+        # Jobs left unfinished by an earlier, interrupted delivery of this batch are replaced below
+        crud.abandon_unfinished_batch_jobs(db, batch_id)
+        crud.update_ingest_batch(db, batch_id, status="listing", error=None, started_at=_now(), finished_at=None)
+
+        try:
+            objects = list(list_documents(bucket_name, batch.prefix))
+        except Exception as e:
+            status = "failed" if get_broker().is_last_attempt(message) else "queued"
+            crud.update_ingest_batch(db, batch_id, status=status, error=f"Failed to list objects: {e}")
+            raise IngestJobError(f"Failed to list objects in bucket '{bucket_name}': {e}")
+
+        pending = []
+        skipped = 0
+        for object_name, etag in objects:
+            if crud.is_revision_ingested(db, project_id, bucket_name, object_name, etag):
+                skipped += 1
+                continue
+            job = crud.create_ingest_job(db, project_id, bucket_name, object_name, etag=etag, batch_id=batch_id)
+            pending.append((job.id, object_name))
+
+        logger.info(
+            f"Bulk ingest {batch_id}: {len(objects)} object(s) under '{batch.prefix}' in '{bucket_name}', "
+            f"{skipped} already ingested, {len(pending)} to ingest with parallelism {parallelism}."
+        )
+        crud.update_ingest_batch(
+            db, batch_id,
+            status="running",
+            docs_total=len(objects),
+            docs_skipped=skipped,
+            docs_completed=0,
+            docs_failed=0,
+            chunks_total=0,
+            chunks_upserted=0
+        )
+
+    # The batch's session is closed from here on; each document and progress
+    # update uses its own short-lived session
+    totals = {"docs_completed": 0, "docs_failed": 0, "chunks_total": 0, "chunks_upserted": 0}
+    totals_lock = threading.Lock()
+
+    def ingest(job_id: str, object_name: str):
+        error = ingest_document_job(job_id, project_id, bucket_name, object_name, attempt=0, last_attempt=True)
+        with SessionLocal() as job_db:
+            job = crud.get_ingest_job(job_db, job_id)
+            with totals_lock:
+                totals["docs_failed" if error else "docs_completed"] += 1
+                if job is not None:
+                    totals["chunks_total"] += job.chunks_total
+                    totals["chunks_upserted"] += job.chunks_upserted
+                crud.update_ingest_batch(job_db, batch_id, **totals)
+
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="bulk-ingest") as executor:
+        futures = [executor.submit(ingest, job_id, object_name) for job_id, object_name in pending]
+    for future in futures:
+        if future.exception() is not None:
+            logger.error(f"Bulk ingest {batch_id}: failed to record a document's result: {future.exception()}")
+
+    batch = _update_batch(batch_id, status="completed", finished_at=_now())
+    logger.info(
+        f"Bulk ingest {batch_id} finished: {batch.docs_completed} ingested, {batch.docs_failed} failed, "
+        f"{batch.docs_skipped} skipped in {batch.elapsed_seconds:.1f}s "
+        f"({batch.docs_per_second:.2f} docs/s, {batch.chunks_per_second:.1f} chunks/s)."
+    )
+
+def run_ingest_job(message: Dict[str, Any]):
+    """
+    Processes one message from the ingestion queue.
+
+    :param message: A 'document' job (job_id, project_id, bucket_name, object_name)
+                    or a 'bulk' job (batch_id, project_id, bucket_name), plus its attempt.
+    :raises IngestJobError: If the job failed and should be retried.
+    """
+    if message.get("type") == "bulk":
+        run_bulk_job(message)
+    else:
+        run_document_job(message)
+
+def start_in_process_consumer() -> threading.Thread:
+    """
+    Consumes ingestion jobs on a background thread of the current process.
+    Used with the in-memory broker, which cannot be shared with separate workers.
+    """
+    thread = threading.Thread(
+        target=get_broker().consume,
+        args=(run_ingest_job,),
+        name="ingest-consumer",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    create_tables()
+    broker = get_broker()
+    try:
+        broker.consume(run_ingest_job)
+    except KeyboardInterrupt:
+        logger.info("Ingestion worker interrupted; shutting down.")
+    finally:
+        broker.stop()
+        shutdown_parsing_pool()
+
+if __name__ == "__main__":
+    main()
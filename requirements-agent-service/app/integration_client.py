@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import random
+import re
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Worth retrying: the request may not have reached Jira, or Jira is briefly unavailable
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+# The integration service names the existing issue in its 409 detail
+_SYNCED_ISSUE = re.compile(r"synced to Jira issue '([^']+)'")
+
+def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+    """
+    Returns the delay before a retry: the server's Retry-After if it is a
+    valid number of seconds, or jittered exponential backoff otherwise,
+    never more than JIRA_PUSH_RETRY_MAX_DELAY_SECONDS.
+    """
+    if retry_after is not None:
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            seconds = -1.0
+        if 0 <= seconds < float("inf"):
+            return min(seconds, settings.JIRA_PUSH_RETRY_MAX_DELAY_SECONDS)
+    delay = min(settings.JIRA_PUSH_RETRY_BASE_DELAY_SECONDS * 2 ** attempt, settings.JIRA_PUSH_RETRY_MAX_DELAY_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+class IntegrationClient:
+    """
+    A pooled keep-alive client for the integration service. At most
+    JIRA_PUSH_CONCURRENCY requests are in flight at once, across all runs
+    sharing the client.
+    """
+    def __init__(self):
+        self.http = httpx.AsyncClient(
+            base_url=settings.INTEGRATION_SERVICE_URL,
+            timeout=settings.JIRA_PUSH_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=settings.JIRA_PUSH_CONCURRENCY,
+                max_keepalive_connections=settings.JIRA_PUSH_CONCURRENCY
+            )
+        )
+        self._slots = asyncio.Semaphore(settings.JIRA_PUSH_CONCURRENCY)
+
+    async def create_jira_issue(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Creates a Jira issue through the integration service. Timeouts,
+        connection errors and 429/502/503/504 responses are retried with
+        jittered exponential backoff. The payload, and with it the internal ID,
+        is the same on every attempt. A 409 therefore means that an earlier
+        attempt went through even though its response was lost, and it is
+        reported as success with `already_synced` set.
+
+        :return: The integration service's response.
+        :raises httpx.HTTPError: If the issue could not be created.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self._slots:
+                    response = await self.http.post("/integrations/jira/issues", json=payload)
+                if response.status_code == 409:
+                    detail = response.json().get("detail", "")
+                    match = _SYNCED_ISSUE.search(detail)
+                    logger.info(f"'{payload['internal_id']}' was already synced to Jira: {detail}")
+                    return {"jira_key": match.group(1) if match else None, "internal_id": payload["internal_id"], "already_synced": True}
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= settings.JIRA_PUSH_MAX_RETRIES:
+                    response.raise_for_status()
+                    return response.json()
+                reason = f"status {response.status_code}"
+                retry_after = response.headers.get("retry-after")
+            except httpx.TransportError as e:
+                if attempt >= settings.JIRA_PUSH_MAX_RETRIES:
+                    raise
+                reason, retry_after = f"{type(e).__name__}: {e}", None
+
+            delay = _retry_delay(attempt, retry_after)
+            attempt += 1
+            logger.warning(
+                f"Pushing '{payload['title']}' to Jira failed ({reason}); "
+                f"retrying in {delay:.1f}s (retry {attempt}/{settings.JIRA_PUSH_MAX_RETRIES})."
+            )
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+# One client per event loop, since httpx connection pools can't be shared between loops
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, IntegrationClient]" = weakref.WeakKeyDictionary()
+
+def get_integration_client() -> IntegrationClient:
+    """Returns the integration service client of the running event loop, creating it on first call."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = IntegrationClient()
+    return client
+
+async def close_integration_client():
+    """Closes the integration service client of the running event loop, if it has one."""
+    client: Optional[IntegrationClient] = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limited, or a provider that is temporarily overloaded
+RETRYABLE_STATUS_CODES = {429, 503}
+# ChatOllama reports HTTP errors as a ValueError carrying only a message
+_STATUS_IN_MESSAGE = re.compile(r"status code (\d{3})")
+
+class ProviderQueueFullError(Exception):
+    """Raised when too many requests are already waiting for an LLM provider."""
+
+def _status_code(error: Exception) -> Optional[int]:
+    """Extracts the HTTP status from OpenAI SDK, httpx and Ollama exceptions."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status
+    match = _STATUS_IN_MESSAGE.search(str(error))
+    return int(match.group(1)) if match else None
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        seconds = float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+    # Ignore negative, infinite and NaN values
+    return seconds if seconds is not None and 0 <= seconds < float("inf") else None
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Honours Retry-After if the provider sent one, otherwise backs off
+    exponentially with jitter, never waiting more than LLM_RETRY_MAX_DELAY_SECONDS.
+    """
+    delay = _retry_after(error)
+    if delay is not None:
+        return min(delay, settings.LLM_RETRY_MAX_DELAY_SECONDS)
+    delay = min(settings.LLM_RETRY_BASE_DELAY_SECONDS * 2 ** attempt, settings.LLM_RETRY_MAX_DELAY_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+def get_model_name(provider: Optional[str] = None) -> str:
+    """Returns the chat model configured for a provider."""
+    provider = provider or settings.LLM_PROVIDER
+    return settings.OLLAMA_MODEL_NAME if provider == "ollama" else settings.OPENAI_MODEL_NAME
+
+class ProviderPool:
+    """
+    Limits the number of concurrent requests to one LLM provider. Requests
+    beyond `max_concurrency` wait in a FIFO queue of at most `max_queue`
+    entries; beyond that they are rejected with ProviderQueueFullError.
+    Rate-limited requests are retried with exponential backoff and jitter,
+    without holding a slot while they wait.
+    """
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def is_saturated(self) -> bool:
+        return self.queued >= self.max_queue
+
+    async def _acquire(self):
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+        if self.is_saturated():
+            self.rejected += 1
+            raise ProviderQueueFullError(f"Too many requests are waiting for {self.name}; please retry later.")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter  # Resolved by _release, which hands its slot over to us
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # The slot was handed over just before the cancellation
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds one of the provider's concurrency slots for the duration of the block."""
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def ainvoke(self, runnable: Any, inputs: Any) -> Any:
+        """
+        Invokes a runnable within a concurrency slot, retrying rate-limited
+        (429) and overloaded (503) responses up to LLM_MAX_RETRIES times.
+        """
+        attempt = 0
+        while True:
+            async with self.slot():
+                try:
+                    result = await runnable.ainvoke(inputs)
+                    self.completed += 1
+                    return result
+                except Exception as e:
+                    status = _status_code(e)
+                    if status not in RETRYABLE_STATUS_CODES or attempt >= settings.LLM_MAX_RETRIES:
+                        self.failed += 1
+                        raise
+                    delay = _retry_delay(e, attempt)
+            attempt += 1
+            await self._wait_before_retry(status, delay, attempt)
+
+    async def astream(self, runnable: Any, inputs: Any) -> AsyncIterator[Any]:
+        """
+        Streams a runnable's output within a concurrency slot, which is held
+        until the stream ends. Rate-limited and overloaded responses are retried
+        as in `ainvoke`, as long as nothing has been streamed yet.
+        """
+        attempt = 0
+        while True:
+            streamed = False
+            async with self.slot():
+                try:
+                    async for chunk in runnable.astream(inputs):
+                        streamed = True
+                        yield chunk
+                    self.completed += 1
+                    return
+                except Exception as e:
+                    status = _status_code(e)
+                    if streamed or status not in RETRYABLE_STATUS_CODES or attempt >= settings.LLM_MAX_RETRIES:
+                        self.failed += 1
+                        raise
+                    delay = _retry_delay(e, attempt)
+            attempt += 1
+            await self._wait_before_retry(status, delay, attempt)
+
+    async def _wait_before_retry(self, status: int, delay: float, attempt: int):
+        self.retries += 1
+        logger.warning(f"{self.name} returned {status}; retrying in {delay:.1f}s (retry {attempt}/{settings.LLM_MAX_RETRIES}).")
+        await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+class LLMProviderRegistry:
+    """
+    Builds chat clients and chains once per provider and reuses them (and the
+    HTTP connection pools inside them) across requests, and routes every call
+    through the provider's ProviderPool.
+    """
+    def __init__(self):
+        self._pools: Dict[str, ProviderPool] = {}
+        self._chat_models: Dict[Tuple[str, bool], Any] = {}
+        self._chains: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def pool(self, provider: Optional[str] = None) -> ProviderPool:
+        provider = provider or settings.LLM_PROVIDER
+        with self._lock:
+            if provider not in self._pools:
+                concurrency = settings.OLLAMA_CHAT_CONCURRENCY if provider == "ollama" else settings.OPENAI_CHAT_CONCURRENCY
+                self._pools[provider] = ProviderPool(provider, concurrency, settings.LLM_MAX_QUEUE_SIZE)
+            return self._pools[provider]
+
+    def get_chat_model(self, provider: Optional[str] = None, json_mode: bool = False):
+        """
+        Returns the shared chat model for a provider.
+
+        :param json_mode: For Ollama, constrain the output to JSON.
+        """
+        provider = provider or settings.LLM_PROVIDER
+        key = (provider, json_mode)
+        with self._lock:
+            if key not in self._chat_models:
+                self._chat_models[key] = self._build_chat_model(provider, json_mode)
+            return self._chat_models[key]
+
+    @staticmethod
+    def _build_chat_model(provider: str, json_mode: bool):
+        if provider == "ollama":
+            from langchain_community.chat_models import ChatOllama
+            logger.info(f"Creating Ollama chat client for model {settings.OLLAMA_MODEL_NAME}.")
+            return ChatOllama(
+                base_url=settings.OLLAMA_BASE_URL,
+                model=settings.OLLAMA_MODEL_NAME,
+                temperature=0,
+                format="json" if json_mode else None,
+                timeout=int(settings.LLM_REQUEST_TIMEOUT_SECONDS)
+            )
+        from langchain_openai import ChatOpenAI
+        logger.info(f"Creating OpenAI chat client for model {settings.OPENAI_MODEL_NAME}.")
+        return ChatOpenAI(
+            model=settings.OPENAI_MODEL_NAME,
+            temperature=0,
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS,
+            # Rate limits are retried by the ProviderPool, outside the concurrency slot
+            max_retries=0
+        )
+
+    def get_chain(self, name: str, builder: Callable[["LLMProviderRegistry", str], Any], provider: Optional[str] = None):
+        """
+        Returns the chain called `name` for a provider, building it with
+        `builder(registry, provider)` on first use.
+        """
+        provider = provider or settings.LLM_PROVIDER
+        key = (provider, name)
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = builder(self, provider)
+            with self._lock:
+                chain = self._chains.setdefault(key, chain)
+        return chain
+
+    async def ainvoke(self, runnable: Any, inputs: Any, provider: Optional[str] = None) -> Any:
+        """Invokes a runnable under the provider's concurrency limit and retry policy."""
+        return await self.pool(provider).ainvoke(runnable, inputs)
+
+    def astream(self, runnable: Any, inputs: Any, provider: Optional[str] = None) -> AsyncIterator[Any]:
+        """Streams a runnable's output under the provider's concurrency limit and retry policy."""
+        return self.pool(provider).astream(runnable, inputs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = dict(self._pools)
+        return {name: pool.stats() for name, pool in pools.items()}
+
+_llm_registry: Optional[LLMProviderRegistry] = None
+_llm_registry_lock = threading.Lock()
+
+def get_llm_registry() -> LLMProviderRegistry:
+    """Returns the shared LLM provider registry, creating it on first call."""
+    global _llm_registry
+    if _llm_registry is None:
+        with _llm_registry_lock:
+            if _llm_registry is None:
+                _llm_registry = LLMProviderRegistry()
+    return _llm_registry
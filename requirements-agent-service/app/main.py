@@ -1,11 +1,28 @@
+import asyncio
+import json
 import logging
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import threading
+from fastapi import FastAPI, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any
+from sqlalchemy.orm import Session
+from typing import Dict, Any, Optional
 
+from . import crud, schemas
 from .config import settings
-from .document_processor import process_document_for_project
-from .agents.requirement_generation import agent_graph, GraphState
+from .database import SessionLocal, get_db
+from .vector_store import get_vector_store_manager
+from .agents.requirement_generation import get_agent_graph, GraphState
+from .agents.requirement_streaming import stream_requirement_generation
+from .startup import warmup, warmup_report
+from .parsing_pool import shutdown_parsing_pool
+from .parsers import parser_metrics
+from .ingest_queue import get_broker, get_generation_broker
+from .ingest_worker import create_tables, start_in_process_consumer
+from .generation_worker import start_in_process_generation_consumer
+from .llm_providers import get_llm_registry
+from .generation_cache import get_generation_cache
+from .integration_client import close_integration_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +34,33 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.on_event("startup")
+def on_startup():
+    logger.info("Requirements Agent Service is starting up.")
+    try:
+        create_tables()
+    except Exception as e:
+        logger.error(f"Failed to create the ingestion job table: {e}")
+    # The in-memory broker only exists in this process, so consume its jobs here;
+    # with RabbitMQ, jobs are processed by separate ingestion and generation workers.
+    if settings.INGEST_BROKER == "memory":
+        start_in_process_consumer()
+        # Generation jobs run on this server's event loop, which they share with the LLM clients
+        start_in_process_generation_consumer(asyncio.get_running_loop())
+    # Clients, the agent graph and heavy modules are created on first use.
+    # Optionally warm them in the background so the server accepts requests
+    # immediately and a down dependency doesn't prevent startup.
+    if settings.WARMUP_ON_STARTUP:
+        threading.Thread(target=warmup, name="warmup", daemon=True).start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    logger.info("Requirements Agent Service is shutting down.")
+    get_broker().stop()
+    get_generation_broker().stop()
+    shutdown_parsing_pool()
+    await close_integration_client()
+
 # --- API Request and Response Models ---
 
 class DocumentIngestRequest(BaseModel):
@@ -26,6 +70,8 @@ class DocumentIngestRequest(BaseModel):
 class RequirementGenerationRequest(BaseModel):
     initial_prompt: str
     jira_project_key: str | None = None
+    # Always call the LLM, even if an identical generation is cached
+    bypass_generation_cache: bool = False
 
 # --- API Endpoints ---
 
@@ -33,36 +79,93 @@ class RequirementGenerationRequest(BaseModel):
 def ingest_document_endpoint(
     project_id: int,
     request: DocumentIngestRequest,
-    background_tasks: BackgroundTasks
+    db: Session = Depends(get_db)
 ):
     """
-    Asynchronously triggers the ingestion of a document for a given project.
-    The document is downloaded from MinIO, processed, and stored in the vector DB.
+    Queues the ingestion of a document for a given project. An ingestion
+    worker downloads it from MinIO, processes it, and stores it in the vector DB.
+    Poll the returned job ID for progress.
     """
     logger.info(f"Received request to ingest document '{request.object_name}' for project {project_id}.")
 
-    # Run the processing in the background to avoid blocking the API response
-    background_tasks.add_task(
-        process_document_for_project,
-        project_id,
-        request.bucket_name,
-        request.object_name
-    )
+    job = crud.create_ingest_job(db, project_id, request.bucket_name, request.object_name)
+    try:
+        get_broker().publish({
+            "type": "document",
+            "job_id": job.id,
+            "project_id": project_id,
+            "bucket_name": request.bucket_name,
+            "object_name": request.object_name,
+            "attempt": 0,
+        })
+    except Exception as e:
+        logger.error(f"Failed to queue ingestion job {job.id}: {e}")
+        crud.update_ingest_job(db, job.id, status="failed", stage="queued", error=f"Failed to queue the job: {e}")
+        raise HTTPException(status_code=503, detail="The document ingestion queue is unavailable. Please retry later.")
 
-    return {"message": "Document ingestion started in the background."}
+    return {"message": "Document ingestion queued.", "job_id": job.id}
 
 
-@app.post("/projects/{project_id}/generate-requirements")
-def generate_requirements_endpoint(
+@app.get("/projects/{project_id}/ingest-jobs/{job_id}", response_model=schemas.IngestJob)
+def get_ingest_job_endpoint(project_id: int, job_id: str, db: Session = Depends(get_db)):
+    """
+    Returns the status, current stage, chunk counts and timings of an ingestion job.
+    """
+    job = crud.get_ingest_job(db, job_id)
+    if job is None or job.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
+
+@app.post("/projects/{project_id}/ingest-bulk", status_code=202)
+def ingest_bulk_endpoint(
     project_id: int,
-    request: RequirementGenerationRequest
-) -> Dict[str, Any]:
+    request: schemas.IngestBatchCreate,
+    db: Session = Depends(get_db)
+):
     """
-    Triggers the LangGraph agent to generate user stories from the
-    ingested documents and push them to Jira.
+    Queues the ingestion of every object under a prefix of a bucket. Objects
+    whose current revision was already ingested into the project are skipped.
+    Poll the returned batch ID for aggregate progress and throughput.
     """
-    logger.info(f"Received request to generate requirements for project {project_id}.")
+    parallelism = request.parallelism or settings.BULK_INGEST_PARALLELISM
+    if parallelism < 1:
+        raise HTTPException(status_code=400, detail="parallelism must be at least 1.")
+    parallelism = min(parallelism, settings.BULK_INGEST_MAX_PARALLELISM)
+
+    logger.info(f"Received request to bulk ingest '{request.prefix}' in bucket '{request.bucket_name}' for project {project_id}.")
+
+    batch = crud.create_ingest_batch(db, project_id, request.bucket_name, request.prefix, parallelism)
+    try:
+        get_broker().publish({
+            "type": "bulk",
+            "batch_id": batch.id,
+            "project_id": project_id,
+            "bucket_name": request.bucket_name,
+            "attempt": 0,
+        })
+    except Exception as e:
+        logger.error(f"Failed to queue bulk ingest {batch.id}: {e}")
+        crud.update_ingest_batch(db, batch.id, status="failed", error=f"Failed to queue the bulk ingest: {e}")
+        raise HTTPException(status_code=503, detail="The document ingestion queue is unavailable. Please retry later.")
+
+    return {"message": "Bulk ingestion queued.", "batch_id": batch.id}
+
 
+@app.get("/projects/{project_id}/ingest-bulk/{batch_id}", response_model=schemas.IngestBatch)
+def get_ingest_batch_endpoint(project_id: int, batch_id: str, db: Session = Depends(get_db)):
+    """
+    Returns the aggregate progress of a bulk ingest: documents listed, skipped,
+    ingested and failed, chunk counts, and throughput in documents and chunks per second.
+    """
+    batch = crud.get_ingest_batch(db, batch_id)
+    if batch is None or batch.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Bulk ingest not found")
+    return batch
+
+
+def _resolve_jira_key(request: RequirementGenerationRequest) -> str:
+    """Returns the Jira project key to push the stories to."""
     # Use the provided Jira project key or fall back to the default from settings
     jira_key = request.jira_project_key or settings.DEFAULT_JIRA_PROJECT_KEY
     if not jira_key:
@@ -70,6 +173,31 @@ def generate_requirements_endpoint(
             status_code=400,
             detail="Jira project key must be provided either in the request or as a default setting."
         )
+    return jira_key
+
+
+def _reject_if_llm_saturated():
+    # Shed load up front rather than retrieving context for a request that would be rejected
+    if get_llm_registry().pool().is_saturated():
+        raise HTTPException(status_code=503, detail=f"Too many generation requests are waiting for {settings.LLM_PROVIDER}. Please retry later.")
+
+
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/projects/{project_id}/generate-requirements")
+async def generate_requirements_endpoint(
+    project_id: int,
+    request: RequirementGenerationRequest
+) -> Dict[str, Any]:
+    """
+    Triggers the LangGraph agent to generate user stories from the
+    ingested documents and push them to Jira.
+    """
+    logger.info(f"Received request to generate requirements for project {project_id}.")
+    jira_key = _resolve_jira_key(request)
+    _reject_if_llm_saturated()
 
     # Prepare the initial state for the graph
     initial_state: GraphState = {
@@ -77,14 +205,17 @@ def generate_requirements_endpoint(
         "jira_project_key": jira_key,
         "initial_prompt": request.initial_prompt,
         "retrieved_docs": [],
+        "story_groups": [],
         "generated_stories": [],
         "jira_results": [],
+        "bypass_generation_cache": request.bypass_generation_cache,
+        "generation_cache_hit": False,
         "error": None,
     }
 
-    # Invoke the agent graph. This is a synchronous call for now.
-    # For long-running tasks, you would use a task queue like Celery.
-    final_state = agent_graph.invoke(initial_state)
+    # Run the agent graph on the event loop. Every node awaits its I/O, so one
+    # worker can serve many concurrent generations.
+    final_state = await get_agent_graph().ainvoke(initial_state)
 
     if final_state.get("error"):
         raise HTTPException(
@@ -93,3 +224,186 @@ def generate_requirements_endpoint(
         )
 
     return {"message": "Requirement generation process completed.", "final_state": final_state}
+
+
+@app.post("/projects/{project_id}/generate-requirements/stream")
+async def stream_requirements_endpoint(
+    project_id: int,
+    request: RequirementGenerationRequest
+) -> StreamingResponse:
+    """
+    Generates user stories like `generate-requirements`, but streams them as
+    Server-Sent Events: each story as soon as the LLM has produced it, and the
+    result of its Jira push, which starts right away.
+    """
+    logger.info(f"Received request to stream requirements for project {project_id}.")
+    jira_key = _resolve_jira_key(request)
+    _reject_if_llm_saturated()
+
+    async def event_stream():
+        async for item in stream_requirement_generation(
+            project_id, jira_key, request.initial_prompt, request.bypass_generation_cache
+        ):
+            yield ": keep-alive\n\n" if item is None else _sse_event(*item)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Ask proxies not to buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/projects/{project_id}/generation-jobs", status_code=202)
+def create_generation_job_endpoint(
+    project_id: int,
+    request: RequirementGenerationRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Queues a requirement generation run. A generation worker runs the agent
+    graph and records each node's output and timing in the run store. Poll the
+    returned job ID, or follow its events, for progress and the final result.
+    Bursts are queued rather than rejected.
+    """
+    logger.info(f"Received request to queue requirement generation for project {project_id}.")
+    jira_key = _resolve_jira_key(request)
+
+    run = crud.create_generation_run(db, project_id, jira_key, request.initial_prompt, request.bypass_generation_cache)
+    try:
+        get_generation_broker().publish({"job_id": run.id, "project_id": project_id, "attempt": 0})
+    except Exception as e:
+        logger.error(f"Failed to queue generation run {run.id}: {e}")
+        crud.update_generation_run(db, run.id, status="failed", error=f"Failed to queue the job: {e}")
+        raise HTTPException(status_code=503, detail="The generation job queue is unavailable. Please retry later.")
+
+    return {"message": "Requirement generation queued.", "job_id": run.id}
+
+
+def _generation_run_snapshot(project_id: int, job_id: str) -> Optional[Dict[str, Any]]:
+    with SessionLocal() as db:
+        run = crud.get_generation_run(db, job_id)
+        if run is None or run.project_id != project_id:
+            return None
+        return schemas.GenerationRun.model_validate(run).model_dump(mode="json")
+
+
+@app.get("/projects/{project_id}/generation-jobs/{job_id}", response_model=schemas.GenerationRun)
+def get_generation_job_endpoint(project_id: int, job_id: str, db: Session = Depends(get_db)):
+    """
+    Returns the status, current node, per-node outputs and timings, and (once
+    completed) the result of a generation run.
+    """
+    run = crud.get_generation_run(db, job_id)
+    if run is None or run.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Generation job not found")
+    return run
+
+
+@app.get("/projects/{project_id}/generation-jobs/{job_id}/events")
+async def generation_job_events_endpoint(project_id: int, job_id: str) -> StreamingResponse:
+    """
+    Streams the progress of a generation run as Server-Sent Events: 'progress'
+    whenever its status or current node changes, 'node' with each node's
+    output and timing as it finishes, and finally 'completed' or 'failed'.
+    """
+    snapshot = await asyncio.to_thread(_generation_run_snapshot, project_id, job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Generation job not found")
+
+    async def event_stream():
+        nonlocal snapshot
+        last_progress = None
+        sent_nodes = set()
+        idle_seconds = 0.0
+        while True:
+            progress = {key: snapshot[key] for key in ("status", "current_node", "attempts", "error")}
+            if progress != last_progress:
+                last_progress = progress
+                idle_seconds = 0.0
+                yield _sse_event("progress", progress)
+            for node, output in snapshot["node_outputs"].items():
+                if node not in sent_nodes:
+                    sent_nodes.add(node)
+                    idle_seconds = 0.0
+                    yield _sse_event("node", {"node": node, "seconds": snapshot["timings"].get(node), "output": output})
+            if snapshot["status"] in ("completed", "failed"):
+                yield _sse_event(snapshot["status"], snapshot)
+                return
+            if idle_seconds >= settings.SSE_KEEPALIVE_SECONDS:
+                idle_seconds = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(settings.GENERATION_EVENTS_POLL_SECONDS)
+            idle_seconds += settings.GENERATION_EVENTS_POLL_SECONDS
+            snapshot = await asyncio.to_thread(_generation_run_snapshot, project_id, job_id) or snapshot
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/embedding-cache/stats")
+def embedding_cache_stats_endpoint() -> Dict[str, Any]:
+    """
+    Returns hit/miss counters and the current size of the embedding cache.
+    """
+    embedding_cache = get_vector_store_manager().embedding_cache
+    if embedding_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_cache.stats()}
+
+
+@app.get("/retrieval-cache/stats")
+def retrieval_cache_stats_endpoint() -> Dict[str, Any]:
+    """
+    Returns hit/miss counters for the query embedding and search result caches.
+    """
+    return get_vector_store_manager().cache_stats()
+
+
+@app.get("/generation-cache/stats")
+def generation_cache_stats_endpoint() -> Dict[str, Any]:
+    """
+    Returns hit/miss counters and the current size of the generation cache.
+    """
+    generation_cache = get_generation_cache()
+    if generation_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **generation_cache.stats()}
+
+
+@app.get("/parser-stats")
+def parser_stats_endpoint() -> Dict[str, Any]:
+    """
+    Returns per-parser counts and timings of the documents parsed by this process.
+    """
+    return parser_metrics.stats()
+
+
+@app.get("/llm-providers/stats")
+def llm_provider_stats_endpoint() -> Dict[str, Any]:
+    """
+    Returns the concurrency limit, in-flight and queued requests, and
+    completion, failure, retry and rejection counts of each LLM provider.
+    """
+    return get_llm_registry().stats()
+
+
+@app.post("/warmup")
+def warmup_endpoint() -> Dict[str, Any]:
+    """
+    Creates the vector store clients and agent graph and imports the heavy
+    modules now instead of on the first request. Returns per-step timings.
+    """
+    report = warmup()
+    return {"ready": all(step["ok"] for step in report.values()), "steps": report}
+
+
+@app.get("/startup-profile")
+def startup_profile_endpoint() -> Dict[str, Any]:
+    """
+    Returns the per-step timings of the most recent warmup.
+    """
+    return {"warmed_up": bool(warmup_report), "steps": warmup_report}
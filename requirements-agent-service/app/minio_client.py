@@ -1,8 +1,12 @@
+import io
 import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, Tuple
+
 from minio import Minio
-from minio.error import S3Error
 from .config import settings
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -17,34 +21,135 @@ except Exception as e:
     logger.error(f"Failed to initialize MinIO client: {e}")
     minio_client = None
 
-def download_document(bucket_name: str, object_name: str) -> str | None:
+class MinioRangeReader(io.RawIOBase):
     """
-    Downloads a document from MinIO and saves it to a temporary local file.
+    A seekable, read-only file object over a MinIO object that fetches only the
+    byte ranges that are actually read. Wrap it in `io.BufferedReader` so that
+    small reads are served from one ranged request per buffer.
+    """
+    def __init__(self, bucket_name: str, object_name: str, size: int, etag: Optional[str] = None):
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.size = size
+        self.etag = etag
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self._position = max(0, self._position)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self.size - self._position)
+        if length <= 0:
+            return 0
+        response = minio_client.get_object(
+            self.bucket_name, self.object_name,
+            offset=self._position, length=length,
+            request_headers=_if_match(self.etag)
+        )
+        try:
+            data = response.read()
+        finally:
+            response.close()
+            response.release_conn()
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+def _if_match(etag: Optional[str]) -> Optional[dict]:
+    # Fail instead of mixing revisions if the object is replaced while it is being read
+    return {"If-Match": f'"{etag}"'} if etag else None
+
+def _uses_range_reads(object_name: str) -> bool:
+    extension = os.path.splitext(object_name)[1].lower()
+    return settings.MINIO_RANGE_READ_ENABLED and extension in settings.MINIO_RANGE_READ_EXTENSIONS
+
+@contextmanager
+def open_document(bucket_name: str, object_name: str, etag: Optional[str] = None) -> Iterator[BinaryIO]:
+    """
+    Opens a document stored in MinIO as a seekable binary file object, without
+    writing it to a named local file.
+
+    The object is streamed into a spooled buffer that stays in memory up to
+    MINIO_SPOOL_MAX_MEMORY_BYTES and spills to an anonymous, uniquely named
+    temporary file beyond that. For extensions in MINIO_RANGE_READ_EXTENSIONS
+    (when MINIO_RANGE_READ_ENABLED is set) the object is instead read lazily
+    with ranged requests. Either way, everything is released when the
+    context exits, including on errors.
 
     :param bucket_name: The MinIO bucket where the document is stored.
     :param object_name: The name of the document object in the bucket.
-    :return: The local path to the downloaded file, or None if download fails.
+    :param etag: If given, only read this revision of the object.
+    :raises ConnectionError: If the MinIO client is not initialized.
+    :raises S3Error: If the object cannot be read.
     """
     if not minio_client:
-        logger.error("MinIO client not initialized.")
-        return None
+        raise ConnectionError("MinIO client not initialized.")
 
-    try:
-        # Create a temporary directory to store the downloaded file
-        temp_dir = "/tmp/documents"
-        os.makedirs(temp_dir, exist_ok=True)
-        local_file_path = os.path.join(temp_dir, object_name)
+    if _uses_range_reads(object_name):
+        stat = minio_client.stat_object(bucket_name, object_name)
+        size = stat.size
+        logger.info(f"Opening {object_name} ({size} bytes) from bucket {bucket_name} with ranged reads.")
+        reader = io.BufferedReader(
+            MinioRangeReader(bucket_name, object_name, size, etag=etag or stat.etag),
+            buffer_size=settings.MINIO_RANGE_READ_BLOCK_BYTES
+        )
+        with reader:
+            yield reader
+        return
 
-        logger.info(f"Downloading {object_name} from bucket {bucket_name} to {local_file_path}...")
+    logger.info(f"Streaming {object_name} from bucket {bucket_name}...")
+    with tempfile.SpooledTemporaryFile(max_size=settings.MINIO_SPOOL_MAX_MEMORY_BYTES) as buffer:
+        response = minio_client.get_object(bucket_name, object_name, request_headers=_if_match(etag))
+        try:
+            for data in response.stream(64 * 1024):
+                buffer.write(data)
+        finally:
+            response.close()
+            response.release_conn()
+        size = buffer.tell()
+        buffer.seek(0)
+        logger.info(f"Fetched {size} bytes of {object_name} ({'in memory' if size <= settings.MINIO_SPOOL_MAX_MEMORY_BYTES else 'spilled to a temp file'}).")
+        yield buffer
+
+def get_document_etag(bucket_name: str, object_name: str) -> str:
+    """
+    Returns the ETag of the current revision of a document.
 
-        minio_client.fget_object(bucket_name, object_name, local_file_path)
+    :raises ConnectionError: If the MinIO client is not initialized.
+    :raises S3Error: If the object does not exist.
+    """
+    if not minio_client:
+        raise ConnectionError("MinIO client not initialized.")
+    return minio_client.stat_object(bucket_name, object_name).etag
 
-        logger.info(f"Successfully downloaded document to {local_file_path}.")
-        return local_file_path
+def list_documents(bucket_name: str, prefix: str = "") -> Iterator[Tuple[str, str]]:
+    """
+    Lists the documents under a prefix, recursively.
 
-    except S3Error as e:
-        logger.error(f"MinIO S3 Error during download: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"An unexpected error occurred during document download: {e}")
-        return None
+    :return: An iterator of (object name, ETag) pairs.
+    :raises ConnectionError: If the MinIO client is not initialized.
+    :raises S3Error: If the bucket cannot be listed.
+    """
+    if not minio_client:
+        raise ConnectionError("MinIO client not initialized.")
+    for obj in minio_client.list_objects(bucket_name, prefix=prefix or None, recursive=True):
+        if not obj.is_dir:
+            yield obj.object_name, obj.etag
@@ -0,0 +1,141 @@
+from datetime import datetime, timezone
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, JSON, ForeignKey, Index
+from sqlalchemy.sql import func
+from .database import Base
+
+class IngestJob(Base):
+    """
+    Tracks one document ingestion from the moment it is queued until a worker
+    completes it or gives up on it.
+    """
+    __tablename__ = "ingest_jobs"
+    __table_args__ = (
+        # Looked up to skip objects whose revision was already ingested
+        Index("ix_ingest_jobs_object", "project_id", "bucket_name", "object_name"),
+    )
+
+    id = Column(String, primary_key=True, index=True)
+    project_id = Column(Integer, index=True, nullable=False)
+    bucket_name = Column(String, nullable=False)
+    object_name = Column(String, nullable=False)
+    # ETag of the object revision being ingested, if known
+    etag = Column(String)
+    # Set for jobs that are part of a bulk ingest
+    batch_id = Column(String, ForeignKey("ingest_batches.id"), index=True)
+
+    # queued, running, retrying, completed or failed
+    status = Column(String, nullable=False, default="queued")
+    # The pipeline stage the job is in, e.g. 'parsing' or 'embedding'
+    stage = Column(String, nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+    chunks_total = Column(Integer, nullable=False, default=0)
+    chunks_upserted = Column(Integer, nullable=False, default=0)
+    chunks_unchanged = Column(Integer, nullable=False, default=0)
+    chunks_deleted = Column(Integer, nullable=False, default=0)
+
+    # Seconds spent per stage, e.g. {"parse_seconds": 1.2, "store_seconds": 3.4}
+    timings = Column(JSON, nullable=False, default=dict)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class IngestBatch(Base):
+    """
+    A bulk ingest of every object under a bucket prefix. Tracks aggregate
+    progress over the per-object IngestJobs it creates.
+    """
+    __tablename__ = "ingest_batches"
+
+    id = Column(String, primary_key=True, index=True)
+    project_id = Column(Integer, index=True, nullable=False)
+    bucket_name = Column(String, nullable=False)
+    prefix = Column(String, nullable=False, default="")
+    parallelism = Column(Integer, nullable=False)
+
+    # queued, listing, running, completed or failed
+    status = Column(String, nullable=False, default="queued")
+    error = Column(Text)
+
+    docs_total = Column(Integer, nullable=False, default=0)
+    docs_skipped = Column(Integer, nullable=False, default=0)
+    docs_completed = Column(Integer, nullable=False, default=0)
+    docs_failed = Column(Integer, nullable=False, default=0)
+    chunks_total = Column(Integer, nullable=False, default=0)
+    chunks_upserted = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        started_at = self.started_at
+        if started_at.tzinfo is None:
+            started_at = started_at.replace(tzinfo=timezone.utc)
+        finished_at = self.finished_at or datetime.now(timezone.utc)
+        if finished_at.tzinfo is None:
+            finished_at = finished_at.replace(tzinfo=timezone.utc)
+        return max((finished_at - started_at).total_seconds(), 0.0)
+
+    @property
+    def docs_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return (self.docs_completed + self.docs_failed) / elapsed if elapsed else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.chunks_total / elapsed if elapsed else 0.0
+
+class GenerationRun(Base):
+    """
+    One run of the requirement generation agent, from the moment it is queued
+    until a worker completes it or gives up on it. Stores what each node of the
+    graph produced and how long it took, and the final result.
+    """
+    __tablename__ = "generation_runs"
+
+    id = Column(String, primary_key=True, index=True)
+    project_id = Column(Integer, index=True, nullable=False)
+    jira_project_key = Column(String, nullable=False)
+    initial_prompt = Column(Text, nullable=False)
+    bypass_generation_cache = Column(Boolean, nullable=False, default=False)
+
+    # queued, running, retrying, completed or failed
+    status = Column(String, nullable=False, default="queued")
+    # The graph node that is running, or the last one that ran
+    current_node = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+    # State updates returned by each node, e.g. {"generate_user_stories": {"generated_stories": [...]}}
+    node_outputs = Column(JSON, nullable=False, default=dict)
+    # Seconds spent per node, e.g. {"retrieve_documents": 0.4, "generate_user_stories": 7.9}
+    timings = Column(JSON, nullable=False, default=dict)
+    # The generated stories and Jira results once the run has completed
+    result = Column(JSON)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ProjectIndexVersion(Base):
+    """
+    A counter per project that is incremented whenever the project's stored
+    chunks change. Processes that cache search results compare it with the
+    value their cached results were computed under, so that an ingest in one
+    process invalidates the caches of all the others.
+    """
+    __tablename__ = "project_index_versions"
+
+    project_id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,96 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+class OllamaBatchEmbeddings(Embeddings):
+    """
+    Embeds texts with Ollama over pooled keep-alive connections.
+
+    Uses the batch endpoint (`/api/embed`, one request per batch of texts)
+    when the server supports it, and otherwise falls back to the single-text
+    endpoint (`/api/embeddings`) with a bounded pool of concurrent requests.
+
+    Texts are prefixed with the same instructions as LangChain's
+    `OllamaEmbeddings`, so vectors stay compatible with ones it produced.
+    """
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        batch_size: int = 32,
+        concurrency: int = 4,
+        timeout: float = 120.0,
+        embed_instruction: str = "passage: ",
+        query_instruction: str = "query: ",
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.embed_instruction = embed_instruction
+        self.query_instruction = query_instruction
+
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        self._client = httpx.Client(base_url=self.base_url, timeout=timeout, limits=limits)
+        self._async_client = httpx.AsyncClient(base_url=self.base_url, timeout=timeout, limits=limits)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ollama-embed")
+        # None until the first request tells us whether /api/embed exists
+        self._batch_supported: Optional[bool] = None
+        self._lock = threading.Lock()
+
+    def _embed_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """Embeds texts with the batch endpoint, or returns None if the server doesn't have it."""
+        response = self._client.post("/api/embed", json={"model": self.model, "input": texts})
+        if response.status_code == 404 and "model" not in response.text.lower():
+            return None
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    def _embed_one(self, text: str) -> List[float]:
+        response = self._client.post("/api/embeddings", json={"model": self.model, "prompt": text})
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+
+            if self._batch_supported is not False:
+                result = self._embed_batch(batch)
+                if result is not None:
+                    self._batch_supported = True
+                    vectors.extend(result)
+                    continue
+                with self._lock:
+                    if self._batch_supported is None:
+                        logger.info("Ollama server has no /api/embed endpoint; using concurrent single-text requests.")
+                    self._batch_supported = False
+
+            vectors.extend(self._executor.map(self._embed_one, batch))
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed([f"{self.embed_instruction}{text}" for text in texts])
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([f"{self.query_instruction}{text}"])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        prompt = f"{self.query_instruction}{text}"
+        if self._batch_supported is not False:
+            response = await self._async_client.post("/api/embed", json={"model": self.model, "input": [prompt]})
+            if not (response.status_code == 404 and "model" not in response.text.lower()):
+                response.raise_for_status()
+                self._batch_supported = True
+                return response.json()["embeddings"][0]
+            self._batch_supported = False
+        response = await self._async_client.post("/api/embeddings", json={"model": self.model, "prompt": prompt})
+        response.raise_for_status()
+        return response.json()["embedding"]
@@ -0,0 +1,233 @@
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when the shape of the cached element list changes
+ELEMENT_FORMAT_VERSION = 1
+
+# A parsed element: {"text": str, "category": str, "metadata": dict}
+Element = Dict[str, Any]
+
+def get_parser_version() -> str:
+    """
+    Identifies the parser that produced a cached element list, so that
+    upgrading unstructured or changing the element format invalidates it.
+    """
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        unstructured_version = version("unstructured")
+    except PackageNotFoundError:
+        unstructured_version = "unknown"
+    return f"unstructured-{unstructured_version}/elements-v{ELEMENT_FORMAT_VERSION}"
+
+def serialize_elements(elements: List[Element]) -> bytes:
+    """Encodes an element list as gzip-compressed JSON."""
+    return gzip.compress(json.dumps(elements, separators=(",", ":"), default=str).encode("utf-8"))
+
+def deserialize_elements(data: bytes) -> List[Element]:
+    return json.loads(gzip.decompress(data).decode("utf-8"))
+
+class BaseParseCache(ABC):
+    """
+    Stores the parsed elements of a document revision, so that rebuilding a
+    collection or re-ingesting an unchanged object doesn't parse it again.
+    Entries are keyed by (bucket, object, ETag, parser version) and evicted
+    once the cache grows past `max_bytes`.
+
+    Failing to read or write the cache is logged and treated as a miss; it
+    never fails an ingest.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.parser_version = get_parser_version()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, bucket_name: str, object_name: str, etag: str) -> str:
+        digest = hashlib.sha256()
+        for part in (bucket_name, object_name, etag, self.parser_version):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Element]]:
+        try:
+            data = self._read(key)
+            elements = deserialize_elements(data) if data is not None else None
+        except Exception as e:
+            # Includes entries that are truncated or corrupt
+            logger.warning(f"Failed to read parsed document cache entry {key}: {e}")
+            elements = None
+        if elements is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return elements
+
+    def put(self, key: str, elements: List[Element]):
+        try:
+            self._write(key, serialize_elements(elements))
+            self._evict()
+        except Exception as e:
+            logger.warning(f"Failed to write parsed document cache entry {key}: {e}")
+
+    @abstractmethod
+    def _read(self, key: str) -> Optional[bytes]:
+        """Returns the stored bytes for `key`, or None if there are none."""
+
+    @abstractmethod
+    def _write(self, key: str, data: bytes):
+        pass
+
+    @abstractmethod
+    def _evict(self):
+        """Removes entries until the cache holds at most `max_bytes`."""
+
+class DiskParseCache(BaseParseCache):
+    """
+    Parse cache in a local directory, one file per entry. Reads refresh an
+    entry's modification time, so eviction is least-recently-used.
+    """
+    def __init__(self, path: str, max_bytes: int):
+        super().__init__(max_bytes)
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json.gz")
+
+    def _read(self, key: str) -> Optional[bytes]:
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass  # Evicted by another process since we read it
+        return data
+
+    def _write(self, key: str, data: bytes):
+        # Write to a temp file and rename it, so readers in other processes never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if not entry.name.endswith(".json.gz"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # Evicted by another process
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            removed = 0
+            for _, size, entry_path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(entry_path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            logger.info(f"Evicted {removed} least recently used entries from the parsed document cache.")
+
+class MinioParseCache(BaseParseCache):
+    """
+    Parse cache in a MinIO bucket, shared by every ingestion worker. MinIO
+    doesn't track reads, so eviction removes the oldest written entries first.
+    """
+    def __init__(self, bucket_name: str, max_bytes: int):
+        super().__init__(max_bytes)
+        from .minio_client import minio_client
+        if not minio_client:
+            raise ConnectionError("MinIO client not initialized.")
+        self.client = minio_client
+        self.bucket_name = bucket_name
+        if not self.client.bucket_exists(bucket_name):
+            self.client.make_bucket(bucket_name)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        from minio.error import S3Error
+        try:
+            response = self.client.get_object(self.bucket_name, key)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def _write(self, key: str, data: bytes):
+        self.client.put_object(
+            self.bucket_name, key, io.BytesIO(data), len(data),
+            content_type="application/gzip"
+        )
+
+    def _evict(self):
+        objects = list(self.client.list_objects(self.bucket_name, recursive=True))
+        total = sum(obj.size for obj in objects)
+        if total <= self.max_bytes:
+            return
+        objects.sort(key=lambda obj: obj.last_modified)
+        removed = 0
+        for obj in objects:
+            if total <= self.max_bytes:
+                break
+            self.client.remove_object(self.bucket_name, obj.object_name)
+            total -= obj.size
+            removed += 1
+        logger.info(f"Evicted {removed} oldest entries from the parsed document cache bucket '{self.bucket_name}'.")
+
+_parse_cache: Optional[BaseParseCache] = None
+_parse_cache_lock = threading.Lock()
+
+def get_parse_cache() -> Optional[BaseParseCache]:
+    """Returns the parse cache for PARSE_CACHE_BACKEND, or None if it is 'none'."""
+    global _parse_cache
+    if settings.PARSE_CACHE_BACKEND == "none":
+        return None
+    if _parse_cache is None:
+        with _parse_cache_lock:
+            if _parse_cache is None:
+                if settings.PARSE_CACHE_BACKEND == "disk":
+                    _parse_cache = DiskParseCache(settings.PARSE_CACHE_PATH, settings.PARSE_CACHE_MAX_BYTES)
+                elif settings.PARSE_CACHE_BACKEND == "minio":
+                    _parse_cache = MinioParseCache(settings.PARSE_CACHE_BUCKET, settings.PARSE_CACHE_MAX_BYTES)
+                else:
+                    raise ValueError(f"Unknown PARSE_CACHE_BACKEND '{settings.PARSE_CACHE_BACKEND}'.")
+                logger.info(f"Parsed document cache ({settings.PARSE_CACHE_BACKEND}) opened for parser {_parse_cache.parser_version}.")
+    return _parse_cache
@@ -0,0 +1,439 @@
+import codecs
+import csv
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from .config import settings
+from .parse_cache import Element
+
+logger = logging.getLogger(__name__)
+
+class ParsedDocument(NamedTuple):
+    """The elements of a document and how they were obtained."""
+    parser: str
+    seconds: float
+    elements: List[Element]
+
+def _element(text: str, category: str, object_name: str, filetype: str, **metadata: Any) -> Element:
+    return {
+        "text": text,
+        "category": category,
+        "metadata": {"filename": os.path.basename(object_name), "filetype": filetype, **metadata},
+    }
+
+def _read_text(file: BinaryIO) -> str:
+    # utf-8-sig also strips a byte order mark; undecodable bytes shouldn't fail an ingest
+    return file.read().decode("utf-8-sig", errors="replace")
+
+def _iter_lines(file: BinaryIO) -> Iterator[str]:
+    """Decodes a file line by line, keeping line endings, without reading it all at once."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    for line in file:
+        yield decoder.decode(line)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def _paragraphs(lines: Iterable[str]) -> Iterator[str]:
+    block: List[str] = []
+    for line in lines:
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield "".join(block).strip()
+            block = []
+    if block:
+        yield "".join(block).strip()
+
+#--------------------------------------------------------------------------
+# Fast-path parsers for simple formats
+#
+# Each parser is a generator that reads its file incrementally and yields
+# every element as soon as it is complete, so a document can be chunked and
+# embedded while the rest of it is still being parsed.
+#--------------------------------------------------------------------------
+
+def parse_text(file: BinaryIO, object_name: str) -> Iterator[Element]:
+    """Splits plain text into paragraphs at blank lines."""
+    for paragraph in _paragraphs(_iter_lines(file)):
+        yield _element(paragraph, "NarrativeText", object_name, "text/plain")
+
+_MD_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_MD_SETEXT = re.compile(r"^(=+|-+)\s*$")
+_MD_LIST_ITEM = re.compile(r"^\s*([-*+]|\d+[.)])\s+")
+_MD_FENCE = re.compile(r"^\s*(```|~~~)")
+
+def parse_markdown(file: BinaryIO, object_name: str) -> Iterator[Element]:
+    """
+    Parses Markdown into titles (ATX and setext headings, with their depth),
+    list items, tables, code blocks and paragraphs.
+    """
+    elements: List[Element] = []
+    block: List[str] = []
+    block_category = "NarrativeText"
+
+    def flush():
+        nonlocal block, block_category
+        text = "\n".join(block).strip()
+        if text:
+            elements.append(_element(text, block_category, object_name, "text/markdown"))
+        block = []
+        block_category = "NarrativeText"
+
+    def title(text: str, depth: int):
+        flush()
+        elements.append(_element(text, "Title", object_name, "text/markdown", category_depth=depth))
+
+    fence = None
+    for line in _iter_lines(file):
+        # Hand out the elements completed by the previous line
+        yield from elements
+        elements.clear()
+
+        line = line.rstrip("\r\n")
+        if fence is not None:
+            block.append(line)
+            if line.strip().startswith(fence):
+                flush()
+                fence = None
+            continue
+
+        fence_match = _MD_FENCE.match(line)
+        if fence_match:
+            flush()
+            fence = fence_match.group(1)
+            block_category = "CodeSnippet"
+            block.append(line)
+            continue
+
+        if not line.strip():
+            flush()
+            continue
+
+        heading = _MD_HEADING.match(line)
+        if heading:
+            title(heading.group(2), len(heading.group(1)) - 1)
+            continue
+
+        if _MD_SETEXT.match(line):
+            if len(block) == 1 and block_category == "NarrativeText":
+                text = block[0].strip()
+                block = []
+                title(text, 0 if line.lstrip().startswith("=") else 1)
+                continue
+            if not block:
+                continue  # Horizontal rule
+
+        if line.lstrip().startswith("|"):
+            if block_category != "Table":
+                flush()
+                block_category = "Table"
+            block.append(line)
+            continue
+
+        if _MD_LIST_ITEM.match(line):
+            flush()
+            block_category = "ListItem"
+            block.append(line.strip())
+            continue
+
+        if block_category == "Table":
+            flush()
+        block.append(line)
+    flush()
+    yield from elements
+
+class _HTMLElementParser(HTMLParser):
+    """Collects the text of block-level HTML elements, skipping scripts, styles and the head."""
+    BLOCK_TAGS = {
+        "p", "div", "section", "article", "header", "footer", "main", "aside", "blockquote",
+        "h1", "h2", "h3", "h4", "h5", "h6", "li", "pre", "dt", "dd", "figcaption", "br", "hr",
+    }
+    SKIP_TAGS = {"script", "style", "head", "noscript", "template"}
+
+    def __init__(self, object_name: str):
+        super().__init__(convert_charrefs=True)
+        self.object_name = object_name
+        self.elements: List[Element] = []
+        self._text: List[str] = []
+        self._category = "NarrativeText"
+        self._depth = None
+        self._skip = 0
+        self._pre = 0
+        self._rows: Optional[List[List[str]]] = None
+        self._cell: Optional[List[str]] = None
+
+    def _flush(self):
+        text = "".join(self._text)
+        text = text.strip() if self._pre else re.sub(r"\s+", " ", text).strip()
+        if text:
+            metadata = {"category_depth": self._depth} if self._depth is not None else {}
+            self.elements.append(_element(text, self._category, self.object_name, "text/html", **metadata))
+        self._text = []
+        self._category = "NarrativeText"
+        self._depth = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag == "table":
+            self._flush()
+            if self._rows is None:
+                self._rows = []
+        elif self._rows is not None:
+            if tag == "tr":
+                self._rows.append([])
+            elif tag in ("td", "th"):
+                self._cell = []
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+            if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+                self._category = "Title"
+                self._depth = int(tag[1]) - 1
+            elif tag == "li":
+                self._category = "ListItem"
+            elif tag == "pre":
+                self._category = "CodeSnippet"
+                self._pre += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag == "table" and self._rows is not None:
+            lines = [" | ".join(row) for row in self._rows if any(row)]
+            if lines:
+                self.elements.append(_element("\n".join(lines), "Table", self.object_name, "text/html"))
+            self._rows = None
+            self._cell = None
+        elif self._rows is not None:
+            if tag in ("td", "th") and self._cell is not None:
+                if not self._rows:
+                    self._rows.append([])
+                self._rows[-1].append(re.sub(r"\s+", " ", "".join(self._cell)).strip())
+                self._cell = None
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+            if tag == "pre":
+                self._pre = max(self._pre - 1, 0)
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._rows is not None:
+            if self._cell is not None:
+                self._cell.append(data)
+        else:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+def parse_html(file: BinaryIO, object_name: str) -> Iterator[Element]:
+    """Parses HTML into titles, list items, tables, code blocks and paragraphs."""
+    parser = _HTMLElementParser(object_name)
+    for line in _iter_lines(file):
+        parser.feed(line)
+        yield from parser.elements
+        parser.elements.clear()
+    parser.close()
+    yield from parser.elements
+
+CSV_ROWS_PER_ELEMENT = 50
+
+CSV_SNIFF_CHARS = 4096
+
+def parse_csv(file: BinaryIO, object_name: str) -> Iterator[Element]:
+    """
+    Parses a CSV file into Table elements of up to CSV_ROWS_PER_ELEMENT rows,
+    each row rendered as 'column: value' pairs so that chunks stay
+    self-describing wherever they are split.
+    """
+    # The dialect is sniffed from the first lines; the rest is read row by row
+    lines = _iter_lines(file)
+    head: List[str] = []
+    size = 0
+    for line in lines:
+        head.append(line)
+        size += len(line)
+        if size >= CSV_SNIFF_CHARS:
+            break
+    try:
+        dialect = csv.Sniffer().sniff("".join(head)[:CSV_SNIFF_CHARS])
+    except csv.Error:
+        dialect = csv.excel
+    rows = csv.reader(itertools.chain(head, lines), dialect)
+    header = next(rows, None)
+    if not header:
+        return
+
+    block: List[str] = []
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        block.append(" | ".join(f"{column}: {value}" for column, value in zip(header, row) if value.strip()))
+        if len(block) >= CSV_ROWS_PER_ELEMENT:
+            yield _element("\n".join(block), "Table", object_name, "text/csv")
+            block = []
+    if block:
+        yield _element("\n".join(block), "Table", object_name, "text/csv")
+
+JSON_ELEMENT_CHARS = 2000
+
+def _flatten_json(value: Any, path: str) -> Iterator[str]:
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from _flatten_json(child, f"{path}.{key}" if path else str(key))
+    elif isinstance(value, list):
+        for index, child in enumerate(value):
+            yield from _flatten_json(child, f"{path}[{index}]")
+    elif value is not None and value != "":
+        yield f"{path}: {value}" if path else str(value)
+
+def _json_documents(file: BinaryIO, object_name: str) -> Iterator[Any]:
+    """
+    Yields the documents of a JSON file, or of a JSON Lines file one line at
+    a time. A plain JSON document has to be decoded as a whole.
+    """
+    if object_name.lower().endswith(".jsonl"):
+        for line in _iter_lines(file):
+            if line.strip():
+                yield json.loads(line)
+        return
+    text = _read_text(file)
+    try:
+        document = json.loads(text)
+    except json.JSONDecodeError:
+        # JSON Lines under another extension
+        for line in text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+        return
+    yield document
+
+def parse_json(file: BinaryIO, object_name: str) -> Iterator[Element]:
+    """
+    Parses JSON (or JSON Lines) into 'path: value' lines, one element per
+    top-level key or array item, split further if it exceeds JSON_ELEMENT_CHARS.
+    """
+    for document in _json_documents(file, object_name):
+        if isinstance(document, dict):
+            parts = [({key: child}, "") for key, child in document.items()]
+        elif isinstance(document, list):
+            parts = [(child, f"[{index}]") for index, child in enumerate(document)]
+        else:
+            parts = [(document, "")]
+        for value, path in parts:
+            lines: List[str] = []
+            size = 0
+            for line in _flatten_json(value, path):
+                if lines and size + len(line) > JSON_ELEMENT_CHARS:
+                    yield _element("\n".join(lines), "NarrativeText", object_name, "application/json")
+                    lines, size = [], 0
+                lines.append(line)
+                size += len(line) + 1
+            if lines:
+                yield _element("\n".join(lines), "NarrativeText", object_name, "application/json")
+
+FAST_PARSERS: Dict[str, Callable[[BinaryIO, str], Iterator[Element]]] = {
+    "text": parse_text,
+    "markdown": parse_markdown,
+    "html": parse_html,
+    "csv": parse_csv,
+    "json": parse_json,
+}
+
+#--------------------------------------------------------------------------
+# File type detection
+#--------------------------------------------------------------------------
+
+EXTENSION_PARSERS: Dict[str, str] = {
+    ".txt": "text", ".text": "text", ".log": "text",
+    ".md": "markdown", ".markdown": "markdown",
+    ".html": "html", ".htm": "html",
+    ".csv": "csv",
+    ".json": "json", ".jsonl": "json",
+}
+
+MIME_PARSERS: Dict[str, str] = {
+    "text/plain": "text",
+    "text/markdown": "markdown",
+    "text/x-markdown": "markdown",
+    "text/html": "html",
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/json": "json",
+}
+
+def _sniff_mime_type(file: BinaryIO) -> Optional[str]:
+    """Detects a file's MIME type from its first bytes with libmagic, leaving the file position unchanged."""
+    try:
+        import magic
+    except ImportError:
+        return None
+    position = file.tell()
+    head = file.read(2048)
+    file.seek(position)
+    try:
+        return magic.from_buffer(head, mime=True)
+    except Exception as e:
+        logger.warning(f"Could not detect the file type: {e}")
+        return None
+
+def detect_parser(object_name: str, file: Optional[BinaryIO] = None) -> str:
+    """
+    Picks the parser for a document: a fast-path parser for simple formats,
+    otherwise 'unstructured'. The extension decides when it is known. For
+    other files, the content is sniffed with libmagic if `file` is given.
+    """
+    if not settings.FAST_PARSERS_ENABLED:
+        return "unstructured"
+    extension = os.path.splitext(object_name)[1].lower()
+    if extension:
+        return EXTENSION_PARSERS.get(extension, "unstructured")
+    if file is not None:
+        return MIME_PARSERS.get(_sniff_mime_type(file) or "", "unstructured")
+    return "unstructured"
+
+#--------------------------------------------------------------------------
+# Per-parser timing metrics
+#--------------------------------------------------------------------------
+
+class ParserMetrics:
+    """Counts parses, failures and parse time per parser in this process."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _entry(self, parser: str) -> Dict[str, float]:
+        return self._stats.setdefault(parser, {"count": 0, "errors": 0, "elements": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+
+    def record(self, parsed: ParsedDocument):
+        self.record_parse(parsed.parser, parsed.seconds, len(parsed.elements))
+
+    def record_parse(self, parser: str, seconds: float, element_count: int):
+        with self._lock:
+            entry = self._entry(parser)
+            entry["count"] += 1
+            entry["elements"] += element_count
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+    def record_error(self, parser: str):
+        with self._lock:
+            self._entry(parser)["errors"] += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                parser: {**entry, "mean_seconds": entry["total_seconds"] / entry["count"] if entry["count"] else 0.0}
+                for parser, entry in self._stats.items()
+            }
+
+parser_metrics = ParserMetrics()
@@ -0,0 +1,236 @@
+import importlib
+import logging
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Optional
+
+from .config import settings
+from .parsers import ParsedDocument
+
+logger = logging.getLogger(__name__)
+
+RESULT_GRACE_SECONDS = 60.0
+
+# Task that has a worker import the parser instead of parsing a document
+WARM_TASK = "warm"
+
+class ParseTimeoutError(Exception):
+    """Raised when a document takes longer than PARSER_TASK_TIMEOUT_SECONDS to parse."""
+
+class ParserWorkerError(Exception):
+    """Raised when parsing fails inside a worker, or the worker process dies."""
+
+def _worker_main(conn, memory_limit_bytes: int):
+    """
+    Entry point of a parser worker process. Receives (bucket, object, etag,
+    cache key) tasks over `conn` and replies with ("ok", ParsedDocument) or
+    ("error", message).
+    WARM_TASK only imports unstructured and replies ("ok", None).
+    """
+    if memory_limit_bytes:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+
+    from .document_processor import parse_document_revision
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        if task == WARM_TASK:
+            try:
+                importlib.import_module("unstructured.partition.auto")
+                conn.send(("ok", None))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+            continue
+        bucket_name, object_name, etag, cache_key = task
+        try:
+            conn.send(("ok", parse_document_revision(bucket_name, object_name, etag, cache_key)))
+        except MemoryError:
+            conn.send(("error", f"Parsing '{object_name}' exceeded the worker memory limit."))
+            return  # Don't keep running in a possibly broken state; the pool restarts us
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+class _WorkerSlot:
+    """One worker process and the pipe used to talk to it."""
+    def __init__(self, context, index: int, memory_limit_bytes: int):
+        self._context = context
+        self.index = index
+        self.memory_limit_bytes = memory_limit_bytes
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        parent_conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.memory_limit_bytes),
+            name=f"parser-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def ensure_alive(self):
+        if self.process is None or not self.process.is_alive():
+            if self.process is not None:
+                logger.warning(f"Parser worker {self.index} exited (code {self.process.exitcode}); restarting it.")
+                self.kill()
+            self.start()
+
+    def kill(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+class ParsingPool:
+    """
+    Parses documents in a fixed number of separate worker processes, so that
+    CPU-heavy parsing neither holds the API process's GIL nor lets a single
+    pathological file stall the service: a task that exceeds its timeout or
+    memory limit gets its worker killed and replaced.
+
+    Pending documents wait in a bounded queue.
+    """
+    def __init__(self, size: int, task_timeout: float, memory_limit_mb: int, queue_size: int):
+        self.size = size
+        self.task_timeout = task_timeout
+        self._tasks: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        # Upper bound on how long parse() waits for a result: every task queued
+        # ahead of it and its own are each bounded by task_timeout, plus slack
+        # for starting workers and transferring results.
+        self._result_timeout = task_timeout * (queue_size // size + 2) + RESULT_GRACE_SECONDS
+        # 'spawn' gives each worker a clean interpreter, unaffected by the API's threads
+        context = multiprocessing.get_context("spawn")
+        self._slots = [_WorkerSlot(context, i, memory_limit_mb * 1024 * 1024) for i in range(size)]
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for slot in self._slots:
+                thread = threading.Thread(
+                    target=self._dispatch_loop,
+                    args=(slot,),
+                    name=f"parser-dispatch-{slot.index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"Started document parsing pool with {self.size} worker process(es).")
+
+    def parse(self, bucket_name: str, object_name: str, etag: Optional[str] = None, cache_key: Optional[str] = None) -> ParsedDocument:
+        """
+        Fetches and parses a document into elements in a worker process,
+        waiting for room in the queue if it is full.
+
+        :param etag: If given, only read this revision of the object.
+        :param cache_key: Parse cache key to store the parsed revision under.
+
+        :raises ParseTimeoutError: If parsing exceeds the per-task timeout, or
+                                   the pool doesn't answer in time.
+        :raises ParserWorkerError: If parsing fails or the worker dies.
+        """
+        return self._wait(self._submit((bucket_name, object_name, etag, cache_key), object_name), object_name)
+
+    def warm(self):
+        """
+        Starts the pool and has its workers import unstructured, so the first
+        documents don't pay for worker startup. One warm task is queued per
+        worker; an idle worker may pick up more than one of them.
+
+        :raises ParseTimeoutError: If the pool doesn't answer in time.
+        :raises ParserWorkerError: If a worker can't import the parser.
+        """
+        futures = [self._submit(WARM_TASK, "warmup") for _ in self._slots]
+        for future in futures:
+            self._wait(future, "warmup")
+
+    def _submit(self, task, label: str) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._tasks.put((task, label, future))
+        return future
+
+    def _wait(self, future: Future, label: str):
+        try:
+            return future.result(timeout=self._result_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise ParseTimeoutError(f"No result for '{label}' from the parsing pool after {self._result_timeout:.0f}s.")
+
+    def _dispatch_loop(self, slot: _WorkerSlot):
+        while True:
+            task, object_name, future = self._tasks.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._run_task(slot, task, object_name))
+            except (ParseTimeoutError, ParserWorkerError) as e:
+                future.set_exception(e)
+            except Exception as e:
+                # E.g. a reply that can't be unpickled. The worker's state is unknown, so replace it.
+                logger.exception(f"Unexpected error while parsing '{object_name}' in worker {slot.index}; killing it.")
+                slot.kill()
+                future.set_exception(ParserWorkerError(f"Parsing '{object_name}' failed: {type(e).__name__}: {e}"))
+
+    def _run_task(self, slot: _WorkerSlot, task, object_name: str) -> Optional[ParsedDocument]:
+        try:
+            slot.ensure_alive()
+            slot.conn.send(task)
+            if not slot.conn.poll(self.task_timeout):
+                logger.error(f"Parsing '{object_name}' timed out after {self.task_timeout}s; killing worker {slot.index}.")
+                slot.kill()
+                raise ParseTimeoutError(f"Parsing '{object_name}' timed out after {self.task_timeout}s.")
+            status, result = slot.conn.recv()
+        except (EOFError, OSError) as e:
+            # The worker died mid-task, e.g. killed by the OOM killer or a crash in a native parser
+            slot.kill()
+            raise ParserWorkerError(f"Parser worker died while parsing '{object_name}': {e!r}")
+
+        if status != "ok":
+            raise ParserWorkerError(result)
+        return result
+
+    def shutdown(self):
+        for slot in self._slots:
+            slot.kill()
+
+_parsing_pool: Optional[ParsingPool] = None
+_parsing_pool_lock = threading.Lock()
+
+def get_parsing_pool() -> Optional[ParsingPool]:
+    """Returns the shared parsing pool, or None if PARSER_WORKERS is 0 (parse in-process)."""
+    global _parsing_pool
+    if settings.PARSER_WORKERS <= 0:
+        return None
+    if _parsing_pool is None:
+        with _parsing_pool_lock:
+            if _parsing_pool is None:
+                _parsing_pool = ParsingPool(
+                    size=settings.PARSER_WORKERS,
+                    task_timeout=settings.PARSER_TASK_TIMEOUT_SECONDS,
+                    memory_limit_mb=settings.PARSER_MEMORY_LIMIT_MB,
+                    queue_size=settings.PARSER_QUEUE_SIZE
+                )
+    return _parsing_pool
+
+def shutdown_parsing_pool():
+    if _parsing_pool is not None:
+        _parsing_pool.shutdown()
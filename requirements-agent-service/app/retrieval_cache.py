@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    A small thread-safe in-process LRU cache with an optional time-to-live.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, stored_at = entry
+                if self.ttl_seconds is None or time.monotonic() - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+class SearchResultCache:
+    """
+    Caches search results per project. Every project has a generation counter
+    that is part of the cache key; bumping it after an ingest makes all of the
+    project's earlier results unreachable, so they simply age out of the LRU.
+
+    Ingests usually run in other processes. If `load_shared` and `bump_shared`
+    are given, a generation shared between processes (e.g. stored in the
+    database) is part of the key as well. It is bumped along with the local
+    one, and re-read at most every `sync_seconds`.
+    """
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: Optional[float] = None,
+        load_shared: Optional[Callable[[int], int]] = None,
+        bump_shared: Optional[Callable[[int], int]] = None,
+        sync_seconds: float = 1.0
+    ):
+        self._results = LRUCache(max_entries, ttl_seconds)
+        self._generations: Dict[int, int] = {}
+        self._load_shared = load_shared
+        self._bump_shared = bump_shared
+        self._sync_seconds = sync_seconds
+        # Project ID -> (shared generation, monotonic time it was read)
+        self._shared: Dict[int, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _shared_is_current(self, project_id: int) -> bool:
+        if self._load_shared is None:
+            return True
+        entry = self._shared.get(project_id)
+        return entry is not None and time.monotonic() - entry[1] < self._sync_seconds
+
+    def _shared_generation(self, project_id: int) -> int:
+        if self._load_shared is None:
+            return 0
+        entry = self._shared.get(project_id)
+        if self._shared_is_current(project_id):
+            return entry[0]
+        try:
+            generation = self._load_shared(project_id)
+        except Exception as e:
+            # Keep serving under the last known value; the TTL still bounds staleness
+            logger.warning(f"Could not read the shared search cache generation of project {project_id}: {e}")
+            generation = entry[0] if entry is not None else -1
+        with self._lock:
+            self._shared[project_id] = (generation, time.monotonic())
+        return generation
+
+    def generation(self, project_id: int) -> Hashable:
+        """
+        Returns the project's current generation, to pass to `get` and `put`.
+        May read the shared generation, which blocks.
+        """
+        shared = self._shared_generation(project_id)
+        with self._lock:
+            return self._generations.get(project_id, 0), shared
+
+    async def ageneration(self, project_id: int) -> Hashable:
+        """Async variant of `generation` that reads the shared generation in a worker thread."""
+        if self._shared_is_current(project_id):
+            return self.generation(project_id)
+        return await asyncio.to_thread(self.generation, project_id)
+
+    def bump_generation(self, project_id: int):
+        """Invalidates all cached results for a project, in this and (if shared) every other process."""
+        with self._lock:
+            generation = self._generations.get(project_id, 0) + 1
+            self._generations[project_id] = generation
+        logger.debug(f"Search cache generation for project {project_id} is now {generation}.")
+        if self._bump_shared is not None:
+            try:
+                shared = self._bump_shared(project_id)
+            except Exception as e:
+                logger.warning(f"Could not bump the shared search cache generation of project {project_id}: {e}")
+                return
+            with self._lock:
+                self._shared[project_id] = (shared, time.monotonic())
+
+    def get(self, project_id: int, generation: Hashable, key: Hashable) -> Any:
+        return self._results.get((project_id, generation, key))
+
+    def put(self, project_id: int, generation: Hashable, key: Hashable, value: Any):
+        """
+        Stores a result computed under `generation`. Results computed before a
+        concurrent ingest bumped the generation are keyed under the old value
+        and therefore never served.
+        """
+        self._results.put((project_id, generation, key), value)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._results.stats()
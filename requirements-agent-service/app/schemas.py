@@ -0,0 +1,90 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+#--------------------------------------------------------------------------
+# Schemas for Ingestion Jobs
+#--------------------------------------------------------------------------
+
+class IngestJob(BaseModel):
+    id: str
+    project_id: int
+    bucket_name: str
+    object_name: str
+    etag: Optional[str] = None
+    batch_id: Optional[str] = None
+    status: str
+    stage: str
+    attempts: int
+    error: Optional[str] = None
+    chunks_total: int
+    chunks_upserted: int
+    chunks_unchanged: int
+    chunks_deleted: int
+    timings: Dict[str, float]
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+#--------------------------------------------------------------------------
+# Schemas for Bulk Ingests
+#--------------------------------------------------------------------------
+
+class IngestBatchCreate(BaseModel):
+    bucket_name: str
+    prefix: str = ""
+    parallelism: Optional[int] = None
+
+class IngestBatch(BaseModel):
+    id: str
+    project_id: int
+    bucket_name: str
+    prefix: str
+    parallelism: int
+    status: str
+    error: Optional[str] = None
+    docs_total: int
+    docs_skipped: int
+    docs_completed: int
+    docs_failed: int
+    chunks_total: int
+    chunks_upserted: int
+    elapsed_seconds: float
+    docs_per_second: float
+    chunks_per_second: float
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+#--------------------------------------------------------------------------
+# Schemas for Generation Runs
+#--------------------------------------------------------------------------
+
+class GenerationRun(BaseModel):
+    id: str
+    project_id: int
+    jira_project_key: str
+    initial_prompt: str
+    bypass_generation_cache: bool
+    status: str
+    current_node: Optional[str] = None
+    attempts: int
+    error: Optional[str] = None
+    node_outputs: Dict[str, Any]
+    timings: Dict[str, float]
+    result: Optional[Dict[str, Any]] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,66 @@
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Result of the most recent warmup, keyed by step name
+warmup_report: Dict[str, Dict[str, Any]] = {}
+_warmup_lock = threading.Lock()
+
+def _warm_vector_store():
+    from .vector_store import get_vector_store_manager
+    manager = get_vector_store_manager()
+    if manager.qdrant_backend is not None:
+        # Opens the HTTP connection pool and fails fast if Qdrant is unreachable
+        manager.qdrant_backend.client.get_collections()
+
+def _warm_agent_graph():
+    from .agents.requirement_generation import get_agent_graph
+    get_agent_graph()
+
+def _warm_chat_model():
+    # Builds the shared chat client and generation chain of the configured provider
+    from .agents.requirement_generation import build_user_story_chain
+    from .llm_providers import get_llm_registry
+    get_llm_registry().get_chain("user_stories", build_user_story_chain)
+
+def _warm_document_parser():
+    from .parsing_pool import get_parsing_pool
+    pool = get_parsing_pool()
+    if pool is None:
+        # Documents are parsed in this process
+        importlib.import_module("unstructured.partition.auto")
+    else:
+        # Starts the worker processes and imports unstructured in them
+        pool.warm()
+
+WARMUP_STEPS: Dict[str, Callable[[], None]] = {
+    "vector_store": _warm_vector_store,
+    "agent_graph": _warm_agent_graph,
+    "chat_model": _warm_chat_model,
+    "document_parser": _warm_document_parser,
+}
+
+def warmup() -> Dict[str, Dict[str, Any]]:
+    """
+    Builds the lazily created clients and imports the heavy modules ahead of
+    the first request, timing each step. A failing step (e.g. Qdrant being
+    down) is recorded and does not stop the remaining steps.
+    """
+    with _warmup_lock:
+        report = {}
+        for name, step in WARMUP_STEPS.items():
+            start = time.perf_counter()
+            try:
+                step()
+                report[name] = {"ok": True, "seconds": round(time.perf_counter() - start, 3)}
+            except Exception as e:
+                logger.error(f"Warmup step '{name}' failed: {e}")
+                report[name] = {"ok": False, "seconds": round(time.perf_counter() - start, 3), "error": str(e)}
+        warmup_report.clear()
+        warmup_report.update(report)
+        logger.info(f"Warmup finished: {report}")
+        return report
@@ -0,0 +1,170 @@
+"""
+Converts existing Qdrant collections to a storage profile and reports the
+memory saved and the recall/latency impact of the profile.
+
+Usage:
+    python -m app.tools.collection_profiles apply --profile scalar_int8 [--collection NAME ...]
+    python -m app.tools.collection_profiles report [--collection NAME ...] [--queries 50] [--top-k 5]
+"""
+import argparse
+import logging
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from qdrant_client import models
+
+from ..backends.qdrant_backend import COLLECTION_PROFILES, build_quantization_config, get_collection_profile, get_quantization
+from ..config import settings
+from ..vector_store import get_vector_store_manager
+
+logger = logging.getLogger(__name__)
+
+def list_collections(names: Optional[List[str]]) -> List[str]:
+    client = get_vector_store_manager().qdrant_backend.client
+    existing = sorted(collection.name for collection in client.get_collections().collections)
+    return [name for name in existing if not names or name in names]
+
+def apply_profile(collection_name: str, profile_name: str):
+    """
+    Updates an existing collection in place to match a profile. Qdrant
+    rebuilds the quantized vectors and moves storage in the background.
+    """
+    client = get_vector_store_manager().qdrant_backend.client
+    profile = get_collection_profile(profile_name)
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": models.VectorParamsDiff(on_disk=profile.vectors_on_disk)},
+        quantization_config=build_quantization_config(profile) or models.Disabled.DISABLED,
+        collection_params=models.CollectionParamsDiff(on_disk_payload=settings.QDRANT_ON_DISK_PAYLOAD)
+    )
+    logger.info(f"Applied profile '{profile_name}' to collection '{collection_name}'.")
+
+def estimate_vector_memory(points: int, dim: int, vectors_on_disk: bool, quantization: Optional[str]) -> int:
+    """Estimates the RAM, in bytes, taken by a collection's vectors (excluding the HNSW graph)."""
+    ram = 0 if vectors_on_disk else points * dim * 4
+    if quantization == "scalar":
+        ram += points * dim
+    elif quantization == "binary":
+        ram += points * math.ceil(dim / 8)
+    return ram
+
+def describe_collection(collection_name: str) -> Dict[str, Any]:
+    """Reads a collection's current storage settings from Qdrant."""
+    info = get_vector_store_manager().qdrant_backend.client.get_collection(collection_name=collection_name)
+    vectors = info.config.params.vectors
+    return {
+        "points": info.points_count or 0,
+        "dim": vectors.size,
+        "vectors_on_disk": bool(vectors.on_disk),
+        "quantization": get_quantization(info.config.quantization_config),
+    }
+
+def measure_search(collection_name: str, queries: List[List[float]], top_k: int) -> Dict[str, float]:
+    """
+    Runs each query as an exact (brute-force, full-precision) search, as an
+    HNSW search ignoring quantization, and as an HNSW search with the
+    configured quantization rescoring, and compares recall@k and latency.
+    """
+    client = get_vector_store_manager().qdrant_backend.client
+    modes = {
+        "exact": models.SearchParams(exact=True),
+        "full_precision": models.SearchParams(quantization=models.QuantizationSearchParams(ignore=True)),
+        "quantized": models.SearchParams(
+            quantization=models.QuantizationSearchParams(
+                rescore=settings.QDRANT_QUANTIZATION_RESCORE,
+                oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING
+            )
+        ),
+    }
+    results: Dict[str, List[List[str]]] = {mode: [] for mode in modes}
+    latencies: Dict[str, float] = {mode: 0.0 for mode in modes}
+    for query in queries:
+        for mode, params in modes.items():
+            start = time.perf_counter()
+            hits = client.search(
+                collection_name=collection_name,
+                query_vector=query,
+                limit=top_k,
+                search_params=params,
+                with_payload=False
+            )
+            latencies[mode] += time.perf_counter() - start
+            results[mode].append([str(hit.id) for hit in hits])
+
+    report = {}
+    for mode in modes:
+        overlap = sum(
+            len(set(found) & set(truth)) / max(len(truth), 1)
+            for found, truth in zip(results[mode], results["exact"])
+        )
+        report[f"{mode}_recall"] = overlap / len(queries)
+        report[f"{mode}_latency_ms"] = latencies[mode] / len(queries) * 1000
+    return report
+
+def sample_queries(collection_name: str, count: int) -> List[List[float]]:
+    """Uses stored vectors as queries, so the report needs no embedding calls."""
+    points, _ = get_vector_store_manager().qdrant_backend.client.scroll(
+        collection_name=collection_name,
+        limit=max(count * 4, count),
+        with_payload=False,
+        with_vectors=True
+    )
+    vectors = [point.vector for point in points]
+    random.shuffle(vectors)
+    return vectors[:count]
+
+def report_collection(collection_name: str, query_count: int, top_k: int):
+    description = describe_collection(collection_name)
+    baseline = estimate_vector_memory(description["points"], description["dim"], False, None)
+    current = estimate_vector_memory(
+        description["points"], description["dim"], description["vectors_on_disk"], description["quantization"]
+    )
+    saved = 1 - current / baseline if baseline else 0.0
+    print(f"Collection '{collection_name}': {description['points']} points x {description['dim']} dims")
+    print(
+        f"  storage: vectors_on_disk={description['vectors_on_disk']} quantization={description['quantization']}"
+    )
+    print(
+        f"  vector RAM: {current / 2**20:.1f} MiB (float32 in RAM would be {baseline / 2**20:.1f} MiB, "
+        f"{saved:.0%} saved)"
+    )
+
+    queries = sample_queries(collection_name, query_count)
+    if not queries:
+        print("  no points to sample queries from; skipping recall/latency.")
+        return
+    metrics = measure_search(collection_name, queries, top_k)
+    for mode in ("exact", "full_precision", "quantized"):
+        print(
+            f"  {mode:>14}: recall@{top_k}={metrics[f'{mode}_recall']:.3f} "
+            f"latency={metrics[f'{mode}_latency_ms']:.2f} ms"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply Qdrant collection storage profiles and report their impact.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    apply_parser = subcommands.add_parser("apply", help="Convert existing collections to a profile.")
+    apply_parser.add_argument("--profile", default=settings.QDRANT_COLLECTION_PROFILE, choices=sorted(COLLECTION_PROFILES))
+    apply_parser.add_argument("--collection", action="append", help="Only convert these collection(s). Defaults to all.")
+
+    report_parser = subcommands.add_parser("report", help="Show memory use and recall/latency for collections.")
+    report_parser.add_argument("--collection", action="append", help="Only report on these collection(s). Defaults to all.")
+    report_parser.add_argument("--queries", type=int, default=50, help="Number of stored vectors to use as sample queries.")
+    report_parser.add_argument("--top-k", type=int, default=5)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if get_vector_store_manager().qdrant_backend is None:
+        parser.error(f"VECTOR_BACKEND '{settings.VECTOR_BACKEND}' does not use Qdrant.")
+
+    for collection_name in list_collections(args.collection):
+        if args.command == "apply":
+            apply_profile(collection_name, args.profile)
+        else:
+            report_collection(collection_name, args.queries, args.top_k)
+
+if __name__ == "__main__":
+    main()
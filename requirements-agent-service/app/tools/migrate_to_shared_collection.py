@@ -0,0 +1,107 @@
+"""
+Moves existing per-project collections (`project_{id}_requirements`) into the
+shared multi-tenant collection used when VECTOR_STORE_MODE is 'shared'.
+
+Usage:
+    python -m app.tools.migrate_to_shared_collection [--project-id ID ...] [--delete-source]
+"""
+import argparse
+import logging
+import re
+from typing import List
+
+from qdrant_client import models
+
+from ..config import settings
+from ..vector_store import get_vector_store_manager
+
+logger = logging.getLogger(__name__)
+
+PROJECT_COLLECTION_PATTERN = re.compile(r"^project_(\d+)_requirements$")
+
+def find_project_collections() -> List[tuple]:
+    """Returns (project_id, collection_name) pairs for all per-project collections."""
+    collections = get_vector_store_manager().qdrant_backend.client.get_collections().collections
+    found = []
+    for collection in collections:
+        match = PROJECT_COLLECTION_PATTERN.match(collection.name)
+        if match:
+            found.append((int(match.group(1)), collection.name))
+    return sorted(found)
+
+def migrate_collection(project_id: int, source_collection: str, batch_size: int = 256) -> int:
+    """
+    Copies every point of a per-project collection into the shared collection,
+    keeping its ID and vector and tagging its payload with the project ID.
+
+    :return: The number of points copied.
+    """
+    client = get_vector_store_manager().qdrant_backend.client
+    target_collection = settings.SHARED_COLLECTION_NAME
+    copied = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=source_collection,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        if points:
+            client.upsert(
+                collection_name=target_collection,
+                points=[
+                    models.PointStruct(
+                        id=point.id,
+                        vector=point.vector,
+                        payload={**(point.payload or {}), "project_id": str(project_id)}
+                    )
+                    for point in points
+                ],
+                wait=True
+            )
+            copied += len(points)
+        if offset is None:
+            return copied
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate per-project Qdrant collections into the shared collection.")
+    parser.add_argument("--project-id", type=int, action="append", help="Only migrate these project(s). Defaults to all.")
+    parser.add_argument("--delete-source", action="store_true", help="Delete each per-project collection after a verified copy.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if get_vector_store_manager().qdrant_backend is None:
+        parser.error(f"VECTOR_BACKEND '{settings.VECTOR_BACKEND}' does not use Qdrant.")
+    client = get_vector_store_manager().qdrant_backend.client
+    target_collection = settings.SHARED_COLLECTION_NAME
+    get_vector_store_manager().qdrant_backend.ensure_collection(target_collection, get_vector_store_manager().get_vector_size)
+
+    for project_id, source_collection in find_project_collections():
+        if args.project_id and project_id not in args.project_id:
+            continue
+
+        copied = migrate_collection(project_id, source_collection)
+        source_count = client.count(collection_name=source_collection, exact=True).count
+        target_count = client.count(
+            collection_name=target_collection,
+            count_filter=models.Filter(must=[
+                models.FieldCondition(key="project_id", match=models.MatchValue(value=str(project_id)))
+            ]),
+            exact=True
+        ).count
+        logger.info(
+            f"Project {project_id}: copied {copied} points from '{source_collection}' "
+            f"({source_count} in source, {target_count} in '{target_collection}')."
+        )
+
+        if args.delete_source:
+            if target_count >= source_count:
+                client.delete_collection(collection_name=source_collection)
+                logger.info(f"Deleted source collection '{source_collection}'.")
+            else:
+                logger.error(f"Not deleting '{source_collection}': the shared collection is missing points.")
+
+if __name__ == "__main__":
+    main()
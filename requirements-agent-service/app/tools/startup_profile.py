@@ -0,0 +1,64 @@
+"""
+Reports how long importing the service takes, broken down per module, using
+Python's `-X importtime` instrumentation in a fresh interpreter.
+
+Usage:
+    python -m app.tools.startup_profile [--module app.main] [--top 25] [--warmup]
+"""
+import argparse
+import subprocess
+import sys
+from typing import List, Tuple
+
+def profile_imports(module: str, warmup: bool) -> Tuple[List[Tuple[str, int, int]], str]:
+    """
+    Imports `module` in a subprocess and parses the importtime output.
+
+    :return: (package, self_us, cumulative_us) rows and the subprocess stdout.
+    """
+    code = f"import {module}"
+    if warmup:
+        code += "\nfrom app.startup import warmup\nprint(warmup())"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:       123 |        456 |   package.module"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    if result.returncode != 0:
+        print(result.stderr[-2000:], file=sys.stderr)
+    return rows, result.stdout
+
+def main():
+    parser = argparse.ArgumentParser(description="Show per-module import cost of the service.")
+    parser.add_argument("--module", default="app.main", help="Module to import (default: app.main).")
+    parser.add_argument("--top", type=int, default=25, help="Number of top-level packages to show.")
+    parser.add_argument("--warmup", action="store_true", help="Also run the warmup steps and print their timings.")
+    args = parser.parse_args()
+
+    rows, output = profile_imports(args.module, args.warmup)
+
+    # Group by top-level package, counting each package's self time once
+    by_package = {}
+    for name, self_us, _ in rows:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+    total_us = sum(by_package.values())
+
+    print(f"Importing '{args.module}' took {total_us / 1000:.1f} ms in total.")
+    print(f"{'package':<40} {'ms':>10} {'share':>8}")
+    for package, us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{package:<40} {us / 1000:>10.1f} {us / total_us if total_us else 0:>8.1%}")
+
+    if args.warmup:
+        print("\nWarmup steps:")
+        print(output.strip())
+
+if __name__ == "__main__":
+    main()
@@ -1,129 +1,439 @@
+import asyncio
+import hashlib
 import logging
-from qdrant_client import QdrantClient, models
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
-from typing import List
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from itertools import islice
+from langchain_core.documents import Document
+from typing import Any, Callable, Dict, List, Iterable, Iterator, Optional, Tuple
 
 from .config import settings
+from .embedding_cache import EmbeddingCache, CachedEmbeddings
+from .retrieval_cache import LRUCache, SearchResultCache
+from .backends.base import BaseVectorBackend, VectorHit
+from .context_assembly import mmr_select
 
 logger = logging.getLogger(__name__)
 
+# Namespace for deterministic point IDs (uuid5 of project/bucket/source/content hash)
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2f0e-6a43-4f55-9d2b-3f1c8f4a7e21")
+
+def _batched(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Lazily groups an iterable into lists of at most `batch_size` items."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+# The shared search cache generation lives in the job database. Imported on
+# first use, like the provider SDKs, to keep importing this module cheap.
+
+def _load_index_generation(project_id: int) -> int:
+    from . import crud
+    from .database import SessionLocal
+    with SessionLocal() as db:
+        return crud.get_project_index_generation(db, project_id)
+
+def _bump_index_generation(project_id: int) -> int:
+    from . import crud
+    from .database import SessionLocal
+    with SessionLocal() as db:
+        return crud.bump_project_index_generation(db, project_id)
+
 class VectorStoreManager:
     """
-    Manages interactions with the Qdrant vector database, including
-    collection creation, document embedding, and searching.
+    Manages document embedding and searching on top of a pluggable vector
+    backend: Qdrant, an embedded NumPy store, or both ('auto'), where small
+    projects stay embedded until they grow past LOCAL_BACKEND_MAX_POINTS.
     """
     def __init__(self):
         try:
-            self.qdrant_client = QdrantClient(url=settings.QDRANT_URL)
+            self.qdrant_backend = None
+            self.local_backend = None
+            if settings.VECTOR_BACKEND in ("qdrant", "auto"):
+                from .backends.qdrant_backend import QdrantBackend
+                self.qdrant_backend = QdrantBackend()
+            if settings.VECTOR_BACKEND in ("numpy", "auto"):
+                from .backends.numpy_backend import NumpyBackend
+                self.local_backend = NumpyBackend(settings.LOCAL_VECTOR_STORE_PATH)
+            if self.qdrant_backend is None and self.local_backend is None:
+                raise ValueError(f"Unknown VECTOR_BACKEND '{settings.VECTOR_BACKEND}'.")
 
+            # Provider SDKs are imported here rather than at module level so that
+            # importing the app stays cheap until the vector store is first used.
             if settings.LLM_PROVIDER == "ollama":
+                from .ollama_embeddings import OllamaBatchEmbeddings
                 logger.info(f"Using Ollama for embeddings with model {settings.OLLAMA_MODEL_NAME}")
-                self.embeddings = OllamaEmbeddings(
+                embedding_model = settings.OLLAMA_MODEL_NAME
+                base_embeddings = OllamaBatchEmbeddings(
                     base_url=settings.OLLAMA_BASE_URL,
-                    model=settings.OLLAMA_MODEL_NAME
+                    model=embedding_model,
+                    batch_size=settings.OLLAMA_EMBEDDING_BATCH_SIZE,
+                    concurrency=settings.OLLAMA_EMBEDDING_CONCURRENCY,
+                    timeout=settings.OLLAMA_EMBEDDING_TIMEOUT_SECONDS
                 )
             else:
+                from langchain_openai import OpenAIEmbeddings
                 logger.info("Using OpenAI for embeddings.")
-                self.embeddings = OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY)
+                embedding_model = settings.OPENAI_EMBEDDING_MODEL_NAME
+                base_embeddings = OpenAIEmbeddings(
+                    model=embedding_model,
+                    api_key=settings.OPENAI_API_KEY,
+                    chunk_size=settings.OPENAI_EMBEDDING_BATCH_SIZE
+                )
 
+            # Consult the persistent embedding cache before calling the provider
+            self.embedding_cache = None
+            if settings.EMBEDDING_CACHE_ENABLED:
+                self.embedding_cache = EmbeddingCache(
+                    path=settings.EMBEDDING_CACHE_PATH,
+                    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+                )
+                self.embeddings = CachedEmbeddings(
+                    underlying=base_embeddings,
+                    cache=self.embedding_cache,
+                    provider=settings.LLM_PROVIDER,
+                    model=embedding_model
+                )
+            else:
+                self.embeddings = base_embeddings
+            # Uncached client, for texts that aren't stored chunks or queries
+            self.base_embeddings = base_embeddings
+            self.embedding_model = embedding_model
+
+            # In-process caches for repeated retrievals with the same prompt
+            self.query_embedding_cache = LRUCache(settings.QUERY_EMBEDDING_CACHE_SIZE)
+            shared = settings.SEARCH_RESULT_CACHE_SHARED
+            self.search_cache = SearchResultCache(
+                max_entries=settings.SEARCH_RESULT_CACHE_SIZE,
+                ttl_seconds=settings.SEARCH_RESULT_CACHE_TTL_SECONDS,
+                load_shared=_load_index_generation if shared else None,
+                bump_shared=_bump_index_generation if shared else None,
+                sync_seconds=settings.SEARCH_RESULT_CACHE_SYNC_SECONDS
+            )
+
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
             self.text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=1000,
                 chunk_overlap=200,
                 length_function=len,
             )
-            logger.info("Qdrant client and OpenAI embeddings initialized successfully.")
+
+            self._vector_size = None
+
+            # Shared pool so that concurrent ingests together never exceed the
+            # configured number of in-flight embedding requests.
+            self.embedding_executor = ThreadPoolExecutor(
+                max_workers=settings.EMBEDDING_CONCURRENCY,
+                thread_name_prefix="embedding"
+            )
+            logger.info(f"Vector store initialized with '{settings.VECTOR_BACKEND}' backend and {settings.LLM_PROVIDER} embeddings.")
         except Exception as e:
             logger.error(f"Failed to initialize VectorStoreManager: {e}")
             raise
 
-    def get_collection_name(self, project_id: int) -> str:
-        """Generates a consistent collection name for a given project."""
-        return f"project_{project_id}_requirements"
+    def get_backend(self, project_id: int) -> BaseVectorBackend:
+        """
+        Returns the backend holding a project. In 'auto' mode, projects that are
+        not in Qdrant yet start out in the embedded backend.
+        """
+        if self.local_backend is None:
+            return self.qdrant_backend
+        if self.qdrant_backend is None:
+            return self.local_backend
+        if self.local_backend.has_project(project_id):
+            return self.local_backend
+        if self.qdrant_backend.has_project(project_id):
+            return self.qdrant_backend
+        return self.local_backend
+
+    async def aget_backend(self, project_id: int) -> BaseVectorBackend:
+        """Async variant of `get_backend`; only 'auto' mode needs to look anything up."""
+        if self.local_backend is None or self.qdrant_backend is None:
+            return self.get_backend(project_id)
+        return await asyncio.to_thread(self.get_backend, project_id)
+
+    def get_vector_size(self) -> int:
+        """
+        Returns the embedding dimension, either from EMBEDDING_VECTOR_SIZE or by
+        probing the embedding model once and remembering the result.
+        """
+        if self._vector_size is None:
+            if settings.EMBEDDING_VECTOR_SIZE:
+                self._vector_size = settings.EMBEDDING_VECTOR_SIZE
+            else:
+                # Dynamically determine vector size from the embedding model
+                self._vector_size = len(self.embeddings.embed_query("test"))
+                logger.info(f"Detected vector size of {self._vector_size} from the embedding model.")
+        return self._vector_size
+
+    def _maybe_promote(self, project_id: int):
+        """
+        Moves a project from the embedded backend to Qdrant once it holds more
+        than LOCAL_BACKEND_MAX_POINTS points.
+        """
+        if self.qdrant_backend is None or self.local_backend is None:
+            return
+        count = self.local_backend.count(project_id)
+        if count <= settings.LOCAL_BACKEND_MAX_POINTS:
+            return
+
+        logger.info(f"Project {project_id} has {count} points; promoting it from the embedded backend to Qdrant.")
+        self.qdrant_backend.ensure_project(project_id, self.get_vector_size)
+        for batch in self.local_backend.iter_points(project_id):
+            self.qdrant_backend.upsert(
+                project_id,
+                ids=[hit.id for hit in batch],
+                vectors=[hit.vector for hit in batch],
+                payloads=[hit.payload for hit in batch]
+            )
+        self.local_backend.drop_project(project_id)
+        logger.info(f"Promoted project {project_id} to Qdrant.")
+
+    @staticmethod
+    def make_point_id(project_id: int, bucket_name: str, source: str, content_hash: str) -> str:
+        """
+        Derives a deterministic point ID from the project, the source
+        object (bucket and name) and the hash of the chunk's content, so that
+        re-ingesting the same chunk always maps to the same point.
+        """
+        return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{project_id}/{bucket_name}/{source}/{content_hash}"))
 
-    def process_and_store_documents(self, project_id: int, documents: List[Document]):
+    def process_and_store_documents(
+        self,
+        project_id: int,
+        bucket_name: str,
+        source: str,
+        documents: Iterable[Document],
+        progress: Optional[Callable[..., None]] = None,
+        chunked: bool = False
+    ) -> Dict[str, int]:
         """
         Processes raw documents, splits them into chunks, creates embeddings,
-        and stores them in a project-specific Qdrant collection.
+        and stores them in the project's vector storage.
+
+        `documents` is consumed lazily: each document is split as it arrives
+        and its chunks flow straight into embedding and upserting, so the first
+        chunks become searchable while later ones are still being produced and
+        the full list of chunks is never held in memory.
+
+        Ingestion is idempotent per source object (`bucket_name` and `source`):
+        chunks that are already stored are skipped, only new or changed chunks
+        are embedded and upserted, and points from a previous revision of the
+        object that no longer exist are deleted. Objects of the same name in
+        other buckets are left alone. Points stored before the bucket was
+        recorded count as a previous revision, so they are replaced.
+
+        :param progress: Optional callback, called with chunk counts as keyword
+                         arguments each time a batch has been upserted.
+        :param chunked: The documents are already chunks; store them without splitting.
+        :return: Chunk counts: chunks_total, chunks_upserted, chunks_unchanged and chunks_deleted.
         """
-        collection_name = self.get_collection_name(project_id)
+        backend = self.get_backend(project_id)
 
-        logger.info(f"Processing {len(documents)} document(s) for project {project_id} into collection '{collection_name}'.")
+        logger.info(f"Processing documents of '{bucket_name}/{source}' for project {project_id} into the {backend.name} backend.")
 
-        # Split documents into smaller chunks
-        chunks = self.text_splitter.split_documents(documents)
-        logger.info(f"Split documents into {len(chunks)} chunks.")
+        # Make sure the project's storage exists and find what is already stored for this source
+        if backend.ensure_project(project_id, self.get_vector_size):
+            existing_ids = backend.get_point_ids_for_source(project_id, bucket_name, source)
+        else:
+            existing_ids = set()
 
-        # Check if the collection already exists, if not, create it
-        try:
-            self.qdrant_client.get_collection(collection_name=collection_name)
-            logger.info(f"Collection '{collection_name}' already exists.")
-        except Exception:
-            logger.info(f"Collection '{collection_name}' not found. Creating new collection.")
-            # Dynamically determine vector size from the embedding model
-            test_vector = self.embeddings.embed_query("test")
-            vector_size = len(test_vector)
-            logger.info(f"Detected vector size of {vector_size} from the embedding model.")
-
-            self.qdrant_client.create_collection(
-                collection_name=collection_name,
-                vectors_config=models.VectorParams(
-                    size=vector_size,
-                    distance=models.Distance.COSINE
-                )
-            )
+        current_ids = set()
+        chunk_count = 0
 
-        # Embed the chunks and upsert them into Qdrant
-        # Note: qdrant_client.add can handle the embedding process internally
-        # if we use langchain's Qdrant wrapper, but doing it explicitly gives more control.
+        def new_chunks() -> Iterator[Tuple[str, Document]]:
+            nonlocal chunk_count
+            for document in documents:
+                # Split documents into smaller chunks, one document at a time
+                pieces = [document] if chunked else self.text_splitter.split_documents([document])
+                for chunk in pieces:
+                    chunk_count += 1
+                    content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+                    point_id = self.make_point_id(project_id, bucket_name, source, content_hash)
+                    if point_id in current_ids:
+                        continue  # Identical chunk seen earlier in this document
+                    current_ids.add(point_id)
+                    if point_id in existing_ids:
+                        continue  # Unchanged since the last ingest
+                    chunk.metadata['project_id'] = str(project_id)
+                    chunk.metadata['bucket'] = bucket_name
+                    chunk.metadata['source'] = source
+                    chunk.metadata['content_hash'] = content_hash
+                    yield point_id, chunk
 
-        texts_to_embed = [chunk.page_content for chunk in chunks]
-        vectors = self.embeddings.embed_documents(texts_to_embed)
+        last_bump: Optional[float] = None
 
-        # Add the original text content to the payload
-        payloads = [chunk.metadata for chunk in chunks]
-        for i, text in enumerate(texts_to_embed):
-            payloads[i]['page_content'] = text
-
-        self.qdrant_client.upsert(
-            collection_name=collection_name,
-            points=models.Batch(
-                ids=None, # Let Qdrant assign IDs
-                vectors=vectors,
-                payloads=payloads
-            ),
-            wait=True
+        def on_batch(upserted: int):
+            # New chunks are searchable as soon as they are upserted, so stop serving older results
+            # once the first batch lands. Further bumps during the ingest (each a database write if
+            # the generation is shared) are spaced SEARCH_RESULT_CACHE_SYNC_SECONDS apart, as other
+            # processes don't look more often; the final state is bumped below.
+            nonlocal last_bump
+            now = time.monotonic()
+            if last_bump is None or now - last_bump >= settings.SEARCH_RESULT_CACHE_SYNC_SECONDS:
+                self.search_cache.bump_generation(project_id)
+                last_bump = now
+            if progress is not None:
+                progress(chunks_total=chunk_count, chunks_upserted=upserted)
+
+        # Embed the new chunks in bounded batches and upsert each batch as soon as it is ready
+        total = self._embed_and_upsert(backend, project_id, new_chunks(), on_batch=on_batch)
+        logger.info(
+            f"Split '{source}' into {chunk_count} chunks and upserted {total} new or changed "
+            f"ones for project {project_id} ({len(current_ids) - total} unchanged)."
         )
-        logger.info(f"Successfully upserted {len(chunks)} chunks into '{collection_name}'.")
 
-    def search(self, project_id: int, query: str, limit: int = 5) -> List[Document]:
+        # Remove points left over from a previous revision of this source
+        stale_ids = existing_ids - current_ids
+        if stale_ids:
+            for batch in _batched(stale_ids, 1000):
+                backend.delete(project_id, batch)
+            logger.info(f"Deleted {len(stale_ids)} stale chunks of '{source}' for project {project_id}.")
+
+        if backend is self.local_backend:
+            self._maybe_promote(project_id)
+
+        # The project's contents changed, so earlier search results are no longer valid
+        if total or stale_ids:
+            self.search_cache.bump_generation(project_id)
+
+        return {
+            "chunks_total": chunk_count,
+            "chunks_upserted": total,
+            "chunks_unchanged": len(current_ids) - total,
+            "chunks_deleted": len(stale_ids),
+        }
+
+    def _embed_and_upsert(
+        self,
+        backend: BaseVectorBackend,
+        project_id: int,
+        chunks: Iterable[Tuple[str, Document]],
+        on_batch: Optional[Callable[[int], None]] = None
+    ) -> int:
         """
-        Performs a similarity search in the specified project's collection.
+        Streams (point ID, chunk) pairs through the embedding model in batches of
+        EMBEDDING_BATCH_SIZE with up to EMBEDDING_CONCURRENCY requests in flight,
+        upserting each batch into the backend in order as its vectors arrive.
+
+        At most EMBEDDING_CONCURRENCY batches are held in memory at any time:
+        no new batch is pulled from `chunks` until the oldest one has been upserted.
+
+        :param on_batch: Optional callback, called with the running total after each upsert.
         """
-        collection_name = self.get_collection_name(project_id)
-        query_vector = self.embeddings.embed_query(query)
+        in_flight: deque[Tuple[List[Tuple[str, Document]], Future]] = deque()
+        total = 0
+        try:
+            for batch in _batched(chunks, settings.EMBEDDING_BATCH_SIZE):
+                texts = [chunk.page_content for _, chunk in batch]
+                future = self.embedding_executor.submit(self.embeddings.embed_documents, texts)
+                in_flight.append((batch, future))
 
-        logger.info(f"Searching in collection '{collection_name}' with query: '{query}'")
+                # Backpressure: wait for the oldest batch before reading any further
+                if len(in_flight) >= settings.EMBEDDING_CONCURRENCY:
+                    total += self._upsert_batch(backend, project_id, *in_flight.popleft())
+                    if on_batch is not None:
+                        on_batch(total)
 
-        hits = self.qdrant_client.search(
-            collection_name=collection_name,
-            query_vector=query_vector,
-            limit=limit,
-            with_payload=True
-        )
+            while in_flight:
+                total += self._upsert_batch(backend, project_id, *in_flight.popleft())
+                if on_batch is not None:
+                    on_batch(total)
+        finally:
+            # On failure, don't leave queued embedding requests running for nothing
+            for _, future in in_flight:
+                future.cancel()
+        return total
+
+    def _upsert_batch(self, backend: BaseVectorBackend, project_id: int, batch: List[Tuple[str, Document]], future: Future) -> int:
+        """Waits for a batch's embeddings and upserts the batch into the backend."""
+        vectors = future.result()
+
+        # Add the original text content to the payload
+        ids = []
+        payloads = []
+        for point_id, chunk in batch:
+            payload = dict(chunk.metadata)
+            payload['page_content'] = chunk.page_content
+            ids.append(point_id)
+            payloads.append(payload)
 
-        # Convert search hits back to LangChain Document objects
-        results = [
+        backend.upsert(project_id, ids=ids, vectors=vectors, payloads=payloads)
+        logger.debug(f"Upserted batch of {len(batch)} chunks for project {project_id}.")
+        return len(batch)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """Embeds a search query, reusing the vector for queries seen before."""
+        key = (self.embedding_model, query)
+        vector = self.query_embedding_cache.get(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(query)
+            self.query_embedding_cache.put(key, vector)
+        return vector
+
+    @staticmethod
+    def _hits_to_documents(hits: List[VectorHit]) -> List[Document]:
+        """Converts search hits back to LangChain Document objects."""
+        return [
             Document(
                 page_content=hit.payload.get('page_content', ''),
                 metadata={k: v for k, v in hit.payload.items() if k != 'page_content'}
             )
             for hit in hits
         ]
-        logger.info(f"Found {len(results)} relevant documents.")
-        return results
 
-# Singleton instance
-vector_store_manager = VectorStoreManager()
+    async def amax_marginal_relevance_search(
+        self, project_id: int, query: str, k: int, fetch_k: int, lambda_mult: float
+    ) -> List[Document]:
+        """
+        Over-fetches `fetch_k` candidates with their stored vectors and returns
+        up to `k` of them chosen by maximal marginal relevance, so overlapping
+        and near-duplicate chunks don't crowd out other relevant passages.
+        Results are in selection order and are cached per project until the
+        next ingest into that project.
+        """
+        cache_key = ("mmr", self.embedding_model, query, k, fetch_k, lambda_mult)
+        generation = await self.search_cache.ageneration(project_id)
+        cached = self.search_cache.get(project_id, generation, cache_key)
+        if cached is not None:
+            logger.info(f"Serving {len(cached)} cached MMR results for project {project_id}.")
+            return list(cached)
+
+        backend = await self.aget_backend(project_id)
+        query_vector = await self.aembed_query(query)
+
+        logger.info(f"MMR search of project {project_id} in the {backend.name} backend with query: '{query}'")
+
+        hits = [hit for hit in await backend.asearch(project_id, query_vector, limit=fetch_k, with_vectors=True) if hit.vector]
+        order = mmr_select(query_vector, [hit.vector for hit in hits], k, lambda_mult)
+        results = self._hits_to_documents([hits[i] for i in order])
+        logger.info(f"Selected {len(results)} diverse documents out of {len(hits)} candidates.")
+        self.search_cache.put(project_id, generation, cache_key, results)
+        return list(results)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters for the query embedding and search result caches."""
+        return {
+            "query_embeddings": self.query_embedding_cache.stats(),
+            "search_results": self.search_cache.stats(),
+        }
+
+# Singleton instance, created on first use so that importing the app neither
+# loads the provider SDKs nor depends on Qdrant being reachable.
+_vector_store_manager: Optional[VectorStoreManager] = None
+_vector_store_manager_lock = threading.Lock()
+
+def get_vector_store_manager() -> VectorStoreManager:
+    """Returns the shared VectorStoreManager, creating it on first call."""
+    global _vector_store_manager
+    if _vector_store_manager is None:
+        with _vector_store_manager_lock:
+            if _vector_store_manager is None:
+                _vector_store_manager = VectorStoreManager()
+    return _vector_store_manager
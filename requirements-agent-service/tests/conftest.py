@@ -0,0 +1,12 @@
+import pytest
+
+from app.config import settings
+
+
+@pytest.fixture
+def override_settings(monkeypatch):
+    """Overrides settings for the duration of a test."""
+    def override(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(settings, name, value)
+    return override
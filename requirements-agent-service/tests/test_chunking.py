@@ -0,0 +1,91 @@
+import re
+from typing import List
+
+import pytest
+
+from app import chunking
+from app.chunking import chunk_elements
+
+
+def count_words(text: str) -> int:
+    return len(re.findall(r"\S+", text))
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch, override_settings):
+    monkeypatch.setattr(chunking, "count_tokens", count_words)
+    override_settings(CHUNK_MAX_TOKENS=50, CHUNK_MIN_TOKENS=20, CHUNK_OVERLAP_TOKENS=0)
+
+
+def title(text: str, depth: int = 0) -> dict:
+    return {"text": text, "category": "Title", "metadata": {"category_depth": depth}}
+
+
+def text(words: int, word: str = "word", page: int = 1) -> dict:
+    return {"text": " ".join([word] * words), "category": "NarrativeText", "metadata": {"page_number": page}}
+
+
+def table(rows: List[str]) -> dict:
+    return {"text": "\n".join(rows), "category": "Table", "metadata": {}}
+
+
+def chunk(elements) -> List:
+    return list(chunk_elements(elements, "doc.pdf"))
+
+
+def test_small_sections_are_merged_and_attributed_to_their_first_section():
+    chunks = chunk([title("Intro"), text(5), title("Scope"), text(5, "scope")])
+
+    assert len(chunks) == 1
+    assert chunks[0].page_content == "Intro\n\n" + " ".join(["word"] * 5) + "\n\nScope\n\n" + " ".join(["scope"] * 5)
+    assert chunks[0].metadata == {"source": "doc.pdf", "section": "Intro", "chunk_type": "text", "page_number": 1}
+
+
+def test_a_heading_starts_a_new_chunk_once_the_section_is_large_enough():
+    chunks = chunk([title("Intro"), text(25), title("Scope"), title("Users", depth=1), text(5, "user", page=2)])
+
+    assert [c.metadata["section"] for c in chunks] == ["Intro", "Scope > Users"]
+    assert chunks[1].page_content.startswith("Scope\n\nUsers\n\nuser")
+    assert chunks[1].metadata["page_number"] == 2
+
+
+def test_headings_introduce_a_table_that_follows_a_small_section():
+    chunks = chunk([title("Intro"), text(5), title("Pricing"), table(["| plan | price |", "| basic | 10 |"])])
+
+    assert [c.metadata["chunk_type"] for c in chunks] == ["text", "table"]
+    assert not chunks[0].page_content.endswith("Pricing")
+    assert chunks[1].page_content == "Pricing\n\n| plan | price |\n| basic | 10 |"
+    assert chunks[1].metadata["section"] == "Pricing"
+
+
+def test_headings_move_to_the_next_chunk_when_the_limit_forces_a_flush():
+    chunks = chunk([title("Intro"), text(5), title("Details"), text(48, "detail")])
+
+    assert chunks[0].page_content == "Intro\n\n" + " ".join(["word"] * 5)
+    assert chunks[1].page_content.startswith("Details\n\ndetail")
+    assert chunks[1].metadata["section"] == "Details"
+
+
+def test_large_tables_are_split_at_row_boundaries():
+    rows = [f"| row {i} | " + " ".join(["cell"] * 9) + " |" for i in range(12)]
+
+    chunks = chunk([title("Data"), table(rows)])
+
+    assert len(chunks) > 1
+    assert all(c.metadata["chunk_type"] == "table" for c in chunks)
+    assert all(count_words(c.page_content) <= 50 + 1 for c in chunks)
+    # Only the first part carries the heading, and no row is lost or cut
+    assert chunks[0].page_content.startswith("Data\n\n| row 0 |")
+    parts = [c.page_content.replace("Data\n\n", "", 1) for c in chunks]
+    assert "\n".join(parts).splitlines() == rows
+
+
+def test_oversized_elements_are_split_on_their_own(monkeypatch):
+    monkeypatch.setattr(chunking, "_split_oversized", lambda t: [" ".join(t.split()[i:i + 50]) for i in range(0, len(t.split()), 50)])
+
+    chunks = chunk([title("Intro"), text(10), title("Spec"), text(120, "spec"), text(3, "tail")])
+
+    assert [count_words(c.page_content) for c in chunks] == [11, 51, 50, 20, 3]
+    assert chunks[0].page_content.startswith("Intro")
+    assert chunks[1].page_content.startswith("Spec\n\nspec")
+    assert {c.metadata["section"] for c in chunks[1:]} == {"Spec"}
@@ -0,0 +1,65 @@
+import re
+from typing import List
+
+import pytest
+
+from app import context_assembly
+from app.context_assembly import group_context, mmr_select, pack_context
+
+
+class WordEncoding:
+    """Counts each space-separated word (and each separator) as one token."""
+    def encode(self, text: str) -> List[str]:
+        return re.findall(r"\n\n|\S+", text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    monkeypatch.setattr(context_assembly, "_get_encoding", lambda: WordEncoding())
+
+
+def test_mmr_starts_with_the_most_relevant_candidate():
+    vectors = [[0.5, 0.5], [1.0, 0.0], [0.0, 1.0]]
+    assert mmr_select([1.0, 0.1], vectors, k=1, lambda_mult=0.5) == [1]
+
+
+def test_mmr_skips_near_duplicates():
+    vectors = [[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.7, 0.0, 0.7]]
+    query = [1.0, 0.0, 0.3]
+
+    # Pure relevance takes the near-duplicate second; a diversity trade-off doesn't
+    assert mmr_select(query, vectors, k=2, lambda_mult=1.0) == [0, 1]
+    assert mmr_select(query, vectors, k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_mmr_returns_each_candidate_at_most_once():
+    vectors = [[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]]
+    assert sorted(mmr_select([1.0, 0.0], vectors, k=10, lambda_mult=0.5)) == [0, 1, 2]
+    assert mmr_select([1.0, 0.0], [], k=3, lambda_mult=0.5) == []
+    assert mmr_select([1.0, 0.0], vectors, k=0, lambda_mult=0.5) == []
+
+
+def test_pack_context_keeps_chunks_in_priority_order_within_budget():
+    chunks = ["one two three", "four five six seven eight", "nine ten"]
+
+    # 3 tokens, then 1 separator + 5 don't fit into 7, then 1 separator + 2 do
+    assert pack_context(chunks, token_budget=7) == "one two three\n\nnine ten"
+    assert pack_context(chunks, token_budget=100) == "\n\n".join(chunks)
+
+
+def test_pack_context_truncates_a_first_chunk_larger_than_the_budget():
+    assert pack_context(["one two three four five"], token_budget=3) == "one two three"
+    assert pack_context([], token_budget=3) == ""
+
+
+def test_group_context_keeps_neighbouring_chunks_together():
+    chunks = ["a b", "c d", "e f g h", "i", "j k l m n"]
+
+    groups = group_context(chunks, group_token_budget=5, max_groups=2)
+
+    # "j k l m n" doesn't fit into the last group and a third isn't allowed
+    assert groups == ["a b\n\nc d", "e f g h"]
+    assert group_context(["a b c d e f"], group_token_budget=4, max_groups=3) == ["a b c d"]
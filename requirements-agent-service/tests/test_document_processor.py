@@ -0,0 +1,77 @@
+import io
+from contextlib import contextmanager
+
+import pytest
+
+from app import chunking, document_processor
+from app.parsers import parser_metrics
+
+PARAGRAPHS = 200
+
+
+class FakeVectorStoreManager:
+    """Consumes chunks like the real manager and records how much of the file was read when each arrived."""
+    def __init__(self, file):
+        self.file = file
+        self.read_positions = []
+
+    def process_and_store_documents(self, project_id, bucket_name, source, documents, progress=None, chunked=False):
+        for _ in documents:
+            self.read_positions.append(self.file.tell())
+        return {"chunks_total": len(self.read_positions)}
+
+
+@pytest.fixture
+def document(monkeypatch, override_settings):
+    override_settings(CHUNKING_STRATEGY="structured", CHUNK_MAX_TOKENS=20, CHUNK_MIN_TOKENS=5, FAST_PARSERS_ENABLED=True)
+    monkeypatch.setattr(chunking, "count_tokens", lambda text: len(text.split()))
+    file = io.BytesIO("".join(f"Paragraph {i} has a few words in it.\n\n" for i in range(PARAGRAPHS)).encode())
+
+    @contextmanager
+    def open_document(bucket_name, object_name, etag=None):
+        yield file
+
+    manager = FakeVectorStoreManager(file)
+    monkeypatch.setattr(document_processor, "open_document", open_document)
+    monkeypatch.setattr(document_processor, "get_vector_store_manager", lambda: manager)
+    return file, manager
+
+
+def test_fast_path_documents_are_chunked_while_they_are_parsed(document):
+    file, manager = document
+    stages = []
+
+    assert document_processor.process_document_for_project(1, "bucket", "notes.txt", progress=lambda stage, **fields: stages.append(stage))
+
+    assert stages == ["parsing", "embedding", "completed"]
+    assert len(manager.read_positions) > 1
+    # The first chunk arrived long before the whole file had been read
+    assert manager.read_positions[0] < len(file.getvalue()) / 10
+    assert parser_metrics.stats()["text"]["elements"] >= PARAGRAPHS
+
+
+def test_a_parse_failure_mid_stream_fails_the_document(document, monkeypatch):
+    def failing_parser(file, object_name):
+        yield {"text": "first", "category": "NarrativeText", "metadata": {}}
+        raise ValueError("broken input")
+
+    monkeypatch.setitem(document_processor.FAST_PARSERS, "text", failing_parser)
+    reports = []
+
+    ok = document_processor.process_document_for_project(1, "bucket", "notes.txt", progress=lambda stage, **fields: reports.append((stage, fields)))
+
+    assert ok is False
+    stage, fields = reports[-1]
+    assert stage == "failed"
+    assert fields["error"] == "Failed to load document: ValueError: broken input"
+
+
+def test_empty_documents_complete_without_touching_the_store(document):
+    file, manager = document
+    file.seek(0)
+    file.truncate()
+    file.write(b"\n\n  \n")
+    file.seek(0)
+
+    assert document_processor.process_document_for_project(1, "bucket", "notes.txt")
+    assert manager.read_positions == []
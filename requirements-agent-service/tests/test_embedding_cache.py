@@ -0,0 +1,78 @@
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeds a text as [len(text), number of calls so far] and records what it was asked to embed."""
+    def __init__(self):
+        self.requests: List[List[str]] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.requests.append(list(texts))
+        return [[float(len(text)), float(len(self.requests))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), 0.0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "cache" / "embeddings.sqlite3"), max_entries=100)
+
+
+def test_key_depends_on_provider_model_and_text():
+    key = EmbeddingCache.make_key("ollama", "llama3", "text")
+    assert key == EmbeddingCache.make_key("ollama", "llama3", "text")
+    assert key != EmbeddingCache.make_key("openai", "llama3", "text")
+    assert key != EmbeddingCache.make_key("ollama", "other", "text")
+    assert key != EmbeddingCache.make_key("ollama", "llama3", "other text")
+    # Parts are delimited, so shifting characters between them changes the key
+    assert EmbeddingCache.make_key("a", "bc", "d") != EmbeddingCache.make_key("ab", "c", "d")
+
+
+def test_vectors_round_trip_and_persist(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    EmbeddingCache(path, max_entries=10).put_many({"a": [0.5, -1.25], "b": [2.0, 3.0]})
+
+    reopened = EmbeddingCache(path, max_entries=10)
+    assert reopened.get_many(["a", "b", "missing"]) == {"a": [0.5, -1.25], "b": [2.0, 3.0]}
+    assert reopened.stats()["hits"] == 2
+    assert reopened.stats()["misses"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(1, 100))
+    monkeypatch.setattr("app.embedding_cache.time.time", lambda: float(next(clock)))
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), max_entries=2)
+
+    cache.put_many({"a": [1.0]})
+    cache.put_many({"b": [2.0]})
+    cache.get_many(["a"])  # "b" is now the least recently used
+    cache.put_many({"c": [3.0]})
+
+    assert cache.get_many(["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+    assert cache.stats()["entries"] == 2
+
+
+def test_only_misses_are_sent_to_the_provider(cache):
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, cache, provider="ollama", model="llama3")
+
+    first = embeddings.embed_documents(["one", "three"])
+    second = embeddings.embed_documents(["three", "five", "five", "one"])
+
+    assert underlying.requests == [["one", "three"], ["five"]]
+    # Cached vectors are returned as originally embedded, in input order
+    assert second == [first[1], [4.0, 2.0], [4.0, 2.0], first[0]]
+
+
+def test_cache_is_scoped_to_the_model(cache):
+    underlying = CountingEmbeddings()
+    CachedEmbeddings(underlying, cache, provider="ollama", model="llama3").embed_documents(["text"])
+    CachedEmbeddings(underlying, cache, provider="ollama", model="other").embed_documents(["text"])
+
+    assert underlying.requests == [["text"], ["text"]]
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from app.agents.requirement_generation import USER_STORY_PROMPT_VERSION, user_story_cache_key
+from app.generation_cache import GenerationCache, normalize_prompt
+
+KEY_PARTS = ("Users can export reports", "context", "openai", "gpt-4o", "v1")
+
+
+def test_prompts_differing_only_in_case_and_whitespace_share_a_key():
+    assert normalize_prompt("  Users can\n EXPORT   reports ") == "users can export reports"
+    assert GenerationCache.make_key(*KEY_PARTS) == GenerationCache.make_key("users  can export\tREPORTS", *KEY_PARTS[1:])
+
+
+@pytest.mark.parametrize("index, value", [
+    (0, "Users can import reports"),
+    (1, "other context"),
+    (2, "ollama"),
+    (3, "gpt-4o-mini"),
+    (4, "v2"),
+])
+def test_every_key_part_changes_the_key(index, value):
+    parts = list(KEY_PARTS)
+    parts[index] = value
+    assert GenerationCache.make_key(*parts) != GenerationCache.make_key(*KEY_PARTS)
+
+
+def test_key_parts_cannot_run_into_each_other():
+    assert GenerationCache.make_key("ab", "c", "p", "m", "v") != GenerationCache.make_key("a", "bc", "p", "m", "v")
+
+
+def test_story_key_uses_the_configured_provider_model_and_template_version(override_settings):
+    cache = GenerationCache(max_entries=4)
+    override_settings(LLM_PROVIDER="ollama", OLLAMA_MODEL_NAME="llama3")
+
+    key = user_story_cache_key(cache, "prompt", "context")
+
+    assert key == GenerationCache.make_key("prompt", "context", "ollama", "llama3", USER_STORY_PROMPT_VERSION)
+    override_settings(OLLAMA_MODEL_NAME="mistral")
+    assert user_story_cache_key(cache, "prompt", "context") != key
+
+
+def test_entries_expire_after_the_ttl():
+    cache = GenerationCache(max_entries=4, ttl_seconds=0.02)
+    cache.put("key", ["story"])
+    assert cache.get("key") == ["story"]
+
+    time.sleep(0.03)
+
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = GenerationCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, generation_worker
+from app.database import Base
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'runs.sqlite3'}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(generation_worker, "SessionLocal", session_factory)
+    yield session_factory
+    engine.dispose()
+
+
+@pytest.fixture
+def run_id(sessions):
+    with sessions() as db:
+        return crud.create_generation_run(db, 1, "PROJ", "Login").id
+
+
+def graph_failing_in(monkeypatch, nodes, failure):
+    """Replaces the agent graph with one that starts `nodes` in order and then fails."""
+    async def run_agent_graph(state, observer):
+        for node in nodes:
+            await observer.node_started(node)
+        if isinstance(failure, Exception):
+            raise failure
+        return {**state, "error": failure}
+    monkeypatch.setattr(generation_worker, "run_agent_graph", run_agent_graph)
+
+
+def get_run(sessions, run_id):
+    with sessions() as db:
+        return crud.get_generation_run(db, run_id)
+
+
+def test_failures_before_pushing_are_retried(sessions, run_id, monkeypatch):
+    graph_failing_in(monkeypatch, ["retrieve_documents", "generate_user_stories"], "LLM unavailable")
+
+    error, retry = asyncio.run(generation_worker.execute_generation_run(run_id, attempt=0, last_attempt=False))
+
+    assert (error, retry) == ("LLM unavailable", True)
+    run = get_run(sessions, run_id)
+    assert (run.status, run.attempts, run.current_node) == ("retrying", 1, "generate_user_stories")
+
+
+@pytest.mark.parametrize("failure", ["Jira push failed", ConnectionError("integration service down")])
+def test_failures_after_pushing_started_are_not_retried(sessions, run_id, monkeypatch, failure):
+    graph_failing_in(monkeypatch, ["retrieve_documents", "generate_user_stories", "push_to_jira"], failure)
+
+    error, retry = asyncio.run(generation_worker.execute_generation_run(run_id, attempt=0, last_attempt=False))
+
+    assert retry is False
+    run = get_run(sessions, run_id)
+    assert run.status == "failed"
+    assert run.error == error
+    assert run.finished_at is not None
+
+
+def test_a_redelivered_run_that_was_pushing_is_not_run_again(sessions, run_id, monkeypatch):
+    with sessions() as db:
+        crud.update_generation_run(db, run_id, status="running", current_node="push_to_jira")
+
+    async def run_agent_graph(state, observer):
+        raise AssertionError("the graph must not run again")
+    monkeypatch.setattr(generation_worker, "run_agent_graph", run_agent_graph)
+
+    assert asyncio.run(generation_worker.execute_generation_run(run_id, attempt=1, last_attempt=False)) == (None, False)
+    run = get_run(sessions, run_id)
+    assert run.status == "failed"
+    assert "not retried to avoid duplicate issues" in run.error
+
+
+def test_the_run_job_only_raises_for_retryable_failures(sessions, run_id, monkeypatch):
+    graph_failing_in(monkeypatch, ["push_to_jira"], "Jira push failed")
+
+    # Returns normally, so the broker acknowledges the job instead of redelivering it
+    asyncio.run(generation_worker.run_generation_job({"job_id": run_id, "attempt": 0}))
+
+    assert get_run(sessions, run_id).status == "failed"
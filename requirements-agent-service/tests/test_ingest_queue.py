@@ -0,0 +1,108 @@
+import threading
+import time
+
+from app import ingest_queue
+from app.ingest_queue import InMemoryBroker
+
+
+def _consume_in_background(broker, handler):
+    thread = threading.Thread(target=broker.consume, args=(handler,), daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the broker"
+        time.sleep(0.01)
+
+
+def _broker(max_retries=2):
+    return InMemoryBroker(queue_name="test.ingest", prefetch=2, max_retries=max_retries, retry_delay=0.01)
+
+
+def test_published_job_is_handled_once():
+    broker = _broker()
+    handled = []
+    consumer = _consume_in_background(broker, handled.append)
+
+    broker.publish({"job_id": "job-1"})
+    _wait_for(lambda: handled)
+    time.sleep(0.05)
+    broker.stop()
+    consumer.join(timeout=5)
+
+    assert handled == [{"job_id": "job-1"}]
+    assert broker.dead_letters == []
+
+
+def test_failed_job_is_retried_with_next_attempt():
+    broker = _broker()
+    attempts = []
+
+    def handler(message):
+        attempts.append(message.get("attempt", 0))
+        if len(attempts) == 1:
+            raise RuntimeError("transient failure")
+
+    consumer = _consume_in_background(broker, handler)
+    broker.publish({"job_id": "job-1"})
+    _wait_for(lambda: len(attempts) == 2)
+    time.sleep(0.05)
+    broker.stop()
+    consumer.join(timeout=5)
+
+    assert attempts == [0, 1]
+    assert broker.dead_letters == []
+
+
+def test_job_failing_every_attempt_is_dead_lettered():
+    broker = _broker(max_retries=2)
+    attempts = []
+
+    def handler(message):
+        attempts.append(message.get("attempt", 0))
+        raise RuntimeError("permanent failure")
+
+    consumer = _consume_in_background(broker, handler)
+    broker.publish({"job_id": "job-1", "project_id": 7})
+    _wait_for(lambda: broker.dead_letters)
+    time.sleep(0.05)
+    broker.stop()
+    consumer.join(timeout=5)
+
+    assert attempts == [0, 1, 2]
+    assert broker.dead_letters == [{"job_id": "job-1", "project_id": 7, "attempt": 2}]
+
+
+def test_is_last_attempt():
+    broker = _broker(max_retries=1)
+    assert not broker.is_last_attempt({"job_id": "job-1"})
+    assert broker.is_last_attempt({"job_id": "job-1", "attempt": 1})
+
+
+def test_published_message_is_a_copy():
+    broker = _broker()
+    message = {"job_id": "job-1", "payload": {"key": "value"}}
+    handled = []
+    consumer = _consume_in_background(broker, handled.append)
+
+    broker.publish(message)
+    message["payload"]["key"] = "changed"
+    _wait_for(lambda: handled)
+    broker.stop()
+    consumer.join(timeout=5)
+
+    assert handled[0]["payload"] == {"key": "value"}
+
+
+def test_memory_broker_is_selected_by_setting(override_settings, monkeypatch):
+    override_settings(INGEST_BROKER="memory", INGEST_MAX_RETRIES=5)
+    monkeypatch.setattr(ingest_queue, "_broker", None)
+
+    broker = ingest_queue.get_broker()
+
+    assert isinstance(broker, InMemoryBroker)
+    assert broker.max_retries == 5
+    assert ingest_queue.get_broker() is broker
@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.agents import requirement_generation
+from app.integration_client import IntegrationClient, _retry_delay
+
+PAYLOAD = {"internal_id": "req-1", "title": "Login", "project_key": "PROJ"}
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(override_settings):
+    override_settings(
+        JIRA_PUSH_CONCURRENCY=2,
+        JIRA_PUSH_MAX_RETRIES=3,
+        JIRA_PUSH_RETRY_BASE_DELAY_SECONDS=0.001,
+        JIRA_PUSH_RETRY_MAX_DELAY_SECONDS=0.01
+    )
+
+
+def run_with_client(handler, test):
+    """Runs `test(client)` against an IntegrationClient whose requests go to `handler`."""
+    async def main():
+        client = IntegrationClient()
+        await client.http.aclose()
+        client.http = httpx.AsyncClient(base_url="http://integration", transport=httpx.MockTransport(handler))
+        try:
+            return await test(client)
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def test_transient_failures_are_retried_with_the_same_payload():
+    requests = []
+    responses = [
+        httpx.ConnectTimeout("timed out"),
+        httpx.Response(503, headers={"Retry-After": "0"}),
+        httpx.Response(429),
+        httpx.Response(201, json={"jira_key": "PROJ-1", "internal_id": "req-1"}),
+    ]
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    result = run_with_client(handler, lambda client: client.create_jira_issue(PAYLOAD))
+
+    assert result == {"jira_key": "PROJ-1", "internal_id": "req-1"}
+    assert requests == [PAYLOAD] * 4
+
+
+def test_conflict_means_an_earlier_attempt_created_the_issue():
+    def handler(request):
+        return httpx.Response(409, json={
+            "detail": "Artifact with internal ID 'req-1' has already been synced to Jira issue 'PROJ-7'."
+        })
+
+    result = run_with_client(handler, lambda client: client.create_jira_issue(PAYLOAD))
+
+    assert result == {"jira_key": "PROJ-7", "internal_id": "req-1", "already_synced": True}
+
+
+def test_client_errors_are_not_retried():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(400, json={"detail": "Bad project key"})
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run_with_client(handler, lambda client: client.create_jira_issue(PAYLOAD))
+    assert len(requests) == 1
+
+
+def test_gives_up_after_max_retries():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(502)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run_with_client(handler, lambda client: client.create_jira_issue(PAYLOAD))
+    assert len(requests) == 4
+
+
+def test_concurrent_requests_are_bounded():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(201, json={"jira_key": json.loads(request.content)["internal_id"]})
+
+    async def push_all(client):
+        return await asyncio.gather(*(
+            client.create_jira_issue({**PAYLOAD, "internal_id": f"req-{i}"}) for i in range(6)
+        ))
+
+    results = run_with_client(handler, push_all)
+
+    assert [result["jira_key"] for result in results] == [f"req-{i}" for i in range(6)]
+    assert peak == 2
+
+
+@pytest.mark.parametrize("retry_after, expected", [
+    ("0", 0.0),
+    ("0.005", 0.005),
+    ("3600", 0.01),
+])
+def test_retry_after_is_clamped(retry_after, expected):
+    assert _retry_delay(0, retry_after) == expected
+
+
+@pytest.mark.parametrize("retry_after", [None, "-5", "nan", "Wed, 21 Oct 2026 07:28:00 GMT"])
+def test_invalid_retry_after_falls_back_to_backoff(retry_after):
+    assert 0 < _retry_delay(10, retry_after) <= 0.01
+
+
+def test_push_node_keeps_story_order_and_isolates_failures(monkeypatch):
+    class FakeClient:
+        async def create_jira_issue(self, payload):
+            # Finish in reverse order
+            await asyncio.sleep(0.01 * (3 - int(payload["title"][-1])))
+            if payload["title"] == "Story 1":
+                raise ValueError("unexpected response body")
+            return {"jira_key": f"PROJ-{payload['title'][-1]}", "internal_id": payload["internal_id"]}
+
+    monkeypatch.setattr(requirement_generation, "get_integration_client", lambda: FakeClient())
+    stories = [
+        {"title": f"Story {i}", "description": "As a user...", "acceptance_criteria": ["Works"]}
+        for i in range(3)
+    ]
+
+    update = asyncio.run(requirement_generation.push_to_jira_node({
+        "generated_stories": stories,
+        "jira_project_key": "PROJ",
+        "error": None,
+    }))
+
+    results = update["jira_results"]
+    assert [result.get("jira_key") for result in results] == ["PROJ-0", None, "PROJ-2"]
+    assert results[1]["story"] == stories[1]
+    assert "unexpected response body" in results[1]["error"]
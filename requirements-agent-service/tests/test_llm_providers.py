@@ -0,0 +1,149 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import llm_providers
+from app.llm_providers import ProviderPool, ProviderQueueFullError, _retry_delay
+
+
+class RateLimitError(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.status_code = 429
+        self.response = httpx.Response(429, headers={"retry-after": retry_after} if retry_after else {})
+
+
+class Runnable:
+    """Answers each call with the next outcome: an exception to raise, or a value to return."""
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else inputs
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(override_settings):
+    override_settings(LLM_MAX_RETRIES=2, LLM_RETRY_BASE_DELAY_SECONDS=0.001, LLM_RETRY_MAX_DELAY_SECONDS=0.01)
+
+
+def test_waiting_requests_are_served_in_arrival_order():
+    async def test():
+        pool = ProviderPool("test", max_concurrency=1, max_queue=10)
+        order = []
+
+        async def request(name):
+            async with pool.slot():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.create_task(request("first"))
+        await asyncio.sleep(0)
+        waiting = []
+        for name in ["second", "third", "fourth"]:
+            waiting.append(asyncio.create_task(request(name)))
+            await asyncio.sleep(0)
+        assert (pool.in_flight, pool.queued) == (1, 3)
+
+        await asyncio.gather(first, *waiting)
+        assert order == ["first", "second", "third", "fourth"]
+        assert (pool.in_flight, pool.queued) == (0, 0)
+
+    asyncio.run(test())
+
+
+def test_requests_beyond_the_queue_limit_are_rejected():
+    async def test():
+        pool = ProviderPool("test", max_concurrency=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def request():
+            async with pool.slot():
+                await release.wait()
+
+        running = [asyncio.create_task(request()), asyncio.create_task(request())]
+        await asyncio.sleep(0)
+        with pytest.raises(ProviderQueueFullError):
+            await pool.ainvoke(Runnable(), "x")
+        assert pool.stats()["rejected"] == 1
+
+        release.set()
+        await asyncio.gather(*running)
+        assert await pool.ainvoke(Runnable(), "x") == "x"
+
+    asyncio.run(test())
+
+
+def test_cancelled_waiters_give_up_their_place():
+    async def test():
+        pool = ProviderPool("test", max_concurrency=1, max_queue=5)
+        release = asyncio.Event()
+
+        async def request():
+            async with pool.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        assert pool.queued == 0
+
+        release.set()
+        await holder
+        assert (pool.in_flight, pool.queued) == (0, 0)
+
+    asyncio.run(test())
+
+
+def test_rate_limited_requests_are_retried():
+    async def test():
+        pool = ProviderPool("test", max_concurrency=1, max_queue=1)
+        runnable = Runnable(RateLimitError(), RateLimitError("0"), "stories")
+
+        assert await pool.ainvoke(runnable, "x") == "stories"
+        assert runnable.calls == 3
+        assert pool.stats()["retries"] == 2
+        assert pool.in_flight == 0
+
+    asyncio.run(test())
+
+
+def test_gives_up_after_max_retries_and_does_not_retry_other_errors():
+    async def test():
+        pool = ProviderPool("test", max_concurrency=1, max_queue=1)
+        runnable = Runnable(RateLimitError(), RateLimitError(), RateLimitError(), "unused")
+        with pytest.raises(RateLimitError):
+            await pool.ainvoke(runnable, "x")
+        assert runnable.calls == 3
+
+        runnable = Runnable(ValueError("bad request"))
+        with pytest.raises(ValueError):
+            await pool.ainvoke(runnable, "x")
+        assert runnable.calls == 1
+        assert pool.stats()["failed"] == 2
+
+    asyncio.run(test())
+
+
+@pytest.mark.parametrize("retry_after, expected", [("0.005", 0.005), ("3600", 0.01), ("inf", None), ("-1", None), ("soon", None)])
+def test_retry_after_is_honoured_up_to_the_maximum_delay(retry_after, expected):
+    delay = _retry_delay(RateLimitError(retry_after), attempt=0)
+    if expected is None:
+        # Invalid values fall back to jittered backoff
+        assert 0.0005 <= delay <= 0.001
+    else:
+        assert delay == expected
+
+
+def test_status_is_read_from_ollama_error_messages():
+    assert llm_providers._status_code(ValueError("Ollama call failed with status code 429.")) == 429
+    assert llm_providers._status_code(ValueError("no status")) is None
@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import pytest
+from minio.error import S3Error
+
+from app import minio_client
+from app.minio_client import open_document
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.released = False
+
+    def stream(self, amount):
+        for start in range(0, len(self.data), amount):
+            yield self.data[start:start + amount]
+
+    def read(self):
+        return self.data
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        self.released = True
+
+
+class FakeMinio:
+    """Serves objects from memory and enforces If-Match like MinIO does."""
+    def __init__(self):
+        self.objects = {}
+        self.responses = []
+
+    def put(self, name, data, etag):
+        self.objects[name] = (data, etag)
+
+    def _check(self, name, request_headers):
+        data, etag = self.objects[name]
+        expected = (request_headers or {}).get("If-Match")
+        if expected is not None and expected != f'"{etag}"':
+            raise S3Error("PreconditionFailed", "At least one of the pre-conditions you specified did not hold", name, "", "", None)
+        return data
+
+    def stat_object(self, bucket_name, object_name):
+        data, etag = self.objects[object_name]
+        return SimpleNamespace(size=len(data), etag=etag)
+
+    def get_object(self, bucket_name, object_name, offset=0, length=0, request_headers=None):
+        data = self._check(object_name, request_headers)
+        response = FakeResponse(data[offset:offset + length] if length else data[offset:])
+        self.responses.append(response)
+        return response
+
+
+@pytest.fixture
+def minio(monkeypatch, override_settings):
+    override_settings(MINIO_SPOOL_MAX_MEMORY_BYTES=1024, MINIO_RANGE_READ_ENABLED=True, MINIO_RANGE_READ_EXTENSIONS=[".pdf"], MINIO_RANGE_READ_BLOCK_BYTES=256)
+    fake = FakeMinio()
+    monkeypatch.setattr(minio_client, "minio_client", fake)
+    return fake
+
+
+def test_small_documents_stay_in_memory(minio):
+    minio.put("notes.txt", b"hello", "v1")
+
+    with open_document("bucket", "notes.txt") as file:
+        assert file.read() == b"hello"
+        assert not file._rolled
+
+    assert file.closed
+    assert all(response.released for response in minio.responses)
+
+
+def test_documents_past_the_threshold_spill_to_a_temp_file(minio):
+    data = bytes(range(256)) * 20
+    minio.put("large.txt", data, "v1")
+
+    with open_document("bucket", "large.txt") as file:
+        assert file._rolled
+        assert file.read() == data
+
+    assert file.closed
+
+
+def test_reading_a_replaced_revision_fails(minio):
+    minio.put("notes.txt", b"new revision", "v2")
+
+    with pytest.raises(S3Error) as error:
+        with open_document("bucket", "notes.txt", etag="v1"):
+            pass
+    assert error.value.code == "PreconditionFailed"
+
+    with open_document("bucket", "notes.txt", etag="v2") as file:
+        assert file.read() == b"new revision"
+
+
+def test_ranged_reads_fail_if_the_object_changes_mid_read(minio):
+    data = bytes(range(256)) * 4
+    minio.put("spec.pdf", data, "v1")
+
+    with open_document("bucket", "spec.pdf") as file:
+        file.seek(512)
+        assert file.read(10) == data[512:522]
+        assert len(minio.responses) == 1
+
+        minio.put("spec.pdf", b"x" * len(data), "v2")
+        file.seek(0)
+        with pytest.raises(S3Error):
+            file.read(10)
@@ -0,0 +1,165 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from app.backends.numpy_backend import NumpyBackend
+
+PROJECT_ID = 1
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "vectors")
+
+
+@pytest.fixture
+def backend(path):
+    backend = NumpyBackend(path)
+    backend.ensure_project(PROJECT_ID, lambda: 4)
+    return backend
+
+
+def _upsert_points(path, prefix, count):
+    backend = NumpyBackend(path)
+    for i in range(count):
+        backend.upsert(PROJECT_ID, [f"{prefix}-{i}"], [np.random.rand(4).tolist()], [{"source": prefix}])
+
+
+def test_ensure_project_creates_storage_once(path):
+    backend = NumpyBackend(path)
+    sizes = []
+
+    def vector_size():
+        sizes.append(4)
+        return 4
+
+    assert not backend.has_project(PROJECT_ID)
+    assert backend.ensure_project(PROJECT_ID, vector_size) is False
+    assert backend.ensure_project(PROJECT_ID, vector_size) is True
+    assert backend.has_project(PROJECT_ID)
+    assert sizes == [4]
+
+
+def test_search_ranks_by_cosine_similarity(backend):
+    backend.upsert(
+        PROJECT_ID,
+        ["x", "y", "xy"],
+        [[2, 0, 0, 0], [0, 3, 0, 0], [1, 1, 0, 0]],
+        [{"name": "x"}, {"name": "y"}, {"name": "xy"}]
+    )
+
+    hits = backend.search(PROJECT_ID, [1, 0.1, 0, 0], limit=2, with_vectors=True)
+
+    assert [hit.id for hit in hits] == ["x", "xy"]
+    assert hits[0].score == pytest.approx(1 / np.sqrt(1.01))
+    assert hits[0].payload == {"name": "x"}
+    # Stored vectors are unit-normalized
+    assert hits[0].vector == pytest.approx([1, 0, 0, 0])
+
+
+def test_upsert_replaces_existing_points(backend):
+    backend.upsert(PROJECT_ID, ["a", "b"], [[1, 0, 0, 0], [0, 1, 0, 0]], [{"v": 1}, {"v": 1}])
+    backend.upsert(PROJECT_ID, ["a", "c", "c"], [[0, 0, 1, 0], [0, 0, 0, 1], [0, 1, 1, 0]], [{"v": 2}, {"v": 2}, {"v": 3}])
+
+    assert backend.count(PROJECT_ID) == 3
+    [hit] = backend.search(PROJECT_ID, [0, 0, 1, 0], limit=1)
+    assert (hit.id, hit.payload) == ("a", {"v": 2})
+    # The last occurrence of an ID in a batch wins
+    [hit] = backend.search(PROJECT_ID, [0, 1, 1, 0], limit=1)
+    assert (hit.id, hit.payload) == ("c", {"v": 3})
+
+
+def test_delete_and_source_lookup(backend):
+    backend.upsert(
+        PROJECT_ID,
+        ["a", "b", "c"],
+        [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]],
+        [{"source": "doc", "bucket": "one"}, {"source": "doc", "bucket": "two"}, {"source": "other", "bucket": "one"}]
+    )
+    assert backend.get_point_ids_for_source(PROJECT_ID, "one", "doc") == {"a"}
+
+    backend.delete(PROJECT_ID, ["a", "missing"])
+
+    assert backend.count(PROJECT_ID) == 2
+    assert "a" not in [hit.id for hit in backend.search(PROJECT_ID, [1, 0, 0, 0], limit=3)]
+    assert {hit.id for batch in backend.iter_points(PROJECT_ID, batch_size=1) for hit in batch} == {"b", "c"}
+
+
+def test_search_keeps_its_snapshot_while_writers_replace_it(backend):
+    backend.upsert(PROJECT_ID, ["a"], [[1, 0, 0, 0]], [{"v": 1}])
+    snapshot = backend._load(PROJECT_ID)
+
+    backend.upsert(PROJECT_ID, ["a", "b"], [[0, 1, 0, 0], [0, 0, 1, 0]], [{"v": 2}, {"v": 2}])
+
+    assert snapshot.ids == ["a"]
+    assert snapshot.payloads == [{"v": 1}]
+    assert np.asarray(snapshot.matrix[0]).tolist() == [1, 0, 0, 0]
+
+
+def test_other_instances_see_writes(path, backend):
+    other = NumpyBackend(path)
+    backend.upsert(PROJECT_ID, ["a", "b", "c"], np.eye(4)[:3].tolist(), [{}, {}, {}])
+    assert other.count(PROJECT_ID) == 3
+
+    backend.upsert(PROJECT_ID, ["d"], [[0, 0, 0, 1]], [{"new": True}])
+    assert other.count(PROJECT_ID) == 4
+    assert other.search(PROJECT_ID, [0, 0, 0, 1], limit=1)[0].id == "d"
+
+    other.delete(PROJECT_ID, ["a"])
+    assert backend.count(PROJECT_ID) == 3
+
+    other.drop_project(PROJECT_ID)
+    assert not backend.has_project(PROJECT_ID)
+
+
+def test_concurrent_writers_in_separate_processes_lose_no_points(path, backend):
+    context = multiprocessing.get_context("spawn")
+    writers = [context.Process(target=_upsert_points, args=(path, f"writer{i}", 20)) for i in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(timeout=60)
+        assert writer.exitcode == 0
+
+    assert backend.count(PROJECT_ID) == 80
+    assert len(backend.search(PROJECT_ID, [1, 1, 1, 1], limit=100)) == 80
+    assert len(backend.get_point_ids_for_source(PROJECT_ID, "any", "writer2")) == 20
+
+
+def test_upsert_appends_without_rewriting_existing_points(path, backend):
+    backend.upsert(PROJECT_ID, ["a"], [[1, 0, 0, 0]], [{"v": 1}])
+    points_path = backend._points_path(PROJECT_ID, 0)
+    with open(points_path, "rb") as f:
+        first = f.read()
+
+    backend.upsert(PROJECT_ID, ["b"], [[0, 1, 0, 0]], [{"v": 2}])
+
+    with open(points_path, "rb") as f:
+        assert f.read().startswith(first)
+    assert NumpyBackend(path).search(PROJECT_ID, [0, 1, 0, 0], limit=1)[0].id == "b"
+
+
+def test_crash_before_commit_keeps_the_last_committed_state(path, backend, monkeypatch):
+    backend.upsert(PROJECT_ID, ["a", "b", "c"], np.eye(4)[:3].tolist(), [{"n": 0}, {"n": 1}, {"n": 2}])
+
+    def crash(*args, **kwargs):
+        raise OSError("crashed before the manifest was replaced")
+
+    monkeypatch.setattr(backend, "_commit", crash)
+    with pytest.raises(OSError):
+        backend.delete(PROJECT_ID, ["a"])
+    with pytest.raises(OSError):
+        backend.upsert(PROJECT_ID, ["d"], [[0, 0, 0, 1]], [{"n": 3}])
+
+    # A fresh process sees the committed points, each with its own vector
+    other = NumpyBackend(path)
+    assert other.count(PROJECT_ID) == 3
+    for i, point_id in enumerate(["a", "b", "c"]):
+        [hit] = other.search(PROJECT_ID, np.eye(4)[i].tolist(), limit=1)
+        assert (hit.id, hit.payload) == (point_id, {"n": i})
+
+    # The next write discards the uncommitted leftovers
+    other.upsert(PROJECT_ID, ["e"], [[0, 0, 0, 1]], [{"n": 4}])
+    assert NumpyBackend(path).search(PROJECT_ID, [0, 0, 0, 1], limit=1)[0].payload == {"n": 4}
+    assert NumpyBackend(path).count(PROJECT_ID) == 4
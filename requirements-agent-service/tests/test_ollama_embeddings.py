@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.ollama_embeddings import OllamaBatchEmbeddings
+
+
+def vector(text):
+    return [float(len(text)), float(sum(map(ord, text)))]
+
+
+def make_embeddings(handler, batch_size=2):
+    """Returns embeddings whose requests go to `handler`, which gets (path, body)."""
+    def transport_handler(request):
+        return handler(request.url.path, json.loads(request.content))
+
+    embeddings = OllamaBatchEmbeddings("http://ollama:11434", "nomic-embed-text", batch_size=batch_size, concurrency=2)
+    embeddings._client.close()
+    embeddings._client = httpx.Client(base_url=embeddings.base_url, transport=httpx.MockTransport(transport_handler))
+    embeddings._async_client = httpx.AsyncClient(base_url=embeddings.base_url, transport=httpx.MockTransport(transport_handler))
+    return embeddings
+
+
+def batch_server(requests):
+    def handler(path, body):
+        requests.append((path, body))
+        return httpx.Response(200, json={"embeddings": [vector(text) for text in body["input"]]})
+    return handler
+
+
+def legacy_server(requests):
+    """An Ollama server from before /api/embed existed."""
+    def handler(path, body):
+        requests.append((path, body))
+        if path == "/api/embed":
+            return httpx.Response(404, text="404 page not found")
+        return httpx.Response(200, json={"embedding": vector(body["prompt"])})
+    return handler
+
+
+TEXTS = [f"text {i}" for i in range(5)]
+
+
+def test_documents_are_embedded_in_batches():
+    requests = []
+    embeddings = make_embeddings(batch_server(requests))
+
+    vectors = embeddings.embed_documents(TEXTS)
+
+    assert vectors == [vector(f"passage: {text}") for text in TEXTS]
+    assert [path for path, _ in requests] == ["/api/embed"] * 3
+    assert [len(body["input"]) for _, body in requests] == [2, 2, 1]
+
+
+def test_servers_without_the_batch_endpoint_fall_back_to_single_requests():
+    requests = []
+    embeddings = make_embeddings(legacy_server(requests))
+
+    vectors = embeddings.embed_documents(TEXTS)
+
+    assert vectors == [vector(f"passage: {text}") for text in TEXTS]
+    # The batch endpoint is only tried once
+    assert [path for path, _ in requests].count("/api/embed") == 1
+    assert sorted(body["prompt"] for path, body in requests if path == "/api/embeddings") == [f"passage: {text}" for text in TEXTS]
+
+    requests.clear()
+    assert embeddings.embed_query("login") == vector("query: login")
+    assert requests == [("/api/embeddings", {"model": "nomic-embed-text", "prompt": "query: login"})]
+
+
+def test_a_missing_model_is_an_error_not_a_fallback():
+    def handler(path, body):
+        return httpx.Response(404, json={"error": 'model "nomic-embed-text" not found, try pulling it first'})
+
+    embeddings = make_embeddings(handler)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        embeddings.embed_documents(TEXTS)
+    assert embeddings._batch_supported is None
+
+
+def test_async_queries_fall_back_to_the_single_text_endpoint():
+    requests = []
+    embeddings = make_embeddings(legacy_server(requests))
+
+    async def main():
+        first = await embeddings.aembed_query("login")
+        second = await embeddings.aembed_query("logout")
+        await embeddings._async_client.aclose()
+        return first, second
+
+    assert asyncio.run(main()) == (vector("query: login"), vector("query: logout"))
+    assert [path for path, _ in requests] == ["/api/embed", "/api/embeddings", "/api/embeddings"]
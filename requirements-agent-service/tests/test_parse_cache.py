@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from app import document_processor, parse_cache
+from app.parse_cache import DiskParseCache
+
+ELEMENTS = [{"text": "Scope", "category": "Title", "metadata": {"page_number": 1}}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskParseCache(str(tmp_path / "parsed"), max_bytes=10 * 1024 * 1024)
+
+
+def entry_size(cache, key):
+    return os.path.getsize(cache._entry_path(key))
+
+
+def test_entries_round_trip(cache):
+    key = cache.make_key("bucket", "spec.pdf", "etag-1")
+    assert cache.get(key) is None
+
+    cache.put(key, ELEMENTS)
+
+    assert cache.get(key) == ELEMENTS
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_key_changes_with_the_revision_and_the_object(cache):
+    key = cache.make_key("bucket", "spec.pdf", "etag-1")
+    assert key == cache.make_key("bucket", "spec.pdf", "etag-1")
+    assert key != cache.make_key("bucket", "spec.pdf", "etag-2")
+    assert key != cache.make_key("archive", "spec.pdf", "etag-1")
+    assert key != cache.make_key("bucket", "other.pdf", "etag-1")
+
+
+def test_a_new_parser_version_does_not_see_old_entries(cache, monkeypatch):
+    key = cache.make_key("bucket", "spec.pdf", "etag-1")
+    cache.put(key, ELEMENTS)
+
+    monkeypatch.setattr(parse_cache, "get_parser_version", lambda: "unstructured-99.0/elements-v1")
+    upgraded = DiskParseCache(cache.path, cache.max_bytes)
+
+    assert upgraded.get(upgraded.make_key("bucket", "spec.pdf", "etag-1")) is None
+
+
+def test_least_recently_used_entries_are_evicted_past_max_bytes(cache):
+    keys = [cache.make_key("bucket", f"doc{i}.pdf", "etag") for i in range(3)]
+    for age, key in zip([300, 200, 100], keys):
+        cache.put(key, ELEMENTS)
+        os.utime(cache._entry_path(key), (0, 1_000_000 - age))
+    cache.get(keys[0])  # A read makes the oldest entry the most recently used
+
+    cache.max_bytes = entry_size(cache, keys[0]) * 3
+    cache.put(cache.make_key("bucket", "doc3.pdf", "etag"), ELEMENTS)
+
+    assert cache.get(keys[0]) == ELEMENTS
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) == ELEMENTS
+
+
+def test_a_corrupt_entry_is_a_miss(cache):
+    key = cache.make_key("bucket", "spec.pdf", "etag-1")
+    with open(cache._entry_path(key), "wb") as f:
+        f.write(b"not gzip")
+
+    assert cache.get(key) is None
+    assert cache.misses == 1
+
+
+def test_a_changed_etag_misses_the_cache(cache, monkeypatch):
+    etags = {"spec.pdf": "etag-1"}
+    monkeypatch.setattr(document_processor, "get_parse_cache", lambda: cache)
+    monkeypatch.setattr(document_processor, "get_document_etag", lambda bucket_name, object_name: etags[object_name])
+    etag, key, elements = document_processor.lookup_parsed_document("bucket", "spec.pdf")
+    assert (etag, elements) == ("etag-1", None)
+    cache.put(key, ELEMENTS)
+
+    assert document_processor.lookup_parsed_document("bucket", "spec.pdf")[2] == ELEMENTS
+    etags["spec.pdf"] = "etag-2"
+    assert document_processor.lookup_parsed_document("bucket", "spec.pdf") == ("etag-2", cache.make_key("bucket", "spec.pdf", "etag-2"), None)
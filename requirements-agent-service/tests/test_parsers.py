@@ -0,0 +1,96 @@
+import io
+
+import pytest
+
+from app import parsers
+from app.parsers import FAST_PARSERS, detect_parser
+
+
+def parse(parser, text, object_name="doc"):
+    return [(e["text"], e["category"]) for e in FAST_PARSERS[parser](io.BytesIO(text.encode("utf-8")), object_name)]
+
+
+@pytest.mark.parametrize("parser, text, expected", [
+    ("text", "\ufeffFirst line\nstill first\n\n \n\nSecond\r\n", [("First line\nstill first", "NarrativeText"), ("Second", "NarrativeText")]),
+    ("text", "", []),
+    ("markdown", "# Scope\nIntro text\n\nUsers\n-----\n- first\n- second\n", [
+        ("Scope", "Title"), ("Intro text", "NarrativeText"), ("Users", "Title"),
+        ("- first", "ListItem"), ("- second", "ListItem"),
+    ]),
+    ("markdown", "| a | b |\n|---|---|\n| 1 | 2 |\nafter\n\n```\n# not a heading\n```\n", [
+        ("| a | b |\n|---|---|\n| 1 | 2 |", "Table"), ("after", "NarrativeText"), ("```\n# not a heading\n```", "CodeSnippet"),
+    ]),
+    ("html", "<head><title>T</title></head><h2>Goals</h2><p>Be <b>fast</b>.</p><script>x()</script><ul><li>one</li></ul>", [
+        ("Goals", "Title"), ("Be fast.", "NarrativeText"), ("one", "ListItem"),
+    ]),
+    ("html", "<table><tr><th>k</th><th>v</th></tr><tr><td>a</td><td>1</td></tr></table><pre>  x\n  y</pre>", [
+        ("k | v\na | 1", "Table"), ("x\n  y", "CodeSnippet"),
+    ]),
+    ("csv", "name,role\nAnn,admin\n,\nBob,\n", [("name: Ann | role: admin\nname: Bob", "Table")]),
+    ("csv", "name;role\nAnn;admin\n", [("name: Ann | role: admin", "Table")]),
+    ("csv", "", []),
+    ("json", '{"user": {"name": "Ann", "roles": ["admin", null]}, "empty": ""}', [("user.name: Ann\nuser.roles[0]: admin", "NarrativeText")]),
+    ("json", '[{"id": 1}, 2]', [("[0].id: 1", "NarrativeText"), ("[1]: 2", "NarrativeText")]),
+    ("json", '{"a": 1}\n\n{"b": 2}\n', [("a: 1", "NarrativeText"), ("b: 2", "NarrativeText")]),
+])
+def test_fast_parsers(parser, text, expected):
+    assert parse(parser, text) == expected
+
+
+def test_markdown_headings_record_their_depth():
+    elements = list(FAST_PARSERS["markdown"](io.BytesIO(b"# One\n### Three ###\nTitle\n=====\n"), "doc.md"))
+    assert [(e["text"], e["metadata"]["category_depth"]) for e in elements] == [("One", 0), ("Three", 2), ("Title", 0)]
+    assert elements[0]["metadata"]["filename"] == "doc.md"
+    assert elements[0]["metadata"]["filetype"] == "text/markdown"
+
+
+def test_csv_rows_are_grouped_into_table_elements():
+    text = "n\n" + "".join(f"{i}\n" for i in range(parsers.CSV_ROWS_PER_ELEMENT + 1))
+    assert [len(e[0].splitlines()) for e in parse("csv", text)] == [parsers.CSV_ROWS_PER_ELEMENT, 1]
+
+
+def test_large_json_values_are_split():
+    text = '{"items": [' + ", ".join(f'"{"x" * 100}"' for _ in range(50)) + "]}"
+    elements = parse("json", text)
+    assert len(elements) > 1
+    assert all(len(element) <= parsers.JSON_ELEMENT_CHARS for element, _ in elements)
+
+
+def test_undecodable_bytes_do_not_fail_the_parse():
+    elements = list(FAST_PARSERS["text"](io.BytesIO(b"caf\xe9 au lait"), "doc.txt"))
+    assert elements[0]["text"] == "caf\ufffd au lait"
+
+
+@pytest.mark.parametrize("object_name, expected", [
+    ("notes.txt", "text"), ("server.LOG", "text"),
+    ("README.md", "markdown"), ("page.htm", "html"),
+    ("data.csv", "csv"), ("events.jsonl", "json"),
+    ("spec.pdf", "unstructured"), ("spec.docx", "unstructured"), ("archive.tar.gz", "unstructured"),
+])
+def test_the_extension_picks_the_parser(object_name, expected, override_settings):
+    override_settings(FAST_PARSERS_ENABLED=True)
+    assert detect_parser(object_name) == expected
+
+
+@pytest.mark.parametrize("mime_type, expected", [
+    ("text/plain", "text"), ("text/html", "html"), ("application/json", "json"),
+    ("application/pdf", "unstructured"), (None, "unstructured"),
+])
+def test_files_without_an_extension_are_sniffed(mime_type, expected, monkeypatch, override_settings):
+    override_settings(FAST_PARSERS_ENABLED=True)
+    monkeypatch.setattr(parsers, "_sniff_mime_type", lambda file: mime_type)
+    assert detect_parser("README", io.BytesIO(b"...")) == expected
+    # Without the content there is nothing to sniff
+    assert detect_parser("README") == "unstructured"
+
+
+def test_sniffing_leaves_the_file_position_unchanged():
+    file = io.BytesIO(b"hello world")
+    file.seek(3)
+    parsers._sniff_mime_type(file)
+    assert file.tell() == 3
+
+
+def test_everything_goes_to_unstructured_when_fast_parsers_are_disabled(override_settings):
+    override_settings(FAST_PARSERS_ENABLED=False)
+    assert detect_parser("notes.txt") == "unstructured"
@@ -0,0 +1,100 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from app import document_processor
+from app.parsers import ParsedDocument
+from app.parsing_pool import ParseTimeoutError, ParserWorkerError, ParsingPool
+
+
+@pytest.fixture
+def unresponsive_minio(monkeypatch):
+    """A MinIO endpoint that accepts connections but never answers, so parse tasks hang."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    # Read by the spawned worker processes when they load the settings
+    monkeypatch.setenv("MINIO_URL", f"127.0.0.1:{server.getsockname()[1]}")
+    monkeypatch.setenv("PARSE_CACHE_BACKEND", "none")
+    yield
+    server.close()
+
+
+@pytest.fixture
+def pool(unresponsive_minio):
+    pool = ParsingPool(size=1, task_timeout=5.0, memory_limit_mb=0, queue_size=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_a_task_over_the_timeout_gets_its_worker_replaced(pool):
+    with pytest.raises(ParseTimeoutError, match="timed out after 5.0s"):
+        pool.parse("bucket", "slow.pdf")
+    slot = pool._slots[0]
+    assert slot.process is None
+
+    # The next task starts a fresh worker
+    with pytest.raises(ParseTimeoutError):
+        pool.parse("bucket", "slow.pdf")
+
+
+def test_a_worker_dying_mid_task_fails_only_that_task(pool):
+    errors = []
+
+    def parse():
+        try:
+            pool.parse("bucket", "crash.pdf")
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=parse)
+    thread.start()
+    slot = pool._slots[0]
+    deadline = time.monotonic() + 30
+    while (slot.process is None or not slot.process.is_alive()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.5)
+    slot.process.kill()
+    thread.join(timeout=30)
+
+    [error] = errors
+    assert isinstance(error, ParserWorkerError)
+    assert "died while parsing 'crash.pdf'" in str(error)
+    # The dispatcher survived and serves the next task with a new worker
+    with pytest.raises(ParseTimeoutError):
+        pool.parse("bucket", "slow.pdf")
+
+
+def test_parse_gives_up_if_the_pool_never_answers(monkeypatch):
+    pool = ParsingPool(size=1, task_timeout=0.1, memory_limit_mb=0, queue_size=1)
+    pool._result_timeout = 0.2
+    monkeypatch.setattr(pool, "_ensure_started", lambda: None)  # No dispatcher picks the task up
+
+    with pytest.raises(ParseTimeoutError, match="No result for 'doc.pdf'"):
+        pool.parse("bucket", "doc.pdf")
+
+
+def test_a_pooled_parse_reuses_the_revision_looked_up_before_dispatch(monkeypatch, override_settings):
+    override_settings(FAST_PARSERS_ENABLED=True)
+    lookups = []
+    submitted = []
+
+    def lookup_parsed_document(bucket_name, object_name):
+        lookups.append(object_name)
+        return "etag-1", "key-1", None
+
+    class Pool:
+        def parse(self, bucket_name, object_name, etag=None, cache_key=None):
+            submitted.append((object_name, etag, cache_key))
+            return ParsedDocument("unstructured", 0.1, [{"text": "x", "category": "NarrativeText", "metadata": {}}])
+
+    monkeypatch.setattr(document_processor, "lookup_parsed_document", lookup_parsed_document)
+    monkeypatch.setattr(document_processor, "get_parsing_pool", lambda: Pool())
+
+    elements = document_processor.parse_document("bucket", "spec.pdf")
+
+    assert [element["text"] for element in elements] == ["x"]
+    assert lookups == ["spec.pdf"]
+    assert submitted == [("spec.pdf", "etag-1", "key-1")]
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.backends import qdrant_backend
+from app.backends.qdrant_backend import QdrantBackend, build_quantization_config, get_collection_profile
+
+
+class FakeClient:
+    """Holds each collection's quantization config and records the search parameters used."""
+    def __init__(self):
+        self.quantization = {}
+        self.lookups = 0
+        self.searches = []
+
+    def get_collection(self, collection_name):
+        self.lookups += 1
+        return SimpleNamespace(config=SimpleNamespace(quantization_config=self.quantization[collection_name]))
+
+    def search(self, collection_name, search_params, **kwargs):
+        self.searches.append((collection_name, search_params))
+        return []
+
+
+class FakeAsyncClient:
+    def __init__(self, client):
+        self.client = client
+
+    async def get_collection(self, collection_name):
+        return self.client.get_collection(collection_name)
+
+    async def search(self, **kwargs):
+        return self.client.search(**kwargs)
+
+
+@pytest.fixture
+def backend(override_settings):
+    override_settings(VECTOR_STORE_MODE="per_project")
+    backend = QdrantBackend()
+    backend.client = FakeClient()
+    backend.async_client = FakeAsyncClient(backend.client)
+    return backend
+
+
+def apply_profile(backend, project_id, profile_name):
+    """Converts a project's collection the way `collection_profiles apply` does, from another process."""
+    config = build_quantization_config(get_collection_profile(profile_name))
+    backend.client.quantization[backend.get_collection_name(project_id)] = config
+
+
+def test_each_collection_is_searched_with_its_own_quantization(backend, override_settings):
+    override_settings(QDRANT_COLLECTION_PROFILE="default")
+    apply_profile(backend, 1, "default")
+    apply_profile(backend, 2, "binary")
+
+    backend.search(1, [1.0, 0.0], limit=3)
+    asyncio.run(backend.asearch(2, [1.0, 0.0], limit=3))
+
+    [(first, first_params), (second, second_params)] = backend.client.searches
+    assert (first, first_params) == ("project_1_requirements", None)
+    assert second == "project_2_requirements"
+    assert second_params.quantization.rescore is True
+    assert second_params.quantization.oversampling == 2.0
+
+
+def test_search_params_are_reread_after_the_ttl(backend, monkeypatch):
+    apply_profile(backend, 1, "default")
+    collection_name = backend.get_collection_name(1)
+    assert backend.get_search_params(collection_name) is None
+
+    apply_profile(backend, 1, "scalar_int8")
+    assert backend.get_search_params(collection_name) is None
+    assert backend.client.lookups == 1
+
+    monkeypatch.setattr(qdrant_backend, "SEARCH_PARAMS_TTL_SECONDS", 0.0)
+    assert asyncio.run(backend.aget_search_params(collection_name)) is not None
+    assert backend.client.lookups == 2
+
+
+def test_quantization_is_named_from_the_collection_config():
+    assert qdrant_backend.get_quantization(None) is None
+    for profile_name, expected in [("default", None), ("on_disk", None), ("scalar_int8", "scalar"), ("binary", "binary")]:
+        assert qdrant_backend.get_quantization(build_quantization_config(get_collection_profile(profile_name))) == expected
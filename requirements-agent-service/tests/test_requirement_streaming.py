@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.agents import requirement_generation, requirement_streaming
+from app.integration_client import IntegrationClient
+
+STORIES = [
+    {"title": f"Story {i}", "description": "As a user, I want it, so that it works.", "acceptance_criteria": ["Works"]}
+    for i in range(2)
+]
+
+
+class FakeRegistry:
+    """Streams the given partial outputs, calling `between(i)` after the i-th one."""
+    def __init__(self, partials, between=None):
+        self.partials = partials
+        self.between = between
+
+    def get_chain(self, name, builder, provider=None):
+        return None
+
+    async def astream(self, chain, inputs):
+        for i, partial in enumerate(self.partials):
+            yield partial
+            if self.between:
+                await self.between(i)
+
+
+@pytest.fixture
+def jira_requests(monkeypatch, override_settings):
+    """Sends Jira pushes to a mocked integration service and records their payloads."""
+    override_settings(JIRA_PUSH_MAX_RETRIES=0)
+    requests = []
+
+    def handler(request):
+        payload = json.loads(request.content)
+        requests.append(payload)
+        return httpx.Response(201, json={"jira_key": f"PROJ-{len(requests)}", "internal_id": payload["internal_id"]})
+
+    clients = {}
+
+    def get_integration_client():
+        if "client" not in clients:
+            client = clients["client"] = IntegrationClient()
+            client.http = httpx.AsyncClient(base_url="http://integration", transport=httpx.MockTransport(handler))
+        return clients["client"]
+
+    async def retrieve(state):
+        return {"retrieved_docs": ["Users log in with SSO."], "error": None}
+
+    monkeypatch.setattr(requirement_generation, "get_integration_client", get_integration_client)
+    monkeypatch.setattr(requirement_streaming, "retrieve_documents_node", retrieve)
+    monkeypatch.setattr(requirement_streaming, "pack_context", lambda chunks, token_budget: "\n\n".join(chunks))
+    return requests
+
+
+def collect(monkeypatch, registry):
+    monkeypatch.setattr(requirement_streaming, "get_llm_registry", lambda: registry)
+
+    async def main():
+        stream = requirement_streaming.stream_requirement_generation(1, "PROJ", "Login", bypass_generation_cache=True)
+        return [event async for event in stream if event is not None]
+    return asyncio.run(main())
+
+
+def test_stories_are_pushed_while_the_next_ones_are_generated(monkeypatch, jira_requests):
+    async def between(i):
+        # Give the first story's push time to finish before the second story completes
+        await asyncio.sleep(0.05)
+
+    registry = FakeRegistry([
+        {"stories": [STORIES[0]]},
+        {"stories": [STORIES[0], {"title": "Story 1"}]},
+        {"stories": STORIES},
+    ], between)
+
+    events = collect(monkeypatch, registry)
+
+    assert [name for name, _ in events] == ["retrieved", "story", "jira_result", "story", "jira_result", "done"]
+    assert events[0][1] == {"chunks": 1}
+    assert [data["index"] for name, data in events if name in ("story", "jira_result")] == [0, 0, 1, 1]
+    assert events[1][1]["story"] == STORIES[0]
+    done = events[-1][1]
+    assert (done["stories"], done["pushed"], done["failed"]) == (2, 2, 0)
+    assert [result["jira_key"] for result in done["jira_results"]] == ["PROJ-1", "PROJ-2"]
+    assert [payload["title"] for payload in jira_requests] == ["Story 0", "Story 1"]
+
+
+def test_a_generation_failure_ends_the_stream_with_an_error(monkeypatch, jira_requests):
+    async def between(i):
+        await asyncio.sleep(0.05)
+        raise ValueError("model went away")
+
+    registry = FakeRegistry([{"stories": [STORIES[0], {"title": "Story 1"}]}], between)
+
+    events = collect(monkeypatch, registry)
+
+    # The story that was complete is still pushed, but there is no 'done'
+    assert [name for name, _ in events] == ["retrieved", "story", "jira_result", "error"]
+    assert "model went away" in events[-1][1]["detail"]
+    assert len(jira_requests) == 1
+
+
+def test_a_retrieval_failure_is_the_only_event(monkeypatch, jira_requests):
+    async def retrieve(state):
+        return {"retrieved_docs": [], "error": "No documents indexed for project 1."}
+
+    monkeypatch.setattr(requirement_streaming, "retrieve_documents_node", retrieve)
+
+    events = collect(monkeypatch, FakeRegistry([]))
+
+    assert events == [("error", {"detail": "No documents indexed for project 1."})]
+    assert jira_requests == []
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+from app.retrieval_cache import LRUCache, SearchResultCache
+
+
+class SharedGenerations:
+    """Stands in for the database table that processes share generations through."""
+    def __init__(self):
+        self.generations = {}
+        self.loads = 0
+        self.bumps = 0
+        self.fail = False
+
+    def load(self, project_id):
+        self.loads += 1
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        return self.generations.get(project_id, 0)
+
+    def bump(self, project_id):
+        self.bumps += 1
+        self.generations[project_id] = self.generations.get(project_id, 0) + 1
+        return self.generations[project_id]
+
+
+def shared_cache(shared, sync_seconds=60.0):
+    return SearchResultCache(max_entries=10, load_shared=shared.load, bump_shared=shared.bump, sync_seconds=sync_seconds)
+
+
+def test_lru_cache_evicts_the_least_recently_used_entry_and_expires_entries():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+    expiring = LRUCache(max_entries=2, ttl_seconds=0.01)
+    expiring.put("a", 1)
+    time.sleep(0.02)
+    assert expiring.get("a") is None
+
+
+def test_bumping_invalidates_only_that_projects_results():
+    cache = SearchResultCache(max_entries=10)
+    cache.put(1, cache.generation(1), "query", ["result"])
+    cache.put(2, cache.generation(2), "query", ["other"])
+
+    cache.bump_generation(1)
+
+    assert cache.get(1, cache.generation(1), "query") is None
+    assert cache.get(2, cache.generation(2), "query") == ["other"]
+
+
+def test_results_computed_before_a_bump_are_never_served():
+    cache = SearchResultCache(max_entries=10)
+    generation = cache.generation(1)
+    cache.bump_generation(1)  # An ingest lands while the search is running
+    cache.put(1, generation, "query", ["stale"])
+
+    assert cache.get(1, cache.generation(1), "query") is None
+
+
+def test_a_bump_in_another_process_is_seen_after_sync_seconds():
+    shared = SharedGenerations()
+    api = shared_cache(shared, sync_seconds=0.05)
+    worker = shared_cache(shared, sync_seconds=0.05)
+    api.put(1, api.generation(1), "query", ["old"])
+
+    worker.bump_generation(1)
+
+    # Within sync_seconds the API keeps its last reading
+    assert api.get(1, api.generation(1), "query") == ["old"]
+    time.sleep(0.06)
+    assert api.get(1, asyncio.run(api.ageneration(1)), "query") is None
+
+
+def test_shared_generation_is_read_at_most_once_per_sync_interval():
+    shared = SharedGenerations()
+    cache = shared_cache(shared)
+
+    for _ in range(5):
+        cache.generation(1)
+
+    assert shared.loads == 1
+
+
+def test_unreadable_shared_generation_keeps_the_last_known_value():
+    shared = SharedGenerations()
+    cache = shared_cache(shared, sync_seconds=0.0)
+    cache.put(1, cache.generation(1), "query", ["result"])
+
+    shared.fail = True
+
+    assert cache.get(1, cache.generation(1), "query") == ["result"]
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from app.agents import requirement_generation
+from app.agents.requirement_generation import map_user_stories_node, merge_user_stories
+
+# Unit vectors by story title; stories with similar meaning get similar vectors
+VECTORS = {
+    "Log in": [1.0, 0.0, 0.0],
+    "Sign in": [0.99, 0.14, 0.0],
+    "Export report": [0.0, 1.0, 0.0],
+    "": [0.0, 0.0, 1.0],
+}
+
+
+class FakeEmbeddings:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    async def aembed_documents(self, texts):
+        if self.fail:
+            raise ConnectionError("embedding service unavailable")
+        return [VECTORS[text.split("\n")[0]] for text in texts]
+
+
+class FakeManager:
+    def __init__(self, embeddings):
+        self.base_embeddings = embeddings
+
+
+def story(title, *criteria):
+    return {"title": title, "description": f"As a user, I want to {title.lower()}", "acceptance_criteria": list(criteria)}
+
+
+@pytest.fixture
+def embeddings(monkeypatch, override_settings):
+    override_settings(MAP_REDUCE_DEDUP_SIMILARITY=0.9)
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(requirement_generation, "get_vector_store_manager", lambda: FakeManager(embeddings))
+    return embeddings
+
+
+def test_stories_with_the_same_normalized_title_are_merged(embeddings):
+    merged = asyncio.run(merge_user_stories([
+        [story("Log in", "Valid credentials work"), story("Export report", "CSV")],
+        [{**story("Log in", "valid  credentials work", "Lockout after 5 tries"), "title": "log in!"}],
+    ]))
+
+    assert [s["title"] for s in merged] == ["Log in", "Export report"]
+    assert merged[0]["acceptance_criteria"] == ["Valid credentials work", "Lockout after 5 tries"]
+
+
+def test_similar_stories_are_merged_by_embedding(embeddings):
+    merged = asyncio.run(merge_user_stories([[story("Log in", "A")], [story("Sign in", "B")], [story("Export report", "C")]]))
+
+    assert [(s["title"], s["acceptance_criteria"]) for s in merged] == [("Log in", ["A", "B"]), ("Export report", ["C"])]
+
+
+def test_untitled_stories_are_not_merged_by_title(embeddings):
+    merged = asyncio.run(merge_user_stories([[story("", "A"), story("Export report", "B")], [story("", "C")]]))
+
+    # Both untitled stories embed identically, so they are still merged by similarity
+    assert [s["acceptance_criteria"] for s in merged] == [["A", "C"], ["B"]]
+
+
+def test_falls_back_to_titles_when_embedding_fails(embeddings):
+    embeddings.fail = True
+
+    merged = asyncio.run(merge_user_stories([[story("Log in", "A"), story("", "B")], [story("Sign in", "C"), story("LOG IN", "D"), story("", "E")]]))
+
+    assert [(s["title"], s["acceptance_criteria"]) for s in merged] == [
+        ("Log in", ["A", "D"]), ("", ["B"]), ("Sign in", ["C"]), ("", ["E"])
+    ]
+
+
+def test_map_node_skips_cancelled_groups(monkeypatch, override_settings):
+    override_settings(MAP_REDUCE_GROUP_TOKENS=10, MAP_REDUCE_MAX_GROUPS=4)
+    monkeypatch.setattr(requirement_generation, "group_context", lambda docs, tokens, max_groups: docs)
+
+    async def generate_stories(context, prompt, bypass_cache=False):
+        if context == "cancelled":
+            raise asyncio.CancelledError()
+        return [story(context)], False
+
+    monkeypatch.setattr(requirement_generation, "generate_stories", generate_stories)
+
+    update = asyncio.run(map_user_stories_node({"retrieved_docs": ["Log in", "cancelled"], "initial_prompt": "p"}))
+
+    assert update["error"] is None
+    assert update["story_groups"] == [[story("Log in")]]
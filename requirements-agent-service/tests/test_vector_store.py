@@ -0,0 +1,139 @@
+import hashlib
+from typing import List
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.vector_store import VectorStoreManager
+
+PROJECT_ID = 1
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic 3-dimensional embeddings that record every text they embed."""
+    def __init__(self):
+        self.embedded: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    @staticmethod
+    def _vector(text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [digest[0] + 1.0, digest[1] + 1.0, digest[2] + 1.0]
+
+
+@pytest.fixture
+def manager(tmp_path, override_settings):
+    override_settings(
+        VECTOR_BACKEND="numpy",
+        LOCAL_VECTOR_STORE_PATH=str(tmp_path / "vectors"),
+        LLM_PROVIDER="ollama",
+        EMBEDDING_CACHE_ENABLED=False,
+        SEARCH_RESULT_CACHE_SHARED=False,
+        EMBEDDING_VECTOR_SIZE=3,
+        EMBEDDING_BATCH_SIZE=2,
+        EMBEDDING_CONCURRENCY=2
+    )
+    manager = VectorStoreManager()
+    manager.embeddings = FakeEmbeddings()
+    yield manager
+    manager.embedding_executor.shutdown()
+
+
+def ingest(manager, texts, bucket_name="bucket", source="spec.pdf"):
+    documents = [Document(page_content=text, metadata={"source": source}) for text in texts]
+    return manager.process_and_store_documents(PROJECT_ID, bucket_name, source, documents, chunked=True)
+
+
+def stored_texts(manager):
+    return sorted(
+        hit.payload["page_content"]
+        for batch in manager.local_backend.iter_points(PROJECT_ID)
+        for hit in batch
+    )
+
+
+def test_point_id_is_deterministic_and_scoped():
+    point_id = VectorStoreManager.make_point_id(1, "bucket", "spec.pdf", "hash")
+    assert point_id == VectorStoreManager.make_point_id(1, "bucket", "spec.pdf", "hash")
+    assert point_id != VectorStoreManager.make_point_id(2, "bucket", "spec.pdf", "hash")
+    assert point_id != VectorStoreManager.make_point_id(1, "archive", "spec.pdf", "hash")
+    assert point_id != VectorStoreManager.make_point_id(1, "bucket", "other.pdf", "hash")
+    assert point_id != VectorStoreManager.make_point_id(1, "bucket", "spec.pdf", "other")
+
+
+def test_reingesting_an_unchanged_document_embeds_nothing(manager):
+    first = ingest(manager, ["alpha", "beta", "gamma"])
+    manager.embeddings.embedded.clear()
+    second = ingest(manager, ["alpha", "beta", "gamma"])
+
+    assert first == {"chunks_total": 3, "chunks_upserted": 3, "chunks_unchanged": 0, "chunks_deleted": 0}
+    assert second == {"chunks_total": 3, "chunks_upserted": 0, "chunks_unchanged": 3, "chunks_deleted": 0}
+    assert manager.embeddings.embedded == []
+    assert manager.local_backend.count(PROJECT_ID) == 3
+
+
+def test_duplicate_chunks_are_stored_once(manager):
+    counts = ingest(manager, ["alpha", "alpha", "beta"])
+
+    assert counts["chunks_total"] == 3
+    assert counts["chunks_upserted"] == 2
+    assert stored_texts(manager) == ["alpha", "beta"]
+
+
+def test_changed_chunks_replace_stale_ones(manager):
+    ingest(manager, ["alpha", "beta", "gamma"])
+    manager.embeddings.embedded.clear()
+    counts = ingest(manager, ["alpha", "beta", "delta"])
+
+    assert counts == {"chunks_total": 3, "chunks_upserted": 1, "chunks_unchanged": 2, "chunks_deleted": 1}
+    assert manager.embeddings.embedded == ["delta"]
+    assert stored_texts(manager) == ["alpha", "beta", "delta"]
+
+
+def test_same_object_name_in_another_bucket_is_left_alone(manager):
+    ingest(manager, ["current alpha", "current beta"], bucket_name="project-1")
+    ingest(manager, ["archived alpha"], bucket_name="archive")
+    counts = ingest(manager, ["current gamma"], bucket_name="project-1")
+
+    assert counts["chunks_deleted"] == 2
+    assert stored_texts(manager) == ["archived alpha", "current gamma"]
+
+
+def test_points_stored_without_a_bucket_are_replaced(manager):
+    manager.local_backend.ensure_project(PROJECT_ID, lambda: 3)
+    manager.local_backend.upsert(
+        PROJECT_ID,
+        ids=["legacy-point"],
+        vectors=[[1.0, 2.0, 3.0]],
+        payloads=[{"source": "spec.pdf", "page_content": "alpha"}]
+    )
+
+    counts = ingest(manager, ["alpha"])
+
+    assert counts["chunks_deleted"] == 1
+    assert manager.local_backend.count(PROJECT_ID) == 1
+    [[hit]] = list(manager.local_backend.iter_points(PROJECT_ID))
+    assert hit.id != "legacy-point"
+    assert hit.payload["bucket"] == "bucket"
+
+
+def test_ingest_bumps_the_search_generation_once_per_sync_interval(manager, monkeypatch, override_settings):
+    override_settings(SEARCH_RESULT_CACHE_SYNC_SECONDS=60.0)
+    bumps = []
+    monkeypatch.setattr(manager.search_cache, "bump_generation", bumps.append)
+
+    ingest(manager, [f"chunk {i}" for i in range(10)])
+
+    # Once when the first of five batches lands, and once when the document is done
+    assert bumps == [PROJECT_ID, PROJECT_ID]
+
+    bumps.clear()
+    ingest(manager, [f"chunk {i}" for i in range(10)])
+    assert bumps == []